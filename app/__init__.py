@@ -1,7 +1,14 @@
+import os
+import logging
 from flask import Flask
 from flask_cors import CORS
 
 def create_app():
+    logging.basicConfig(
+        level=os.getenv("LOG_LEVEL", "INFO").upper(),
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    )
+    
     app = Flask(__name__)
     CORS(app)
     
@@ -0,0 +1,107 @@
+"""
+ASGI Application
+
+This module serves the API over ASGI. POST /api/recipes is handled natively
+with asyncio, so a single worker can keep many generations in flight while
+it awaits the model. Every other route is delegated to the Flask application.
+"""
+
+import json
+import math
+from urllib.parse import parse_qs
+from asgiref.wsgi import WsgiToAsgi
+from app import create_app
+from app.services.gemini_service import generate_recipes_async, parse_recipe_count
+from app.services.model_scheduler import ModelOverloadedError
+from app.services.mongodb_service import close_mongodb_service
+
+async def read_body(receive):
+    """Read the full request body from the ASGI receive channel."""
+    body = b""
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get("body", b"")
+        more_body = message.get("more_body", False)
+    return body
+
+async def send_json(send, payload, status, headers=None):
+    """Send a JSON response with CORS headers matching the Flask app, plus any extra headers."""
+    body = json.dumps(payload).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode("ascii")),
+            (b"access-control-allow-origin", b"*"),
+        ] + list(headers or []),
+    })
+    await send({"type": "http.response.body", "body": body})
+
+async def create_recipes(scope, receive, send):
+    """
+    Async version of the POST /api/recipes endpoint
+    
+    Request body:
+    - JSON object containing user preferences
+    
+    Query parameters:
+    - count: number of recipes to generate (default 1)
+    - fresh: set to true to always generate new recipes (see the Flask route)
+    
+    Returns:
+    - JSON response with generated recipes, 400 for an invalid count or a body
+      that is not a JSON object, or 503 with a Retry-After header when the
+      model is overloaded
+    """
+    query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+    try:
+        count = parse_recipe_count(query.get("count", ["1"])[-1])
+    except ValueError as e:
+        await send_json(send, {"error": str(e)}, 400)
+        return
+    
+    body = await read_body(receive)
+    try:
+        preferences = json.loads(body) if body.strip() else {}
+    except ValueError:
+        preferences = None
+    if not isinstance(preferences, dict):
+        await send_json(send, {"error": "Request body must be a JSON object of preferences"}, 400)
+        return
+    
+    try:
+        fresh = query.get("fresh", [""])[-1].lower() in ("1", "true", "yes")
+        recipes = await generate_recipes_async(preferences, use_cache=not fresh, count=count)
+        await send_json(send, recipes, 200)
+    except ModelOverloadedError as e:
+        retry_after = str(math.ceil(e.retry_after)).encode("ascii")
+        await send_json(send, {"error": str(e)}, 503, [(b"retry-after", retry_after)])
+    except Exception as e:
+        await send_json(send, {"error": str(e)}, 500)
+
+async def lifespan(receive, send):
+    """Handle ASGI startup and shutdown events."""
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            close_mongodb_service()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+def create_asgi_app(flask_app=None):
+    """Build the ASGI application around the Flask app."""
+    flask_asgi = WsgiToAsgi(flask_app or create_app())
+    
+    async def app(scope, receive, send):
+        if scope["type"] == "lifespan":
+            await lifespan(receive, send)
+        elif scope["type"] == "http" and scope["method"] == "POST" and scope["path"].rstrip("/") == "/api/recipes":
+            await create_recipes(scope, receive, send)
+        else:
+            await flask_asgi(scope, receive, send)
+    
+    return app
@@ -1,14 +1,28 @@
-from flask import Blueprint, request, jsonify
-from app.services.gemini_service import generate_recipes
-from app.services.mongodb_service import get_mongodb_service
+from flask import Blueprint, Response, request, jsonify, stream_with_context
+from app.services.gemini_service import generate_recipes, stream_recipes, get_readiness, start_warm_up, parse_recipe_count, get_catalog_snapshot
+from app.services.batch_generation import MAX_BATCH_SIZE, generate_recipes_batch
+from app.services.mongodb_service import get_mongodb_service, ingredient_id
+from app.services.metrics import registry, span
+from app.services.model_scheduler import ModelOverloadedError
 import json
+import math
+import logging
 
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
+logger = logging.getLogger(__name__)
+
 def verify_recipe_ingredients(recipes):
     """
     Verify that all recipes have valid ingredients from the catalog
     
+    All ingredient IDs across all recipes are validated and hydrated with a
+    single batched catalog query.
+    
+    Not called on the request path, where process_gemini_responses already
+    validates and repairs recipes against the catalog snapshot; this is a
+    utility that benchmarks/request_path.py uses to time the database check.
+    
     Args:
         recipes (list): List of recipe dictionaries
         
@@ -16,6 +30,25 @@ def verify_recipe_ingredients(recipes):
         list: List of verified recipes
     """
     mongodb_service = get_mongodb_service()
+    
+    # Collect every ingredient ID in the response so they can be looked up at once
+    all_ids = []
+    for recipe in recipes:
+        ingredients = recipe.get('ingredients') or {}
+        all_ids.extend(ingredients.get('necessary_items') or [])
+        all_ids.extend(ingredients.get('optional_items') or [])
+    with span("verification"):
+        lookup = mongodb_service.lookup_mongodb_ids(all_ids)
+    found_items = lookup['items']
+    if lookup['invalid_ids'] or lookup['missing_ids']:
+        logger.warning("Dropping unknown ingredient IDs (invalid: %s, missing: %s)", lookup['invalid_ids'], lookup['missing_ids'])
+    
+    def keep_valid(entries):
+        return [entry for entry in entries if ingredient_id(entry) in found_items]
+    
+    def details(entries):
+        return [found_items[ingredient_id(entry)] for entry in entries]
+    
     verified_recipes = []
     
     for recipe in recipes:
@@ -24,34 +57,86 @@ def verify_recipe_ingredients(recipes):
         
         # Verify necessary_items
         if 'necessary_items' in recipe['ingredients']:
-            # Verify that all necessary_items exist in the database
-            valid_ids = mongodb_service.verify_mongodb_ids(recipe['ingredients']['necessary_items'])
+            valid_items = keep_valid(recipe['ingredients']['necessary_items'])
             
             # If we have valid necessary items, include this recipe
-            if valid_ids:
-                recipe['ingredients']['necessary_items'] = valid_ids
-                
-                # Get the full ingredient details
-                necessary_items_details = mongodb_service.get_items_by_mongodb_ids(valid_ids)
-                recipe['ingredients']['necessary_items_details'] = necessary_items_details
+            if valid_items:
+                recipe['ingredients']['necessary_items'] = valid_items
+                recipe['ingredients']['necessary_items_details'] = details(valid_items)
                 
                 # Verify optional_items
                 if 'optional_items' in recipe['ingredients']:
-                    valid_optional_ids = mongodb_service.verify_mongodb_ids(recipe['ingredients']['optional_items'])
-                    recipe['ingredients']['optional_items'] = valid_optional_ids
-                    
-                    # Get the full ingredient details
-                    optional_items_details = mongodb_service.get_items_by_mongodb_ids(valid_optional_ids)
-                    recipe['ingredients']['optional_items_details'] = optional_items_details
+                    valid_optional_items = keep_valid(recipe['ingredients']['optional_items'])
+                    recipe['ingredients']['optional_items'] = valid_optional_items
+                    recipe['ingredients']['optional_items_details'] = details(valid_optional_items)
                 
                 verified_recipes.append(recipe)
     
     return verified_recipes
 
+def request_preferences():
+    """
+    Read the preferences from the request body
+    
+    A missing body means no preferences. Malformed JSON is rejected with 400 by Flask.
+    
+    Returns:
+        dict: The preferences, or None when the body is not a JSON object
+    """
+    body = request.get_json()
+    if body is None:
+        return {}
+    return body if isinstance(body, dict) else None
+
 @api_bp.route('/health', methods=['GET'])
 def get_health():
     return 'Ok'
 
+@api_bp.route('/ready', methods=['GET'])
+def get_ready():
+    """
+    GET endpoint reporting whether the model client and catalog are initialized
+    
+    Returns 503 until they are, and starts a background warm-up if none is running.
+    `/api/health` only reports that the process is up.
+    """
+    readiness = get_readiness()
+    if not readiness['ready']:
+        start_warm_up()
+    return jsonify(readiness), 200 if readiness['ready'] else 503
+
+@api_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    """
+    GET endpoint exposing stage latencies, counters and cache/repair stats
+    in the Prometheus text format
+    """
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+@api_bp.route('/items/<item_id>/substitutes', methods=['GET'])
+def get_substitutes(item_id):
+    """
+    GET endpoint listing the cheapest items in the same category as a catalog item
+    
+    Query parameters:
+    - limit: number of substitutes to return (default 1, at most 50)
+    
+    Returns:
+    - JSON array of catalog items priced below the given one, cheapest first,
+      404 for an unknown item, or 503 while the catalog is unavailable
+    """
+    try:
+        limit = min(max(int(request.args.get('limit', 1)), 1), 50)
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    
+    snapshot = get_catalog_snapshot()
+    if snapshot is None:
+        return jsonify({"error": "Catalog is not available"}), 503
+    if item_id not in snapshot.id_index:
+        return jsonify({"error": f"Unknown item {item_id}"}), 404
+    return jsonify(snapshot.cheapest_substitutes(item_id, limit)), 200
+
 @api_bp.route('/recipes', methods=['POST'], endpoint='create_recipes')
 def create_recipes():
     """
@@ -60,17 +145,114 @@ def create_recipes():
     Request body:
     - JSON object containing user preferences
     
+    Query parameters:
+    - count: number of recipes to generate (default 1, at most RECIPE_MAX_COUNT)
+    - fresh: set to true to always generate new recipes, without using the
+      recipe pool, the cache or an identical request already in flight
+    
     Returns:
-    - JSON response with generated recipes
+    - JSON response with generated recipes, 400 for an invalid count or a body
+      that is not a JSON object, or 503 with a Retry-After header when the
+      model is overloaded
     """
     try:
-        # Get preferences from request JSON body
-        preferences = request.get_json() or {}
+        count = parse_recipe_count(request.args.get('count', 1))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    # Get preferences from request JSON body
+    preferences = request_preferences()
+    if preferences is None:
+        return jsonify({"error": "Request body must be a JSON object of preferences"}), 400
+    
+    try:
+        fresh = request.args.get('fresh', '').lower() in ('1', 'true', 'yes')
         
         # Generate recipes
-        recipes = generate_recipes(preferences)
+        recipes = generate_recipes(preferences, use_cache=not fresh, count=count)
         
-        # Return recipes without verification
+        # Recipes were validated and repaired against the catalog in process_gemini_responses
         return jsonify(recipes), 200
+    except ModelOverloadedError as e:
+        # Shed load instead of queueing without bound; clients retry after the hinted delay
+        return jsonify({"error": str(e)}), 503, {'Retry-After': str(math.ceil(e.retry_after))}
     except Exception as e:
         return jsonify({"error": str(e)}), 500
+
+@api_bp.route('/recipes/stream', methods=['POST'], endpoint='stream_recipes')
+def stream_recipes_endpoint():
+    """
+    POST endpoint to generate recipes, streaming each recipe field as it is generated
+    
+    Request body:
+    - JSON object containing user preferences
+    
+    Query parameters:
+    - count: number of recipes to generate (default 1, at most RECIPE_MAX_COUNT)
+    
+    Returns:
+    - Newline-delimited JSON events: `field` events with one recipe field
+      (ingredients include catalog details), `correction` events with a field
+      changed by repair, `recipe` events with each complete recipe (or an `error`
+      event with its `recipe` index if it could not be repaired), then a final
+      `done` or `error` event (with `retry_after` seconds when the model is
+      overloaded), or 400 for an invalid count or a body that is not a JSON object
+    """
+    try:
+        count = parse_recipe_count(request.args.get('count', 1))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    preferences = request_preferences()
+    if preferences is None:
+        return jsonify({"error": "Request body must be a JSON object of preferences"}), 400
+    
+    def generate():
+        try:
+            for event in stream_recipes(preferences, count):
+                yield json.dumps(event) + "\n"
+            yield json.dumps({"type": "done"}) + "\n"
+        except ModelOverloadedError as e:
+            yield json.dumps({"type": "error", "error": str(e), "retry_after": math.ceil(e.retry_after)}) + "\n"
+        except Exception as e:
+            yield json.dumps({"type": "error", "error": str(e)}) + "\n"
+    
+    response = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@api_bp.route('/recipes/batch', methods=['POST'], endpoint='create_recipes_batch')
+def create_recipes_batch():
+    """
+    POST endpoint to generate recipes for many preference sets at once
+    
+    Request body:
+    - JSON array of preference objects, or an object with a `preferences` array
+    
+    Returns:
+    - Newline-delimited JSON, one line per item as it finishes
+      (`{"index": i, "recipes": [...]}` or `{"index": i, "error": "..."}`),
+      then a final `{"done": true, ...}` summary line
+    """
+    body = request.get_json() or []
+    preferences_list = body.get('preferences') if isinstance(body, dict) else body
+    if not isinstance(preferences_list, list) or not all(isinstance(item, dict) for item in preferences_list):
+        return jsonify({"error": "Request body must be a list of preference objects"}), 400
+    
+    if len(preferences_list) > MAX_BATCH_SIZE:
+        return jsonify({"error": f"Batch size {len(preferences_list)} exceeds the maximum of {MAX_BATCH_SIZE}"}), 400
+    
+    def generate():
+        succeeded = failed = 0
+        for result in generate_recipes_batch(preferences_list):
+            if 'error' in result:
+                failed += 1
+            else:
+                succeeded += 1
+            yield json.dumps(result) + "\n"
+        yield json.dumps({"done": True, "succeeded": succeeded, "failed": failed}) + "\n"
+    
+    response = Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,86 @@
+"""
+Batch Recipe Generation
+
+This module generates recipes for many preference sets at once. All items
+in a batch are built from one catalog snapshot, and model calls run through
+a bounded worker pool with per-item timeouts and retries. Batch model calls
+use the scheduler's batch lane, so they queue behind interactive requests. Results are
+yielded as each item finishes.
+"""
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Dict, Any, Iterator, Optional
+
+from app.services.gemini_service import generate_recipes, get_catalog_snapshot
+from app.services.model_scheduler import ModelOverloadedError, BATCH
+
+DEFAULT_MAX_WORKERS = int(os.getenv("BATCH_MAX_WORKERS", 8))
+DEFAULT_ITEM_TIMEOUT = float(os.getenv("BATCH_ITEM_TIMEOUT", 60))
+DEFAULT_ITEM_RETRIES = int(os.getenv("BATCH_ITEM_RETRIES", 2))
+MAX_BATCH_SIZE = int(os.getenv("BATCH_MAX_SIZE", 500))
+RETRY_BACKOFF_SECONDS = 1.0
+
+
+def generate_batch_item(preferences: Dict[str, Any], snapshot=None, timeout: Optional[float] = None, retries: int = 0) -> List[Dict[str, Any]]:
+    """Generate recipes for one preference set, retrying failed attempts with exponential backoff.
+
+    Quota and availability errors the scheduler already retried are not retried
+    again here, so an item makes at most the scheduler's attempts for them.
+    """
+    for attempt in range(retries + 1):
+        try:
+            return generate_recipes(preferences, snapshot=snapshot, timeout=timeout, lane=BATCH)
+        except Exception as e:
+            if attempt == retries or (isinstance(e, ModelOverloadedError) and e.attempts):
+                raise
+            delay = RETRY_BACKOFF_SECONDS * (2 ** attempt)
+            # A call the scheduler did not admit is retried no sooner than it asks
+            if isinstance(e, ModelOverloadedError):
+                delay = max(delay, e.retry_after)
+            time.sleep(delay)
+
+def generate_recipes_batch(
+    preferences_list: List[Dict[str, Any]],
+    max_workers: Optional[int] = None,
+    timeout: Optional[float] = None,
+    retries: Optional[int] = None,
+) -> Iterator[Dict[str, Any]]:
+    """Generate recipes for a list of preference sets.
+    
+    Args:
+        preferences_list (list): Preference dictionaries, one per item
+        max_workers (int): Maximum number of concurrent model calls
+        timeout (float): Timeout for each model call in seconds
+        retries (int): Number of retries for each failed item
+        
+    Yields:
+        dict: `{"index": i, "recipes": [...]}` or `{"index": i, "error": "..."}`,
+        in completion order
+    """
+    if len(preferences_list) > MAX_BATCH_SIZE:
+        raise ValueError(f"Batch size {len(preferences_list)} exceeds the maximum of {MAX_BATCH_SIZE}")
+    
+    max_workers = max_workers or DEFAULT_MAX_WORKERS
+    timeout = timeout if timeout is not None else DEFAULT_ITEM_TIMEOUT
+    retries = retries if retries is not None else DEFAULT_ITEM_RETRIES
+    
+    # Pin one catalog snapshot so every prompt in the batch sees the same catalog
+    snapshot = get_catalog_snapshot()
+    
+    executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="recipe-batch")
+    try:
+        futures = {
+            executor.submit(generate_batch_item, preferences, snapshot, timeout, retries): index
+            for index, preferences in enumerate(preferences_list)
+        }
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                yield {"index": index, "recipes": future.result()}
+            except Exception as e:
+                yield {"index": index, "error": str(e)}
+    finally:
+        # Stop queued items if the consumer goes away before the batch finishes
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,193 @@
+"""
+Catalog Changes
+
+This module tracks changes to the catalog collection by `_id`, so the
+in-process snapshot can be updated with a small delta instead of reloading
+every item, and so caches built on the catalog can drop exactly the entries
+a change affects.
+
+Three change feeds are available (CATALOG_CHANGE_FEED):
+
+- `watermark` (default) polls for items whose `updated_at` is at or past the
+  newest one already seen. Writes that do not set `updated_at` are not seen,
+  and deletions only show up as a lower item count, which forces a full
+  reload; the snapshot TTL bounds anything else.
+- `change_stream` reads a MongoDB change stream (replica sets and Atlas),
+  which reports every insert, update and delete. It falls back to the
+  watermark feed if the deployment does not support change streams.
+- `version` only compares the catalog version fingerprint and reloads the
+  whole snapshot when it changes.
+"""
+
+import os
+import logging
+from typing import List, Dict, Any, Callable, Optional, Set
+
+from bson import ObjectId
+
+from app.services.mongodb_service import ITEM_PROJECTION, ingredient_id
+from app.services.recipe_schema import INGREDIENT_LISTS
+
+logger = logging.getLogger(__name__)
+
+
+def id_tag(mongodb_id: str) -> str:
+    """Invalidation tag for one catalog item."""
+    return f"id:{mongodb_id}"
+
+def category_tag(category: str) -> str:
+    """Invalidation tag for a catalog category."""
+    return f"category:{category}"
+
+def recipe_tags(recipes: List[Dict[str, Any]], snapshot) -> List[str]:
+    """Tags of the catalog items recipes reference and of the categories those items belong to."""
+    tags = set()
+    for recipe in recipes:
+        ingredients = recipe.get("ingredients") or {}
+        for list_name in INGREDIENT_LISTS:
+            for entry in ingredients.get(list_name) or []:
+                mongodb_id = ingredient_id(entry)
+                row = snapshot.id_index.get(mongodb_id)
+                if row is not None:
+                    tags.add(id_tag(mongodb_id))
+                    tags.add(category_tag(snapshot.category_names[snapshot.category_codes[row]]))
+    return sorted(tags)
+
+
+class CatalogChange:
+    """Items upserted and deleted since the previous snapshot, or a full reload."""
+
+    def __init__(self, upserted: Optional[List[Dict[str, Any]]] = None, deleted: Optional[List[str]] = None, full: bool = False):
+        self.upserted = upserted or []
+        self.deleted = deleted or []
+        self.full = full
+        # Categories that gained items (inserts, category moves), filled in when the change is applied
+        self.categories: Set[str] = set()
+
+    @property
+    def ids(self) -> Set[str]:
+        """MongoDB _ids of every item the change touches."""
+        return {str(item["_id"]) for item in self.upserted} | set(self.deleted)
+
+    def tags(self) -> List[str]:
+        """Invalidation tags for the changed items and for the categories that gained items."""
+        return sorted([id_tag(mongodb_id) for mongodb_id in self.ids] + [category_tag(name) for name in self.categories])
+
+
+def project_item(document: Dict[str, Any]) -> Dict[str, Any]:
+    """Reduce a catalog document to the snapshot fields, with a string _id."""
+    item = {key: document[key] for key in ITEM_PROJECTION if key in document}
+    if isinstance(item.get("_id"), ObjectId):
+        item["_id"] = str(item["_id"])
+    return item
+
+
+class VersionChangeFeed:
+    """Reports a full reload whenever the catalog version fingerprint changes."""
+
+    name = "version"
+
+    def __init__(self, get_service: Callable[[], Any]):
+        self._get_service = get_service
+
+    def start(self):
+        """Nothing to record; the snapshot carries the version it was loaded at."""
+
+    def poll(self, snapshot) -> Optional[CatalogChange]:
+        """Return a full change if the version differs from the snapshot's, otherwise None."""
+        if self._get_service().get_catalog_version() != snapshot.base_version:
+            return CatalogChange(full=True)
+        return None
+
+
+class WatermarkChangeFeed:
+    """Polls for items updated at or after the newest `updated_at` already seen."""
+
+    name = "watermark"
+
+    def __init__(self, get_service: Callable[[], Any]):
+        self._get_service = get_service
+        self.watermark = None
+
+    def start(self):
+        """Record the current watermark. Call before loading a full snapshot, so no update is missed."""
+        self.watermark = self._get_service().get_catalog_watermark()
+
+    def poll(self, snapshot) -> Optional[CatalogChange]:
+        """Return the items updated since the last poll, a full change if items were deleted, or None."""
+        service = self._get_service()
+        # At or after: an item written in the same instant as the watermark must not be missed.
+        # Items re-read this way are unchanged and drop out when the change is applied
+        updated = service.get_items_updated_since(self.watermark)
+        count = service.count_catalog_items()
+        if updated:
+            self.watermark = max(item["updated_at"] for item in updated)
+        upserted = [project_item(item) for item in updated]
+        inserted = sum(1 for item in upserted if item["_id"] not in snapshot.id_index)
+        if count != len(snapshot) + inserted:
+            # Deletions (or writes without updated_at) are not visible to the watermark
+            return CatalogChange(full=True)
+        return CatalogChange(upserted=upserted) if upserted else None
+
+
+class ChangeStreamFeed:
+    """Reads inserts, updates and deletes from a MongoDB change stream."""
+
+    name = "change_stream"
+
+    def __init__(self, get_service: Callable[[], Any]):
+        self._get_service = get_service
+        self._stream = None
+        self._stream_pid: Optional[int] = None
+        self._resume_token = None
+
+    def start(self):
+        """Open a new stream. Call before loading a full snapshot, so no change is missed."""
+        if self._stream is not None and self._stream_pid == os.getpid():
+            self._stream.close()
+        self._resume_token = None
+        self._open()
+
+    def _open(self):
+        self._stream = self._get_service().watch_catalog(self._resume_token)
+        self._stream_pid = os.getpid()
+
+    def poll(self, snapshot) -> Optional[CatalogChange]:
+        """Drain the events that arrived since the last poll into one change, or return None."""
+        if self._stream_pid != os.getpid():
+            # Cursors do not survive fork(); resume where the parent's stream left off
+            self._open()
+        upserted: Dict[str, Dict[str, Any]] = {}
+        deleted: Set[str] = set()
+        while True:
+            event = self._stream.try_next()
+            if event is None:
+                break
+            self._resume_token = self._stream.resume_token
+            operation = event.get("operationType")
+            if operation not in ("insert", "update", "replace", "delete"):
+                # drop, rename or invalidate: the stream no longer describes the collection
+                return CatalogChange(full=True)
+            mongodb_id = str(event["documentKey"]["_id"])
+            document = event.get("fullDocument")
+            if operation == "delete" or document is None:
+                # An update whose document was deleted before the lookup has no fullDocument
+                upserted.pop(mongodb_id, None)
+                deleted.add(mongodb_id)
+            else:
+                upserted[mongodb_id] = project_item(document)
+                deleted.discard(mongodb_id)
+        if not upserted and not deleted:
+            return None
+        return CatalogChange(upserted=list(upserted.values()), deleted=sorted(deleted))
+
+
+FEEDS = {feed.name: feed for feed in (VersionChangeFeed, WatermarkChangeFeed, ChangeStreamFeed)}
+
+def get_change_feed(get_service: Callable[[], Any], name: Optional[str] = None):
+    """Factory function to build the change feed named by CATALOG_CHANGE_FEED (default `watermark`)."""
+    name = (name or os.getenv("CATALOG_CHANGE_FEED", "watermark")).lower()
+    if name not in FEEDS:
+        logger.warning("Unknown CATALOG_CHANGE_FEED %r, using watermark", name)
+        name = "watermark"
+    return FEEDS[name](get_service)
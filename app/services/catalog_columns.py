@@ -0,0 +1,129 @@
+"""
+Catalog Columns
+
+This module holds catalog items as parallel columns, the layout
+`CatalogSnapshot` keeps them in. Documents are read off a MongoDB cursor one
+batch at a time and appended to the columns, so loading the catalog never
+holds a dictionary per item, and _ids are converted to strings in one pass
+over the id column. item_ids are kept as strings too (or None), since that is
+how saved columns read them back.
+
+Columns can be saved to a directory of `.npy` files and opened again
+memory-mapped. Text columns are then stored as one UTF-8 buffer plus row
+offsets (`StringColumn`), so every process that maps the same files shares
+their pages instead of holding its own copy.
+"""
+
+import os
+from collections.abc import Sequence
+from typing import Dict, Any, Iterable, Optional
+
+import numpy as np
+
+
+def item_id_string(value: Any) -> Optional[str]:
+    """Normalize a catalog item_id to the string form every column layout returns."""
+    return None if value is None else str(value)
+
+
+class StringColumn(Sequence):
+    """Read-only sequence of strings stored as a UTF-8 buffer and row offsets."""
+
+    __slots__ = ("data", "offsets", "nulls")
+
+    def __init__(self, data: np.ndarray, offsets: np.ndarray, nulls: Optional[np.ndarray] = None):
+        self.data = data
+        self.offsets = offsets
+        self.nulls = nulls
+
+    @classmethod
+    def from_values(cls, values: Iterable[Any]) -> "StringColumn":
+        """Encode values; None is kept, anything else is stored as its string form."""
+        values = list(values)
+        encoded = [str(value).encode("utf-8") if value is not None else b"" for value in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(value) for value in encoded], out=offsets[1:])
+        nulls = np.array([value is None for value in values], dtype=bool)
+        return cls(np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets, nulls if nulls.any() else None)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [self[index] for index in range(*row.indices(len(self)))]
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError("StringColumn index out of range")
+        if self.nulls is not None and self.nulls[row]:
+            return None
+        return self.data[self.offsets[row]:self.offsets[row + 1]].tobytes().decode("utf-8")
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield self[row]
+
+
+class CatalogColumns:
+    """Catalog items as parallel per-field columns."""
+
+    __slots__ = ("ids", "item_ids", "names", "categories", "weights", "prices")
+
+    def __init__(self, ids: Sequence[str], item_ids: Sequence[Any], names: Sequence[str], categories: Sequence[str],
+                 weights: np.ndarray, prices: np.ndarray):
+        self.ids = ids
+        self.item_ids = item_ids
+        self.names = names
+        self.categories = categories
+        self.weights = weights
+        self.prices = prices
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def save(self, path: str):
+        """Write the columns to `path` (an existing directory) as `.npy` files."""
+        for name in ("weights", "prices"):
+            np.save(os.path.join(path, f"{name}.npy"), getattr(self, name))
+        for name in ("ids", "item_ids", "names", "categories"):
+            column = getattr(self, name)
+            if not isinstance(column, StringColumn):
+                column = StringColumn.from_values(column)
+            np.save(os.path.join(path, f"{name}.data.npy"), column.data)
+            np.save(os.path.join(path, f"{name}.offsets.npy"), column.offsets)
+            if column.nulls is not None:
+                np.save(os.path.join(path, f"{name}.nulls.npy"), column.nulls)
+
+    @classmethod
+    def load(cls, path: str) -> "CatalogColumns":
+        """Open columns written by `save`, memory-mapped read-only."""
+        def array(filename):
+            return np.load(os.path.join(path, filename), mmap_mode="r")
+
+        def strings(name):
+            nulls = array(f"{name}.nulls.npy") if os.path.exists(os.path.join(path, f"{name}.nulls.npy")) else None
+            return StringColumn(array(f"{name}.data.npy"), array(f"{name}.offsets.npy"), nulls)
+
+        return cls(strings("ids"), strings("item_ids"), strings("names"), strings("categories"),
+                   array("weights.npy"), array("prices.npy"))
+
+    @classmethod
+    def from_documents(cls, documents: Iterable[Dict[str, Any]]) -> "CatalogColumns":
+        """Build columns from catalog documents (or a cursor over them), consuming them one at a time."""
+        raw_ids, item_ids, names, categories, weights, prices = [], [], [], [], [], []
+        for document in documents:
+            raw_ids.append(document["_id"])
+            item_ids.append(item_id_string(document.get("item_id")))
+            names.append(document.get("item_name") or "")
+            categories.append(document.get("category") or "")
+            weights.append(document.get("packet_weight_grams") or 0)
+            prices.append(document.get("price") or 0)
+        return cls(
+            list(map(str, raw_ids)),
+            item_ids,
+            names,
+            categories,
+            np.array(weights, dtype=np.float64),
+            np.array(prices, dtype=np.float64),
+        )
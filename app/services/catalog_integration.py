@@ -8,126 +8,252 @@ use ingredients available in the catalog.
 
 import os
 import json
-from typing import List, Dict, Any, Optional
+import asyncio
+import logging
+from typing import List, Dict, Any, Optional, Tuple
 from app.services.mongodb_service import get_mongodb_service
+from app.services.ingredient_search import normalize_tokens
+from app.services.catalog_snapshot import CatalogSnapshot, get_catalog_snapshot_manager
+from app.services.metrics import span
+
+logger = logging.getLogger(__name__)
+
+# How the catalog block is written into the prompt: "compact" or "json"
+CATALOG_PROMPT_ENCODING = os.getenv("CATALOG_PROMPT_ENCODING", "compact").lower()
+
+# Number of ranked catalog items included in the prompt
+CATALOG_PROMPT_ITEMS = int(os.getenv("CATALOG_PROMPT_ITEMS", 60))
+
+# Best name matches kept for each entry in ingredients_to_include
+INCLUDE_MATCHES_PER_TERM = 6
+
+def _format_number(value: Any) -> str:
+    return f"{value:g}" if isinstance(value, float) else str(value)
+
+def format_catalog_json(ingredients: List[Dict[str, Any]]) -> str:
+    """Write the catalog block as an indented JSON array with the full _id of each item."""
+    ingredient_list = []
+    for ingredient in ingredients:
+        ingredient_list.append({
+            "_id": ingredient['_id'],
+            "item_name": ingredient['item_name'],
+            "category": ingredient['category'],
+            "packet_weight_grams": ingredient['packet_weight_grams'],
+            "price": ingredient['price']
+        })
+    return json.dumps(ingredient_list, indent=2)
+
+def catalog_refs(ingredients: List[Dict[str, Any]]) -> Dict[str, str]:
+    """Number the items of one prompt `i1`, `i2`, ... in order and map each ref to the item's _id."""
+    return {f"i{index}": ingredient['_id'] for index, ingredient in enumerate(ingredients, start=1)}
+
+def format_catalog_compact(ingredients: List[Dict[str, Any]]) -> str:
+    """Write the catalog block as a header row plus one `|`-separated line per item.
+    
+    Items are referenced by their position in the block (see `catalog_refs`) instead of
+    their 24-character _ids. Map them back with `CatalogIntegrationService.resolve_aliases`.
+    """
+    lines = ["ref|item_name|category|packet_weight_grams|price"]
+    for ref, ingredient in zip(catalog_refs(ingredients), ingredients):
+        lines.append("|".join([
+            ref,
+            ingredient['item_name'].replace("|", "/"),
+            ingredient['category'].replace("|", "/"),
+            _format_number(ingredient['packet_weight_grams']),
+            _format_number(ingredient['price']),
+        ]))
+    return "\n".join(lines)
+
+def prompt_item_names(refs: Dict[str, str], snapshot: CatalogSnapshot) -> Dict[str, set]:
+    """Normalized name tokens of each item in one prompt, by ref."""
+    names = {}
+    for ref, mongodb_id in refs.items():
+        row = snapshot.id_index.get(mongodb_id)
+        names[ref] = set(normalize_tokens(snapshot.names[row] or "")) if row is not None else set()
+    return names
+
+def names_match(item_name: Any, ref: str, names: Dict[str, set]) -> bool:
+    """Check that a name returned by the model with `ref` fits that prompt item at least as well as any other.
+    
+    Models shorten or reword names, so this compares shared words rather than whole names, and
+    a missing name is not a conflict. `names` comes from `prompt_item_names`.
+    """
+    if not isinstance(item_name, str) or not item_name.strip():
+        return True
+    tokens = set(normalize_tokens(item_name))
+    overlap = len(tokens & names.get(ref, set()))
+    return overlap > 0 and all(len(tokens & other) <= overlap for other in names.values())
 
 class CatalogIntegrationService:
     """Service to integrate grocery catalog with recipe generation."""
     
     def __init__(self):
-        """Initialize with MongoDB service."""
+        """Initialize with the shared catalog snapshot."""
         try:
-            self.mongodb_service = get_mongodb_service()
-            self.categories = self.mongodb_service.get_all_categories()
-            print(f"Catalog integration initialized with {len(self.categories)} categories")
+            self.snapshots = get_catalog_snapshot_manager()
+            snapshot = self.snapshots.get()
+            logger.info("Catalog integration initialized with %d categories", len(snapshot.categories))
         except Exception as e:
             raise Exception(f"Failed to initialize catalog integration: {e}")
     
+    @property
+    def mongodb_service(self):
+        """The process-wide MongoDB service."""
+        return get_mongodb_service()
+    
+    @property
+    def categories(self) -> List[str]:
+        """Categories in the current catalog snapshot."""
+        return self.snapshots.get().categories
+    
     def get_available_ingredients(self, category: Optional[str] = None) -> List[Dict[str, Any]]:
         """Get a list of available ingredients, optionally filtered by category."""
-        return self.mongodb_service.get_available_ingredients(category)
+        snapshot = self.snapshots.get()
+        if category:
+            return snapshot.items_in_category(category)
+        return snapshot.items(range(len(snapshot)))
     
     def search_ingredients(self, query: str) -> List[Dict[str, Any]]:
         """Search for ingredients matching the query."""
-        return self.mongodb_service.search_items(query)
+        return self.snapshots.get().search(query)
     
-    def enhance_recipe_prompt(self, prompt: str, preferences: Dict[str, Any]) -> str:
-        """Enhance the recipe prompt with catalog information."""
-        # Get ingredients from the catalog
-        all_ingredients = []
-        
-        # If cuisine is specified, get ingredients commonly used in that cuisine
-        if 'cuisine' in preferences:
-            cuisine = preferences['cuisine'].lower()
-            if cuisine == 'italian':
-                categories = ['Vegetables', 'Dairy', 'Grains', 'Herbs']
-            elif cuisine == 'asian':
-                categories = ['Vegetables', 'Seafood', 'Grains', 'Spices']
-            elif cuisine == 'mexican':
-                categories = ['Vegetables', 'Meat', 'Grains', 'Spices']
-            elif cuisine == 'indian':
-                categories = ['Vegetables', 'Dairy', 'Grains', 'Spices']
-            else:
-                categories = ['Vegetables', 'Meat', 'Grains', 'Dairy']
-                
-            for category in categories:
-                if category in self.categories:
-                    category_ingredients = self.mongodb_service.get_items_by_category(category)
-                    all_ingredients.extend(category_ingredients[:20])  # Limit to 20 items per category
-        
-        # If specific ingredients are requested, prioritize those
-        if 'ingredients_to_include' in preferences and preferences['ingredients_to_include']:
-            for ingredient in preferences['ingredients_to_include']:
-                matches = self.search_ingredients(ingredient)
-                if matches:
-                    all_ingredients = matches + all_ingredients
-        
-        # If we don't have enough ingredients, get some random ones
-        if len(all_ingredients) < 50:
-            random_ingredients = self.mongodb_service.get_random_ingredients(50 - len(all_ingredients))
-            all_ingredients.extend(random_ingredients)
-        
-        # Remove duplicates while preserving order (based on _id)
-        seen_ids = set()
-        unique_ingredients = []
-        for ingredient in all_ingredients:
-            if ingredient['_id'] not in seen_ids:
-                seen_ids.add(ingredient['_id'])
-                unique_ingredients.append(ingredient)
-        
-        # Limit to a reasonable number of ingredients (max 100)
-        unique_ingredients = unique_ingredients[:100]
-        
-        # Create a structured list of ingredients for the LLM
-        ingredient_list = []
-        for ingredient in unique_ingredients:
-            ingredient_list.append({
-                "_id": ingredient['_id'],
-                "item_name": ingredient['item_name'],
-                "category": ingredient['category'],
-                "packet_weight_grams": ingredient['packet_weight_grams'],
-                "price": ingredient['price']
-            })
-        
-        # Enhance the prompt with catalog information
+    def search_ingredients_many(self, queries: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """Search for several ingredients at once, returning ranked matches per query."""
+        return self.snapshots.get().search_many(queries)
+    
+    def enhance_recipe_prompt(self, prompt: str, preferences: Dict[str, Any],
+                              snapshot: Optional[CatalogSnapshot] = None) -> Tuple[str, Dict[str, str]]:
+        """Enhance the recipe prompt with catalog information.
+        
+        Pass `snapshot` to build several prompts against the same catalog snapshot.
+        Returns the prompt and the map from the refs in its catalog block to MongoDB
+        _ids, which is empty for the "json" encoding.
+        
+        The catalog rules are written before the item list and do not depend on the
+        request, so pass the static instructions as `prompt` and append the preferences
+        afterwards to keep as long a prefix as possible shared between prompts.
+        """
+        # Get ingredients from the in-process catalog snapshot (no database reads)
+        if snapshot is None:
+            snapshot = self.snapshots.get()
+        
+        # Resolve requested ingredients first, in one pass over the name index
+        include_terms = preferences.get('ingredients_to_include') or []
+        if isinstance(include_terms, str):
+            include_terms = [include_terms]
+        include_terms = [term for term in include_terms if isinstance(term, str)]
+        with span("catalog_search"):
+            matches = snapshot.search_index.search_many(include_terms, limit=INCLUDE_MATCHES_PER_TERM)
+        rows = [int(row) for term in include_terms for row in matches[term]]
+        
+        # Then rank catalog items against the whole preferences dict
+        with span("catalog_rank"):
+            rows.extend(int(row) for row in snapshot.top_k_rows(preferences, CATALOG_PROMPT_ITEMS))
+        
+        # Remove duplicates while preserving order, then build documents only for the rows in the prompt
+        unique_ingredients = snapshot.items(list(dict.fromkeys(rows))[:CATALOG_PROMPT_ITEMS])
+        
+        # Enhance the prompt with the catalog rules, then the catalog items
         enhanced_prompt = prompt + "\n\n"
-        enhanced_prompt += "IMPORTANT: You must ONLY use ingredients from the following catalog in your recipe. DO NOT invent or use any ingredients not listed here.\n\n"
-        enhanced_prompt += "Available ingredients from the grocery catalog:\n"
-        enhanced_prompt += json.dumps(ingredient_list, indent=2)
-        
-        enhanced_prompt += "\n\nIMPORTANT INSTRUCTIONS:"
-        enhanced_prompt += "\n1. The necessary_items and optional_items in your response must ONLY contain _id values from this list."
-        enhanced_prompt += "\n2. DO NOT make up or generate any _id values."
-        enhanced_prompt += "\n3. Only use the exact _id strings provided in the catalog above."
+        enhanced_prompt += "IMPORTANT: You must ONLY use ingredients from the catalog below in your recipe. DO NOT invent or use any ingredients not listed there.\n\n"
+        enhanced_prompt += "IMPORTANT INSTRUCTIONS:"
+        if CATALOG_PROMPT_ENCODING == "compact":
+            enhanced_prompt += "\n1. Use the ref value of a catalog line as the _id of that ingredient (for example \"_id\": \"i12\")."
+            enhanced_prompt += "\n2. The necessary_items and optional_items in your response must ONLY contain ref values from the catalog as _id."
+            enhanced_prompt += "\n3. DO NOT make up or generate any ref or _id values."
+        else:
+            enhanced_prompt += "\n1. The necessary_items and optional_items in your response must ONLY contain _id values from the catalog."
+            enhanced_prompt += "\n2. DO NOT make up or generate any _id values."
+            enhanced_prompt += "\n3. Only use the exact _id strings provided in the catalog below."
         enhanced_prompt += "\n4. Make sure all ingredients needed for the recipe are available in the catalog."
         enhanced_prompt += "\n5. If you can't make a good recipe with these ingredients, say so rather than making up ingredients."
         
-        return enhanced_prompt
+        if CATALOG_PROMPT_ENCODING == "compact":
+            enhanced_prompt += "\n\nAvailable ingredients from the grocery catalog (header row, then one ingredient per line):\n"
+            enhanced_prompt += format_catalog_compact(unique_ingredients)
+            refs = catalog_refs(unique_ingredients)
+        else:
+            enhanced_prompt += "\n\nAvailable ingredients from the grocery catalog:\n"
+            enhanced_prompt += format_catalog_json(unique_ingredients)
+            refs = {}
+        
+        return enhanced_prompt, refs
+    
+    async def enhance_recipe_prompt_async(self, prompt: str, preferences: Dict[str, Any],
+                                          snapshot: Optional[CatalogSnapshot] = None) -> Tuple[str, Dict[str, str]]:
+        """Enhance the recipe prompt without blocking the event loop.
+        
+        The only I/O is loading the snapshot when it is not yet available, which runs
+        in a worker thread. Ingredient selection itself is in-memory.
+        """
+        if snapshot is None:
+            snapshot = await asyncio.to_thread(self.snapshots.get)
+        return self.enhance_recipe_prompt(prompt, preferences, snapshot)
+    
+    def resolve_aliases(self, ingredients: Dict[str, Any], refs: Optional[Dict[str, str]],
+                        snapshot: Optional[CatalogSnapshot] = None) -> Dict[str, Any]:
+        """Replace compact catalog refs in one recipe's ingredients with the real MongoDB _ids.
+        
+        `refs` is the map returned with the prompt by `enhance_recipe_prompt`, and `snapshot`
+        the snapshot the prompt was built from. Refs that are not in the map, and refs whose
+        item_name fits another item of the prompt better, are left unchanged, so that
+        validation matches them to the catalog by name instead. Entries that are already
+        _ids are left unchanged.
+        """
+        if not refs:
+            return ingredients
+        if snapshot is None:
+            snapshot = self.snapshots.get()
+        
+        names = prompt_item_names(refs, snapshot)
+        
+        def resolve(ref, item_name=None):
+            if not isinstance(ref, str) or ref not in refs or not names_match(item_name, ref, names):
+                return None
+            return refs[ref] if refs[ref] in snapshot.id_index else None
+        
+        for key in ('necessary_items', 'optional_items'):
+            entries = ingredients.get(key)
+            if not isinstance(entries, list):
+                continue
+            for index, entry in enumerate(entries):
+                if isinstance(entry, dict):
+                    mongodb_id = resolve(entry.get('_id'), entry.get('item_name'))
+                    if mongodb_id:
+                        entry['_id'] = mongodb_id
+                else:
+                    mongodb_id = resolve(entry)
+                    if mongodb_id:
+                        entries[index] = mongodb_id
+        
+        return ingredients
+    
+    def hydrate_ingredients(self, ingredients: Dict[str, Any], snapshot: Optional[CatalogSnapshot] = None) -> Dict[str, Any]:
+        """Add catalog details for the necessary and optional items of one recipe's ingredients."""
+        if snapshot is None:
+            snapshot = self.snapshots.get()
+        
+        # Check if necessary_items contains MongoDB _ids
+        if 'necessary_items' in ingredients:
+            # Get the full ingredient details for display
+            ingredients['necessary_items_details'] = snapshot.get_many(ingredients['necessary_items'])
+        
+        # Do the same for optional_items
+        if 'optional_items' in ingredients:
+            ingredients['optional_items_details'] = snapshot.get_many(ingredients['optional_items'])
+        
+        return ingredients
     
     def validate_recipe_ingredients(self, recipes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """Validate and enhance recipe ingredients with catalog information."""
+        snapshot = self.snapshots.get()
         validated_recipes = []
         
         for recipe in recipes:
             if 'ingredients' not in recipe:
                 continue
-                
-            # Check if necessary_items contains MongoDB _ids
-            if 'necessary_items' in recipe['ingredients']:
-                necessary_ids = recipe['ingredients']['necessary_items']
-                
-                # Get the full ingredient details for display
-                necessary_items_details = self.mongodb_service.get_items_by_mongodb_ids(necessary_ids)
-                recipe['ingredients']['necessary_items_details'] = necessary_items_details
-            
-            # Do the same for optional_items
-            if 'optional_items' in recipe['ingredients']:
-                optional_ids = recipe['ingredients']['optional_items']
-                
-                # Get the full ingredient details for display
-                optional_items_details = self.mongodb_service.get_items_by_mongodb_ids(optional_ids)
-                recipe['ingredients']['optional_items_details'] = optional_items_details
             
+            self.hydrate_ingredients(recipe['ingredients'], snapshot)
             validated_recipes.append(recipe)
         
         return validated_recipes
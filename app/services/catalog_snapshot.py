@@ -0,0 +1,449 @@
+"""
+Catalog Snapshot
+
+This module keeps an in-process snapshot of the grocery catalog so that
+building a recipe prompt does not need any MongoDB reads on the hot path.
+The snapshot is loaded once and kept current in the background: changes
+reported by the catalog change feed are applied as deltas, and the whole
+snapshot is reloaded when its TTL expires or a change cannot be applied
+incrementally. Subscribers are notified of every change, so caches built on
+the catalog can drop the entries it affects.
+"""
+
+import os
+import copy
+import logging
+import threading
+import time
+from typing import List, Dict, Any, Optional, Iterable, Callable, Union
+
+import numpy as np
+
+from app.services.mongodb_service import get_mongodb_service
+from app.services.catalog_columns import CatalogColumns, item_id_string
+from app.services.catalog_store import get_catalog_store
+from app.services.ingredient_ranker import IngredientRanker
+from app.services.ingredient_search import IngredientSearchIndex
+from app.services.catalog_changes import CatalogChange, get_change_feed, ChangeStreamFeed, WatermarkChangeFeed
+from app.services.recipe_costs import CategoryPriceIndex
+from app.services.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+
+class CatalogSnapshot:
+    """Read-only, indexed view of the catalog collection.
+
+    Item fields are kept in compact per-column arrays and every lookup
+    resolves to row numbers into those arrays. The name search, relevance
+    and category price indexes are built lazily.
+
+    `base_version` is the version of the full load a snapshot descends from;
+    snapshots derived by `apply_changes` keep it and get a new `version`.
+    `sequence` increases with every snapshot a manager installs.
+    """
+
+    def __init__(self, items: Union[CatalogColumns, List[Dict[str, Any]]], version: Optional[str] = None):
+        """Build the snapshot from catalog columns, or from a list of catalog documents."""
+        self.version = version
+        self.base_version = version
+        self.sequence = 0
+        self.loaded_at = time.time()
+
+        columns = items if isinstance(items, CatalogColumns) else CatalogColumns.from_documents(items)
+        self.ids = columns.ids
+        self.item_ids = columns.item_ids
+        self.names = columns.names
+        self.category_names = sorted(set(columns.categories))
+        category_codes = {name: code for code, name in enumerate(self.category_names)}
+        self.category_codes = np.fromiter(
+            (category_codes[name] for name in columns.categories), dtype=np.int32, count=len(columns)
+        )
+        self.weights = columns.weights
+        self.prices = columns.prices
+
+        # Indexes
+        self.id_index = {id_str: row for row, id_str in enumerate(self.ids)}
+        self.category_index = {
+            name: np.flatnonzero(self.category_codes == code)
+            for code, name in enumerate(self.category_names)
+        }
+        self._search_index: Optional[IngredientSearchIndex] = None
+        self._ranker: Optional[IngredientRanker] = None
+        self._price_index: Optional[CategoryPriceIndex] = None
+        self._index_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def categories(self) -> List[str]:
+        """All non-empty categories in the snapshot."""
+        return [name for name in self.category_names if name]
+
+    def item(self, row: int) -> Dict[str, Any]:
+        """Build the catalog document for a row."""
+        weight = float(self.weights[row])
+        return {
+            "_id": self.ids[row],
+            "item_id": self.item_ids[row],
+            "category": self.category_names[self.category_codes[row]],
+            "item_name": self.names[row],
+            "packet_weight_grams": int(weight) if weight.is_integer() else weight,
+            "price": float(self.prices[row]),
+        }
+
+    def items(self, rows: Iterable[int]) -> List[Dict[str, Any]]:
+        """Build catalog documents for several rows."""
+        return [self.item(int(row)) for row in rows]
+
+    def get(self, mongodb_id: str) -> Optional[Dict[str, Any]]:
+        """Get an item by its MongoDB _id."""
+        row = self.id_index.get(mongodb_id)
+        return self.item(row) if row is not None else None
+
+    def get_many(self, mongodb_ids: List[Any]) -> List[Dict[str, Any]]:
+        """Get items by their MongoDB _ids, in input order, skipping unknown ids.
+
+        Entries may also be ingredient objects with an `_id` field, as returned by the model.
+        """
+        rows = []
+        for entry in mongodb_ids:
+            id_str = entry.get('_id') if isinstance(entry, dict) else entry
+            if isinstance(id_str, str) and id_str in self.id_index:
+                rows.append(self.id_index[id_str])
+        return self.items(rows)
+
+    def items_in_category(self, category: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Get items in a category, optionally limited to the first `limit` rows."""
+        rows = self.category_index.get(category)
+        if rows is None:
+            return []
+        return self.items(rows[:limit] if limit is not None else rows)
+
+    @property
+    def search_index(self) -> IngredientSearchIndex:
+        """Name search index over the snapshot, built on first use."""
+        if self._search_index is None:
+            with self._index_lock:
+                if self._search_index is None:
+                    self._search_index = IngredientSearchIndex(self.names)
+        return self._search_index
+
+    def search(self, query: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Search items by name, ignoring case, diacritics and plurals, best match first."""
+        return self.items(self.search_index.search(query, limit))
+
+    def search_many(self, queries: Iterable[str], limit: Optional[int] = None) -> Dict[str, List[Dict[str, Any]]]:
+        """Resolve several search terms in one pass."""
+        return {
+            query: self.items(rows)
+            for query, rows in self.search_index.search_many(queries, limit).items()
+        }
+
+    @property
+    def ranker(self) -> IngredientRanker:
+        """Relevance index over the snapshot, built on first use."""
+        if self._ranker is None:
+            with self._index_lock:
+                if self._ranker is None:
+                    categories = [self.category_names[code] for code in self.category_codes]
+                    self._ranker = IngredientRanker(self.names, categories)
+        return self._ranker
+
+    def top_k_rows(self, preferences: Dict[str, Any], k: int) -> List[int]:
+        """Get the rows of the k catalog items most relevant to the preferences, best first."""
+        return self.ranker.top_k(preferences, k, self.category_codes)
+
+    def top_k(self, preferences: Dict[str, Any], k: int) -> List[Dict[str, Any]]:
+        """Get the k catalog items most relevant to the preferences, best first."""
+        return self.items(self.top_k_rows(preferences, k))
+
+    @property
+    def price_index(self) -> CategoryPriceIndex:
+        """Per-category, price-sorted index over the snapshot, built on first use."""
+        if self._price_index is None:
+            with self._index_lock:
+                if self._price_index is None:
+                    self._price_index = CategoryPriceIndex(self.category_codes, self.prices, len(self.category_names))
+        return self._price_index
+
+    def build_indexes(self):
+        """Build the search, relevance and price indexes now, so requests never wait for them."""
+        self.search_index
+        self.ranker
+        self.price_index
+
+    def cheapest_substitutes(self, mongodb_id: str, limit: int = 1) -> List[Dict[str, Any]]:
+        """Get up to `limit` items in the same category that cost less than the given one, cheapest first."""
+        row = self.id_index.get(mongodb_id)
+        if row is None or not self.category_names[self.category_codes[row]]:
+            return []
+        return self.items(self.price_index.cheaper(row, limit))
+
+    def apply_changes(self, change: CatalogChange) -> Optional["CatalogSnapshot"]:
+        """Build the snapshot that results from a delta, leaving this one untouched.
+
+        Price, weight and item_id updates copy only the value arrays and share
+        this snapshot's rows and indexes. Inserts, deletions, renames and
+        category moves rebuild the snapshot from the merged items, without
+        reading MongoDB. Indexes the new snapshot does not share are built
+        before it is returned, so it can be swapped in without slowing the
+        requests that use it first. Fills `change.categories` with the
+        categories that gained items.
+
+        Returns:
+            CatalogSnapshot: The new snapshot, or None if the change alters nothing
+        """
+        deleted = {mongodb_id for mongodb_id in change.deleted if mongodb_id in self.id_index}
+        updated = {}
+        inserted = []
+        structural = bool(deleted)
+        for item in change.upserted:
+            row = self.id_index.get(str(item["_id"]))
+            if row is None:
+                inserted.append(item)
+                change.categories.add(item.get("category") or "")
+                structural = True
+                continue
+            current = self.item(row)
+            values = dict(current, **{key: value for key, value in item.items() if key != "_id"})
+            values["item_name"] = values.get("item_name") or ""
+            values["category"] = values.get("category") or ""
+            if values == current:
+                continue
+            updated[row] = values
+            if values["item_name"] != current["item_name"] or values["category"] != current["category"]:
+                change.categories.add(values.get("category") or "")
+                structural = True
+        if not (deleted or updated or inserted):
+            return None
+
+        if structural:
+            items = [
+                updated.get(row) or self.item(row)
+                for row, mongodb_id in enumerate(self.ids) if mongodb_id not in deleted
+            ]
+            snapshot = CatalogSnapshot(items + inserted, self.base_version)
+            snapshot.loaded_at = self.loaded_at
+        else:
+            snapshot = copy.copy(self)
+            snapshot.item_ids = list(self.item_ids)
+            snapshot.weights = self.weights.copy()
+            snapshot.prices = self.prices.copy()
+            # Name and relevance indexes still apply; the price order may not
+            snapshot._price_index = None
+            snapshot._index_lock = threading.Lock()
+            for row, values in updated.items():
+                snapshot.item_ids[row] = item_id_string(values.get("item_id"))
+                snapshot.weights[row] = values.get("packet_weight_grams") or 0
+                snapshot.prices[row] = values.get("price") or 0
+        snapshot.sequence = self.sequence + 1
+        snapshot.version = f"{self.base_version}+{snapshot.sequence}"
+        snapshot.build_indexes()
+        return snapshot
+
+
+class CatalogSnapshotManager:
+    """Holds the current catalog snapshot and keeps it current in the background."""
+
+    def __init__(self, mongodb_service=None, ttl: Optional[float] = None, check_interval: Optional[float] = None, feed=None, store=None):
+        """Initialize the manager. The snapshot itself is loaded on first use.
+
+        With a `CatalogStore` (CATALOG_SHARED_DIR), full loads are shared with the
+        other processes using the same store directory.
+        """
+        self._mongodb_service = mongodb_service
+        self.feed = feed or get_change_feed(lambda: self.mongodb_service)
+        self.store = store if store is not None else get_catalog_store()
+        self.ttl = ttl if ttl is not None else float(os.getenv("CATALOG_SNAPSHOT_TTL", 900))
+        self.check_interval = (
+            check_interval if check_interval is not None
+            else float(os.getenv("CATALOG_VERSION_CHECK_INTERVAL", 60))
+        )
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._subscribers: List[Callable[[CatalogChange, CatalogSnapshot], None]] = []
+        self.counts = {"deltas": 0, "reloads": 0}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._thread_pid: Optional[int] = None
+
+    @property
+    def mongodb_service(self):
+        """The injected MongoDB service, or the process-wide one."""
+        return self._mongodb_service or get_mongodb_service()
+
+    def get(self) -> CatalogSnapshot:
+        """Return the current snapshot, loading it synchronously the first time."""
+        snapshot = self._snapshot
+        if snapshot is None:
+            with self._lock:
+                if self._snapshot is None:
+                    self._snapshot = self._load()
+                snapshot = self._snapshot
+        self._ensure_refresher()
+        return snapshot
+
+    def subscribe(self, callback: Callable[[CatalogChange, CatalogSnapshot], None]):
+        """Call `callback(change, snapshot)` after every change is installed.
+
+        Full reloads are reported as a change with `full` set and no items.
+        """
+        self._subscribers.append(callback)
+
+    def refresh(self, force: bool = False) -> bool:
+        """Bring the snapshot up to date with the catalog.
+
+        Changes reported by the change feed are applied as a delta. The whole
+        snapshot is reloaded when forced, when its TTL expired, or when the feed
+        cannot describe the change.
+
+        Returns:
+            bool: True if a new snapshot was installed
+        """
+        with self._refresh_lock:
+            current = self._snapshot
+            change = None
+            if not force and current is not None and time.time() - current.loaded_at < self.ttl:
+                try:
+                    change = self.feed.poll(current)
+                except Exception as e:
+                    logger.warning("Catalog change feed failed, reloading the snapshot: %s", e)
+                    change = CatalogChange(full=True)
+                if change is None:
+                    return False
+            if change is not None and not change.full:
+                snapshot = current.apply_changes(change)
+                if snapshot is None:
+                    return False
+                self.counts["deltas"] += 1
+                logger.info("Applied catalog delta of %d items (version %s)", len(change.ids), snapshot.version)
+            else:
+                change = CatalogChange(full=True)
+                snapshot = self._load()
+                self.counts["reloads"] += 1
+            with self._lock:
+                self._snapshot = snapshot
+        self._publish(change, snapshot)
+        return True
+
+    def stop(self, wait: bool = False):
+        """Stop the background refresh thread, optionally waiting until it has exited.
+
+        Wait before forking, so no refresh is left holding a lock in the children.
+        """
+        self._stop.set()
+        thread = self._thread
+        if wait and thread is not None and self._thread_pid == os.getpid():
+            thread.join()
+
+    def _publish(self, change: CatalogChange, snapshot: CatalogSnapshot):
+        for callback in list(self._subscribers):
+            try:
+                callback(change, snapshot)
+            except Exception as e:
+                logger.warning("Catalog change subscriber failed: %s", e)
+
+    def _start_feed(self):
+        try:
+            self.feed.start()
+        except Exception as e:
+            if not isinstance(self.feed, ChangeStreamFeed):
+                raise
+            logger.warning("Catalog change stream unavailable, polling updated_at instead: %s", e)
+            self.feed = WatermarkChangeFeed(lambda: self.mongodb_service)
+            self.feed.start()
+
+    def _load(self) -> CatalogSnapshot:
+        # Start the feed first, so changes made while the items load are reported afterwards
+        self._start_feed()
+        version = self.mongodb_service.get_catalog_version()
+        columns, saved_at = self._load_columns(version)
+        snapshot = CatalogSnapshot(columns, version)
+        if saved_at is not None:
+            # Mapped or shared columns expire with the save, so every process reloads around the same time
+            snapshot.loaded_at = saved_at
+        if self._snapshot is not None:
+            snapshot.sequence = self._snapshot.sequence + 1
+        # Build the search, relevance and price indexes off the request path
+        snapshot.build_indexes()
+        logger.info("Loaded catalog snapshot with %d items (version %s)", len(snapshot), version)
+        return snapshot
+
+    def _load_columns(self, version: Optional[str]):
+        # Columns of the catalog at `version` and when they were saved to the store (None without one)
+        if self.store is None:
+            return self.mongodb_service.get_catalog_columns(), None
+        stored = self._load_stored(version)
+        if stored is not None:
+            return stored
+        # Processes whose snapshots expire together take turns: the first reads MongoDB
+        # and saves, the others find its save once they get the lock
+        with self.store.lock():
+            stored = self._load_stored(version)
+            if stored is not None:
+                return stored
+            columns = self.mongodb_service.get_catalog_columns()
+            try:
+                return self.store.save(version, columns)
+            except OSError as e:
+                logger.warning("Could not save the catalog to the shared store, keeping it in memory: %s", e)
+                return columns, None
+
+    def _load_stored(self, version: Optional[str]):
+        try:
+            stored = self.store.load(version, self.ttl)
+        except OSError as e:
+            logger.warning("Shared catalog store unavailable: %s", e)
+            return None
+        if stored is not None:
+            logger.info("Mapped shared catalog columns for version %s", version)
+        return stored
+
+    def collect_metrics(self):
+        """Report the size and age of the current snapshot for `/api/metrics`."""
+        snapshot = self._snapshot
+        if snapshot is None:
+            return
+        yield "catalog_snapshot_items", "gauge", "Items in the current catalog snapshot.", [({}, len(snapshot))]
+        yield "catalog_snapshot_age_seconds", "gauge", "Seconds since the current catalog snapshot was loaded.", [({}, time.time() - snapshot.loaded_at)]
+        yield "catalog_snapshot_updates_total", "counter", "Catalog changes applied as deltas or full reloads.", [
+            ({"kind": "delta"}, self.counts["deltas"]),
+            ({"kind": "reload"}, self.counts["reloads"]),
+        ]
+
+    def _ensure_refresher(self):
+        # Threads do not survive fork(), so restart the refresher in each new process
+        if self._thread_pid == os.getpid() or self.check_interval <= 0:
+            return
+        with self._lock:
+            if self._thread_pid == os.getpid():
+                return
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._refresh_loop, name="catalog-snapshot-refresh", daemon=True)
+            self._thread_pid = os.getpid()
+            self._thread.start()
+
+    def _refresh_loop(self):
+        stop = self._stop
+        while not stop.wait(self.check_interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.warning("Catalog snapshot refresh failed: %s", e)
+
+
+_snapshot_manager: Optional[CatalogSnapshotManager] = None
+_snapshot_manager_lock = threading.Lock()
+
+def get_catalog_snapshot_manager() -> CatalogSnapshotManager:
+    """Get the process-wide catalog snapshot manager."""
+    global _snapshot_manager
+    if _snapshot_manager is None:
+        with _snapshot_manager_lock:
+            if _snapshot_manager is None:
+                _snapshot_manager = CatalogSnapshotManager()
+                registry.register_collector("catalog_snapshot", _snapshot_manager.collect_metrics)
+    return _snapshot_manager
@@ -0,0 +1,188 @@
+"""
+Catalog Store
+
+This module shares the catalog between the worker processes of one server.
+A process that loads the catalog from MongoDB saves its columns to a
+directory under CATALOG_SHARED_DIR (a tmpfs such as /dev/shm by default
+under Gunicorn) and maps them back read-only. Workers that then need the
+same catalog version map the existing files instead of reading MongoDB, and
+all of them share the mapped pages.
+
+Each save goes to a new directory that is renamed into place, so readers never
+see a partial catalog. Older directories, and staging directories left behind
+by a process that died mid-save, are removed; processes that still map them
+keep their mapping until they load a newer one. Processes reloading at the same
+time take turns through a lock on the directory, so only the first one reads
+MongoDB and the others map its save. When the directory runs out of space (e.g.
+Docker's 64 MB /dev/shm), saves go to the fallback directory instead.
+"""
+
+import os
+import json
+import time
+import errno
+import shutil
+import hashlib
+import logging
+import tempfile
+import contextlib
+from typing import Optional, Tuple, List
+
+try:
+    import fcntl
+except ImportError:  # Windows: saves are atomic either way, only the reload coordination is lost
+    fcntl = None
+
+from app.services.catalog_columns import CatalogColumns
+
+logger = logging.getLogger(__name__)
+
+META_FILE = "meta.json"
+STAGING_PREFIX = ".staging-"
+
+# Staging directories older than this are removed even if the process that made them still runs
+STAGING_MAX_AGE = 3600
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class CatalogStore:
+    """Catalog columns saved as memory-mapped files, one directory per load."""
+
+    def __init__(self, path: str, keep: int = 2, fallback_path: Optional[str] = None):
+        """
+        Args:
+            path: Directory holding the saved catalogs (created if missing)
+            keep: Saved catalogs to keep; older ones are removed after each save
+            fallback_path: Directory to save to when `path` is out of space (e.g. on disk, still shared
+                through the page cache)
+        """
+        self.path = path
+        self.keep = keep
+        self.paths: List[str] = [path] + ([fallback_path] if fallback_path and fallback_path != path else [])
+        for directory in self.paths:
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def _prefix(version: Optional[str]) -> str:
+        return hashlib.sha1(str(version).encode("utf-8")).hexdigest()[:16]
+
+    def _saved(self):
+        # (saved_at, directory, meta) of every complete save, newest first
+        saved = []
+        for directory in self.paths:
+            for name in os.listdir(directory):
+                try:
+                    with open(os.path.join(directory, name, META_FILE)) as f:
+                        meta = json.load(f)
+                except (OSError, ValueError):
+                    continue
+                saved.append((meta.get("saved_at", 0), os.path.join(directory, name), meta))
+        return sorted(saved, reverse=True)
+
+    @contextlib.contextmanager
+    def lock(self):
+        """Hold an exclusive lock on the store directory, shared by every process using it."""
+        fd = None
+        if fcntl is not None:
+            try:
+                fd = os.open(self.path, os.O_RDONLY)
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            except OSError as e:
+                logger.warning("Could not lock the shared catalog store: %s", e)
+                if fd is not None:
+                    os.close(fd)
+                fd = None
+        try:
+            yield
+        finally:
+            if fd is not None:
+                # Closing the descriptor releases the lock
+                os.close(fd)
+
+    def load(self, version: Optional[str], max_age: float) -> Optional[Tuple[CatalogColumns, float]]:
+        """Map the newest saved catalog of `version`, if it was saved less than `max_age` seconds ago.
+
+        Returns:
+            tuple: The mapped columns and the time they were saved, or None
+        """
+        for saved_at, directory, meta in self._saved():
+            if meta.get("version") != version or time.time() - saved_at >= max_age:
+                continue
+            try:
+                return CatalogColumns.load(directory), saved_at
+            except (OSError, ValueError) as e:
+                # Removed by another process's cleanup between listing and mapping
+                logger.warning("Could not map saved catalog %s: %s", directory, e)
+        return None
+
+    def save(self, version: Optional[str], columns: CatalogColumns) -> Tuple[CatalogColumns, float]:
+        """Save the columns for `version` and map them back.
+
+        Returns:
+            tuple: The mapped columns and the time they were saved
+        """
+        saved_at = time.time()
+        for index, directory in enumerate(self.paths):
+            try:
+                target = self._save_in(directory, version, columns, saved_at)
+                break
+            except OSError as e:
+                if e.errno != errno.ENOSPC or index == len(self.paths) - 1:
+                    raise
+                logger.warning("No space left in %s for the catalog, saving to %s instead", directory, self.paths[index + 1])
+        self._clean_up()
+        return CatalogColumns.load(target), saved_at
+
+    def _save_in(self, directory: str, version: Optional[str], columns: CatalogColumns, saved_at: float) -> str:
+        # The pid in the staging name lets `_clean_up` tell abandoned directories from ones in progress
+        staging = tempfile.mkdtemp(prefix=f"{STAGING_PREFIX}{os.getpid()}-", dir=directory)
+        try:
+            columns.save(staging)
+            # Written last: a directory without it is incomplete and never loaded
+            with open(os.path.join(staging, META_FILE), "w") as f:
+                json.dump({"version": version, "saved_at": saved_at, "items": len(columns)}, f)
+            target = os.path.join(directory, f"{self._prefix(version)}-{time.time_ns()}-{os.getpid()}")
+            os.rename(staging, target)
+        except Exception:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        return target
+
+    def _clean_up(self):
+        for _, directory, _ in self._saved()[self.keep:]:
+            shutil.rmtree(directory, ignore_errors=True)
+        for directory in self.paths:
+            for name in os.listdir(directory):
+                if name.startswith(STAGING_PREFIX) and self._abandoned(os.path.join(directory, name)):
+                    shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+    @staticmethod
+    def _abandoned(staging: str) -> bool:
+        # Left behind by a process that died mid-save, or too old to still be in progress
+        try:
+            pid = int(os.path.basename(staging)[len(STAGING_PREFIX):].split("-", 1)[0])
+        except ValueError:
+            pid = None
+        try:
+            age = time.time() - os.path.getmtime(staging)
+        except OSError:
+            return False
+        return pid is None or not _pid_alive(pid) or age > STAGING_MAX_AGE
+
+
+def get_catalog_store() -> Optional[CatalogStore]:
+    """Factory function to build the catalog store in CATALOG_SHARED_DIR, or None when it is not set."""
+    path = os.getenv("CATALOG_SHARED_DIR")
+    if not path:
+        return None
+    return CatalogStore(path, keep=int(os.getenv("CATALOG_SHARED_KEEP", 2)),
+                        fallback_path=os.getenv("CATALOG_SHARED_FALLBACK_DIR") or None)
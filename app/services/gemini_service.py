@@ -5,38 +5,287 @@ This module handles interactions with Google's Gemini LLM for recipe generation.
 """
 
 import os
+import copy
 import json
-from google import genai
+import time
+import random
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from app.services.catalog_integration import get_integration_service
+from app.services.catalog_snapshot import get_catalog_snapshot_manager
+from app.services.catalog_changes import recipe_tags
+from app.services.recipe_cache import get_recipe_cache as build_recipe_cache, is_cacheable, make_cache_key
+from app.services.recipe_pool import get_recipe_pool
+from app.services.stream_parser import IncrementalRecipeParser
+from app.services.single_flight import SingleFlight, AsyncSingleFlight
+from app.services.model_scheduler import get_model_scheduler, ModelOverloadedError, INTERACTIVE, BATCH
+from app.services.recipe_schema import RECIPE_RESPONSE_SCHEMA, INGREDIENT_LISTS
+from app.services.recipe_repair import validate_and_repair, fix_ids_locally, drop_unknown_ingredients
+from app.services.recipe_costs import add_recipe_totals
+from app.services.metrics import registry, span, stats_collector, record_usage, STAGE_SECONDS, PROMPT_CHARS, GENERATIONS
 
 # Load environment variables
 load_dotenv()
-client = genai.Client()
 
-# Initialize catalog integration service
-try:
-    catalog_service = get_integration_service()
-    catalog_integration_enabled = True
-    print("Catalog integration service initialized successfully")
-except Exception as e:
-    catalog_integration_enabled = False
-    print(f"Warning: Catalog integration service not available: {e}")
+logger = logging.getLogger(__name__)
 
-def create_prompt(preferences):
+MODEL_NAME = "gemini-2.5-flash"
+
+# Seconds to wait before retrying catalog initialization after a failure
+CATALOG_RETRY_INTERVAL = float(os.getenv("CATALOG_RETRY_INTERVAL", 30))
+
+# The model client, the catalog service and the recipe cache are created on first use, not at
+# import, so cold starts do not pay for them before the first request needs them
+_client = None
+_catalog_service = None
+_recipe_cache = None
+_recipe_cache_ready = False
+_catalog_error = None
+_catalog_retry_at = 0.0
+_init_lock = threading.Lock()
+_catalog_lock = threading.Lock()
+_warm_up_thread = None
+
+# Fraction of requests whose preferences, prompt and raw response are logged (at DEBUG level)
+VERBOSE_LOG_SAMPLE_RATE = float(os.getenv("VERBOSE_LOG_SAMPLE_RATE", 0))
+
+# Most recipes one request may ask for, and most recipes asked of one model call;
+# larger requests are split into parallel calls that share the same prompt
+MAX_RECIPE_COUNT = int(os.getenv("RECIPE_MAX_COUNT", 10))
+RECIPES_PER_CALL = int(os.getenv("RECIPES_PER_CALL", 5))
+
+# Pre-generated recipes for common preference profiles (None unless RECIPE_POOL_PROFILES is set)
+recipe_pool = get_recipe_pool()
+if recipe_pool is not None:
+    registry.register_collector(
+        "recipe_pool", stats_collector("recipe_pool", "Recipe pool", recipe_pool.stats, ("hits", "misses", "generated", "failed", "invalidated", "retired"))
+    )
+
+# Identical concurrent requests share one generation unless RECIPE_COALESCE_ENABLED=false
+COALESCE_ENABLED = os.getenv("RECIPE_COALESCE_ENABLED", "true").lower() not in ("0", "false", "no")
+recipe_flights = SingleFlight()
+async_recipe_flights = AsyncSingleFlight()
+registry.register_collector(
+    "recipe_coalesce", stats_collector("recipe_coalesce", "Request coalescing", recipe_flights.stats, ("leaders", "shared"))
+)
+registry.register_collector(
+    "recipe_coalesce_async", stats_collector("recipe_coalesce_async", "Request coalescing on the ASGI path", async_recipe_flights.stats, ("leaders", "shared"))
+)
+
+# Rate limiting, admission control and retries for every model call
+model_scheduler = get_model_scheduler()
+registry.register_collector(
+    "model_scheduler", stats_collector("model_scheduler", "Model call scheduler", model_scheduler.stats, tuple(model_scheduler.counts))
+)
+
+def log_verbose():
+    """Decide whether this request's prompt and response are logged in full."""
+    return VERBOSE_LOG_SAMPLE_RATE > 0 and logger.isEnabledFor(logging.DEBUG) and random.random() < VERBOSE_LOG_SAMPLE_RATE
+
+def get_client():
+    """Get the Gemini client, creating it on first use."""
+    global _client
+    if _client is None:
+        with _init_lock:
+            if _client is None:
+                # Imported here because the SDK import alone is a noticeable part of a cold start
+                from google import genai
+                _client = genai.Client()
+    return _client
+
+def get_recipe_cache():
+    """Get the cache of validated recipes, creating it on first use (None when RECIPE_CACHE_ENABLED=false)."""
+    global _recipe_cache, _recipe_cache_ready
+    if not _recipe_cache_ready:
+        with _init_lock:
+            if not _recipe_cache_ready:
+                # Opening the SQLite tier at import would do it in the master before workers fork
+                _recipe_cache = build_recipe_cache()
+                if _recipe_cache is not None:
+                    registry.register_collector(
+                        "recipe_cache", stats_collector("recipe_cache", "Recipe cache", _recipe_cache.stats, ("hits", "misses", "invalidated"))
+                    )
+                _recipe_cache_ready = True
+    return _recipe_cache
+
+def set_client(client):
+    """Replace the model client, e.g. with a fake one for offline benchmarks."""
+    global _client
+    with _init_lock:
+        _client = client
+
+def generation_config(timeout=None, schema=RECIPE_RESPONSE_SCHEMA):
     """
-    Create a structured prompt for the Gemini model based on user preferences
+    Build the generation config: JSON response mode constrained to the recipe schema
     
     Args:
-        preferences (dict): User preferences for recipe generation
+        timeout (float): Timeout for the model call in seconds (defaults to the client's)
+        schema (dict): Response schema the output must follow
         
     Returns:
-        str: Formatted prompt for the Gemini model
+        GenerateContentConfig: Config for `generate_content` and `generate_content_stream`
     """
-    print("preference: ", json.dumps(preferences, indent=2))
-    prompt = f"""
-    You are a professional chef and recipe creator. Generate 1 unique recipe based on the following preferences:
-    {json.dumps(preferences, indent=2)}
+    from google.genai import types
+    http_options = types.HttpOptions(timeout=int(timeout * 1000)) if timeout is not None else None
+    return types.GenerateContentConfig(
+        response_mime_type="application/json",
+        response_schema=schema,
+        http_options=http_options,
+    )
+
+def call_repair_model(prompt, schema):
+    """
+    Send a targeted repair request to the model
+    
+    Args:
+        prompt (str): Repair prompt listing the problems to fix
+        schema (dict): Response schema covering only the fields to repair
+        
+    Returns:
+        tuple: Response text and (prompt tokens, output tokens)
+    """
+    response = model_scheduler.call(lambda: get_client().models.generate_content(
+        model=MODEL_NAME,
+        contents=prompt,
+        config=generation_config(schema=schema),
+    ))
+    record_usage(response)
+    usage = response.usage_metadata
+    if usage is None:
+        return response.text, (0, 0)
+    return response.text, (usage.prompt_token_count or 0, usage.candidates_token_count or 0)
+
+def get_catalog_service():
+    """
+    Get the catalog integration service, initializing it on first use
+    
+    A failed initialization is retried after CATALOG_RETRY_INTERVAL seconds, so a
+    database outage does not disable catalog integration for the life of the process.
+    
+    Returns:
+        CatalogIntegrationService: The service, or None while the catalog is unavailable
+    """
+    global _catalog_service, _catalog_error, _catalog_retry_at
+    if _catalog_service is not None:
+        return _catalog_service
+    if time.time() < _catalog_retry_at:
+        return None
+    with _catalog_lock:
+        if _catalog_service is None and time.time() >= _catalog_retry_at:
+            try:
+                _catalog_service = get_integration_service()
+                _catalog_error = None
+                logger.info("Catalog integration service initialized successfully")
+            except Exception as e:
+                _catalog_error = str(e)
+                _catalog_retry_at = time.time() + CATALOG_RETRY_INTERVAL
+                logger.warning("Catalog integration service not available: %s", e)
+    return _catalog_service
+
+def warm_up():
+    """
+    Initialize the model client and the catalog service ahead of the first request
+    
+    Returns:
+        dict: Readiness status, see `get_readiness`
+    """
+    get_client()
+    get_catalog_service()
+    start_recipe_pool()
+    return get_readiness()
+
+def preload():
+    """
+    Load the catalog snapshot and its indexes in a server's master process, before it forks workers
+    
+    Workers inherit the snapshot instead of loading their own. The master's refresh thread is
+    stopped before returning, since threads do not survive fork(); each worker starts its own
+    refresher, and creates its own model client, database connections and recipe pool workers.
+    
+    Returns:
+        dict: Readiness status, see `get_readiness`
+    """
+    if get_catalog_service() is not None:
+        get_catalog_snapshot_manager().stop(wait=True)
+    return get_readiness()
+
+def start_warm_up():
+    """Run `warm_up` in a background thread unless one is already running, returning immediately."""
+    global _warm_up_thread
+    with _init_lock:
+        if _warm_up_thread is None or not _warm_up_thread.is_alive():
+            _warm_up_thread = threading.Thread(target=warm_up, name="warm-up", daemon=True)
+            _warm_up_thread.start()
+        return _warm_up_thread
+
+def get_readiness():
+    """
+    Report whether the service is ready to generate catalog-backed recipes, without initializing anything
+    
+    Returns:
+        dict: `ready` flag plus the state of the model client and catalog
+    """
+    catalog = {"ready": _catalog_service is not None}
+    if _catalog_service is None and _catalog_error:
+        catalog["error"] = _catalog_error
+        catalog["retry_in_seconds"] = max(0.0, round(_catalog_retry_at - time.time(), 1))
+    return {
+        "ready": _client is not None and _catalog_service is not None,
+        "model_client": {"ready": _client is not None},
+        "catalog": catalog,
+    }
+
+def get_catalog_snapshot():
+    """Get the current catalog snapshot, or None while catalog integration is unavailable."""
+    catalog_service = get_catalog_service()
+    if catalog_service is None:
+        return None
+    return catalog_service.snapshots.get()
+
+def resolve_recipe_aliases(recipes, refs, snapshot):
+    """
+    Map compact catalog refs in the recipes' ingredients back to MongoDB _ids
+    
+    Args:
+        recipes (list): List of recipe dictionaries
+        refs (dict): Map from the refs in the prompt's catalog block to MongoDB _ids
+        snapshot (CatalogSnapshot): Catalog snapshot the prompt was built from
+        
+    Returns:
+        list: The same recipes with real _ids where the refs were valid
+    """
+    if snapshot is None or not refs:
+        return recipes
+    for recipe in recipes:
+        if isinstance(recipe, dict) and isinstance(recipe.get('ingredients'), dict):
+            get_catalog_service().resolve_aliases(recipe['ingredients'], refs, snapshot)
+    return recipes
+
+def add_totals(recipes, snapshot, preferences):
+    """
+    Add cost and weight totals to validated recipes
+    
+    Args:
+        recipes (list): Validated recipes
+        snapshot (CatalogSnapshot): Catalog snapshot the prompt was built from
+        preferences (dict): User preferences the recipes were generated for
+        
+    Returns:
+        list: The same recipes, with a `totals` object when catalog data is available
+    """
+    if snapshot is None:
+        return recipes
+    with span("enrichment"):
+        return add_recipe_totals(recipes, snapshot, preferences)
+
+# Static instructions that open every recipe prompt. Prompts are ordered from the least to the most
+# request-specific part (instructions, catalog rules, catalog items, preferences, recipe count), so
+# prompts share the longest possible prefix for Gemini's implicit prompt caching
+RECIPE_INSTRUCTIONS = """
+    You are a professional chef and recipe creator. Generate unique recipes based on the preferences given after these instructions.
     
     For each recipe, provide the following information in a structured JSON format:
     
@@ -47,6 +296,7 @@ def create_prompt(preferences):
        - optional_items: List of optional ingredients with their details (_id, item_name, packet_weight_grams, price, quantity)
     4. procedure: Detailed step-by-step cooking instructions in maximum 500 words with quantity of ingredient to use.
     5. youtube: If you know of a relevant YouTube tutorial for a similar recipe, include the link (or null if not applicable)
+    6. servings: Number of servings the recipe makes (the servings in the preferences, if given)
     
     CRITICAL INSTRUCTIONS:
     - You will be provided with a catalog of available ingredients with their _id values.
@@ -60,22 +310,187 @@ def create_prompt(preferences):
     - Quantity is number of packets that should be included.
     - Youtube video must be older than atleast 6 months and can be accessable.
     
-    Return your response as a valid JSON array with 1 recipe object. Each object should have the structure described above.
+    Return your response as a valid JSON array of recipe objects. Each object should have the structure described above.
     Do not include any explanations or text outside of the JSON structure.
     """
+
+def preferences_block(preferences):
+    """
+    Build the part of the prompt that states the user preferences
     
-    # Enhance prompt with catalog information if integration is enabled
-    if catalog_integration_enabled:
-        try:
-            prompt = catalog_service.enhance_recipe_prompt(prompt, preferences)
-            print("Enhanced prompt with catalog data (first 500 chars):")
-            print(prompt[:500] + "..." if len(prompt) > 500 else prompt)
-        except Exception as e:
-            print(f"Warning: Failed to enhance prompt with catalog: {e}")
-    else:
-        print("Warning: Catalog integration is not enabled. Prompt will not include catalog data.")
+    Args:
+        preferences (dict): User preferences for recipe generation
+        
+    Returns:
+        str: Text to append after the instructions and the catalog block
+    """
+    return f"""
+    
+    Preferences:
+    {json.dumps(preferences, indent=2)}
+    """
+
+def build_base_prompt(preferences):
+    """
+    Build the recipe instructions for the Gemini model, without catalog data
+    
+    Args:
+        preferences (dict): User preferences for recipe generation
+        
+    Returns:
+        str: Prompt with the recipe instructions
+    """
+    return RECIPE_INSTRUCTIONS + preferences_block(preferences)
+
+def recipe_count_instruction(count, part=1, parts=1):
+    """
+    Build the closing line of a prompt that asks for a number of recipes
+    
+    Args:
+        count (int): Recipes to generate in this call
+        part (int): Which of the parallel calls for one request this is
+        parts (int): Number of parallel calls for the request
+        
+    Returns:
+        str: Text to append to the prompt
+    """
+    noun = "recipe" if count == 1 else "recipes"
+    instruction = f"\n\nGenerate {count} unique {noun} for these preferences and return them as a JSON array with exactly {count} recipe {'object' if count == 1 else 'objects'}."
+    if parts > 1:
+        instruction += f" This is part {part} of {parts} of the request and the other parts are generated separately, so favour less obvious dishes in later parts."
+    return instruction
+
+def split_count(count):
+    """
+    Split a recipe count into the sizes of the model calls that generate it
+    
+    Args:
+        count (int): Recipes requested
+        
+    Returns:
+        list: Recipes per call, as even as possible and at most RECIPES_PER_CALL each
+    """
+    parts = -(-count // max(1, RECIPES_PER_CALL))
+    return [count // parts + (1 if part < count % parts else 0) for part in range(parts)]
+
+def parse_recipe_count(value):
+    """
+    Validate the number of recipes a request asks for
+    
+    Args:
+        value (str|int): Requested count
+        
+    Returns:
+        int: The count
+        
+    Raises:
+        ValueError: If the count is not an integer between 1 and RECIPE_MAX_COUNT
+    """
+    try:
+        count = int(value)
+    except (TypeError, ValueError):
+        count = 0
+    if not 1 <= count <= MAX_RECIPE_COUNT:
+        raise ValueError(f"count must be an integer between 1 and {MAX_RECIPE_COUNT}")
+    return count
+
+def call_model(prompt, timeout=None, lane=INTERACTIVE):
+    """
+    Send one generation request through the scheduler
+    
+    Args:
+        prompt (str): Full prompt
+        timeout (float): Timeout for the model call in seconds (defaults to the client's)
+        lane (str): Scheduler lane for the model call
+        
+    Returns:
+        GenerateContentResponse: The model response
+    """
+    with span("model_call"):
+        response = model_scheduler.call(lambda: get_client().models.generate_content(
+            model=MODEL_NAME,
+            contents=prompt,
+            config=generation_config(timeout),
+        ), lane)
+    record_usage(response)
+    return response
+
+async def call_model_async(prompt):
+    """
+    Async version of `call_model`
+    
+    Args:
+        prompt (str): Full prompt
+        
+    Returns:
+        GenerateContentResponse: The model response
+    """
+    with span("model_call"):
+        response = await model_scheduler.call_async(lambda: get_client().aio.models.generate_content(
+            model=MODEL_NAME,
+            contents=prompt,
+            config=generation_config(),
+        ))
+    record_usage(response)
+    return response
+
+def create_prompt(preferences, snapshot=None):
+    """
+    Create a structured prompt for the Gemini model based on user preferences
+    
+    Args:
+        preferences (dict): User preferences for recipe generation
+        snapshot (CatalogSnapshot): Catalog snapshot to build the prompt from (defaults to the current one)
+        
+    Returns:
+        tuple: Formatted prompt for the Gemini model, and the map from its catalog refs to MongoDB _ids
+    """
+    refs = {}
+    with span("prompt_assembly"):
+        prompt = RECIPE_INSTRUCTIONS
+        
+        # Enhance prompt with catalog information if integration is enabled; the catalog block
+        # goes before the preferences, which are the most request-specific part
+        catalog_service = get_catalog_service()
+        if catalog_service is not None:
+            try:
+                prompt, refs = catalog_service.enhance_recipe_prompt(prompt, preferences, snapshot)
+            except Exception as e:
+                logger.warning("Failed to enhance prompt with catalog: %s", e)
+        else:
+            logger.warning("Catalog integration is not enabled. Prompt will not include catalog data.")
+        prompt += preferences_block(preferences)
     
-    return prompt
+    PROMPT_CHARS.observe(len(prompt))
+    return prompt, refs
+
+async def create_prompt_async(preferences, snapshot=None):
+    """
+    Create the prompt like `create_prompt`, without blocking the event loop on catalog reads
+    
+    Args:
+        preferences (dict): User preferences for recipe generation
+        snapshot (CatalogSnapshot): Catalog snapshot to build the prompt from (defaults to the current one)
+        
+    Returns:
+        tuple: Formatted prompt for the Gemini model, and the map from its catalog refs to MongoDB _ids
+    """
+    refs = {}
+    with span("prompt_assembly"):
+        prompt = RECIPE_INSTRUCTIONS
+        
+        catalog_service = await asyncio.to_thread(get_catalog_service)
+        if catalog_service is not None:
+            try:
+                prompt, refs = await catalog_service.enhance_recipe_prompt_async(prompt, preferences, snapshot)
+            except Exception as e:
+                logger.warning("Failed to enhance prompt with catalog: %s", e)
+        else:
+            logger.warning("Catalog integration is not enabled. Prompt will not include catalog data.")
+        prompt += preferences_block(preferences)
+    
+    PROMPT_CHARS.observe(len(prompt))
+    return prompt, refs
 
 def parse_gemini_response(response_text):
     """
@@ -121,45 +536,488 @@ def clean_recipe_response(recipes):
     
     return recipes
 
-def generate_recipes(preferences_str):
+def load_preferences(preferences_str):
+    """
+    Parse preferences from a JSON string, or pass a dict through unchanged
+    
+    Args:
+        preferences_str (str|dict): User preferences
+        
+    Returns:
+        dict: User preferences
+    """
+    with span("parse_preferences"):
+        if isinstance(preferences_str, str):
+            return json.loads(preferences_str)
+        return preferences_str
+
+def start_recipe_pool():
+    """Start filling the recipe pool in the background, if profiles are configured."""
+    if recipe_pool is not None:
+        recipe_pool.start(generate_pool_recipes, get_catalog_snapshot)
+
+def generate_pool_recipes(preferences, snapshot):
+    """Generate a fresh response for the recipe pool, bypassing the response cache."""
+    return generate_recipes(preferences, snapshot, use_cache=False, lane=BATCH)
+
+def on_catalog_change(change, snapshot):
+    """
+    Drop cached and pooled recipes that a catalog change made stale
+    
+    Args:
+        change (CatalogChange): The items that changed, or a full reload
+        snapshot (CatalogSnapshot): The snapshot the change produced
+    """
+    # A full reload changes every cache key, so only deltas need targeted invalidation;
+    # a cache not created yet holds nothing to invalidate
+    if _recipe_cache is not None and not change.full:
+        removed = _recipe_cache.invalidate(change.tags(), snapshot.sequence)
+        if removed:
+            logger.info("Invalidated %d cached responses after a catalog change", removed)
+    if recipe_pool is not None:
+        recipe_pool.invalidate(snapshot)
+
+get_catalog_snapshot_manager().subscribe(on_catalog_change)
+
+def cache_recipes(preferences, snapshot, recipes, count=1):
+    """
+    Store validated recipes, tagged with the catalog items and categories they use
+    
+    Args:
+        preferences (dict): User preferences
+        snapshot (CatalogSnapshot): Catalog snapshot the recipes were built from
+        recipes (list): Validated recipes
+        count (int): Number of recipes requested
+    """
+    recipe_cache = get_recipe_cache()
+    if recipe_cache is None or not is_cacheable(recipes):
+        return
+    if snapshot is None:
+        recipe_cache.set(preferences, None, recipes, count=count)
+    else:
+        recipe_cache.set(preferences, snapshot.base_version, recipes, recipe_tags(recipes, snapshot), snapshot.sequence, count)
+
+def get_cached_recipes(preferences, snapshot, count=1):
+    """
+    Look up pre-generated or previously generated recipes for equivalent preferences
+    
+    Preferences matching a recipe pool profile are served from the pool first.
+    
+    Args:
+        preferences (dict): User preferences
+        snapshot (CatalogSnapshot): Catalog snapshot the recipes must be current for
+        count (int): Number of recipes requested (the pool only holds single recipes)
+        
+    Returns:
+        list: Pooled or cached recipes, or None on a miss
+    """
+    if recipe_pool is not None and snapshot is not None and count == 1:
+        start_recipe_pool()
+        with span("pool_lookup"):
+            pooled_recipes = recipe_pool.take(preferences, snapshot)
+        if pooled_recipes is not None:
+            GENERATIONS.inc(source="pool")
+            return pooled_recipes
+    recipe_cache = get_recipe_cache()
+    if recipe_cache is None:
+        return None
+    with span("cache_lookup"):
+        cached_recipes = recipe_cache.get(preferences, snapshot.base_version if snapshot is not None else None, count)
+    if cached_recipes is not None:
+        GENERATIONS.inc(source="cache")
+        logger.debug("Serving recipes from cache")
+    return cached_recipes
+
+def process_gemini_response(response_text, preferences, snapshot, use_cache=True, refs=None):
+    """
+    Parse and clean a model response, and cache the resulting recipes
+    
+    Args:
+        response_text (str): Raw response from the Gemini model
+        preferences (dict): User preferences the response was generated for
+        snapshot (CatalogSnapshot): Catalog snapshot the prompt was built from
+        use_cache (bool): Store the recipes in the response cache
+        refs (dict): Map from the prompt's catalog refs to MongoDB _ids, as returned by `create_prompt`
+        
+    Returns:
+        list: List of recipe dictionaries
+    """
+    with span("response_parse"):
+        # Parse the recipes
+        recipes = parse_gemini_response(response_text)
+        
+        # Clean up the response by removing unnecessary fields
+        recipes = clean_recipe_response(recipes)
+        
+        recipes = resolve_recipe_aliases(recipes, refs, snapshot)
+    
+    # Check the recipes against the schema and catalog, repairing only what is broken
+    with span("verification"):
+        recipes = validate_and_repair(recipes, snapshot, call_repair_model)
+    logger.debug("Parsed %d recipes from response", len(recipes))
+    recipes = add_totals(recipes, snapshot, preferences)
+    
+    if use_cache:
+        cache_recipes(preferences, snapshot, recipes)
+    
+    return recipes
+
+def process_gemini_responses(response_texts, preferences, snapshot, use_cache=True, count=1, refs=None):
+    """
+    Process the responses of the model calls for one request, and cache the combined recipes
+    
+    Args:
+        response_texts (list): Raw responses, one per model call
+        preferences (dict): User preferences the responses were generated for
+        snapshot (CatalogSnapshot): Catalog snapshot the prompt was built from
+        use_cache (bool): Store the recipes in the response cache
+        count (int): Number of recipes requested
+        refs (dict): Map from the prompt's catalog refs to MongoDB _ids, as returned by `create_prompt`
+        
+    Returns:
+        list: At most `count` recipes, without repeated titles
+    """
+    recipes = []
+    titles = set()
+    for response_text in response_texts:
+        for recipe in process_gemini_response(response_text, preferences, snapshot, use_cache=False, refs=refs):
+            # Parallel calls may come up with the same dish
+            title = " ".join(str(recipe.get('title') or '').lower().split())
+            if title in titles:
+                continue
+            titles.add(title)
+            recipes.append(recipe)
+    recipes = recipes[:count]
+    
+    if use_cache:
+        cache_recipes(preferences, snapshot, recipes, count)
+    
+    return recipes
+
+def flight_key(preferences, snapshot, count=1, lane=INTERACTIVE, timeout=None):
+    """
+    Build the key identical concurrent generations share
+    
+    The lane and timeout are part of the key, so an interactive request never waits
+    behind a batch generation with its longer queue wait and timeout.
+    
+    Args:
+        preferences (dict): User preferences
+        snapshot (CatalogSnapshot): Pinned catalog snapshot, or None without catalog data
+        count (int): Number of recipes requested
+        lane (str): Scheduler lane of the model call
+        timeout (float): Timeout for the model call in seconds
+        
+    Returns:
+        str: The key
+    """
+    return f"{lane}:{timeout}:{make_cache_key(preferences, snapshot.version if snapshot is not None else None, count)}"
+
+def generate_recipes(preferences_str, snapshot=None, timeout=None, use_cache=True, coalesce=None, lane=INTERACTIVE, count=1):
     """
     Generate recipes using the Gemini model based on user preferences
     
     Args:
         preferences_str (str): JSON string containing user preferences
+        snapshot (CatalogSnapshot): Catalog snapshot to build the prompt from (defaults to the current one)
+        timeout (float): Timeout for the model call in seconds (defaults to the client's)
+        use_cache (bool): Serve from and store in the recipe pool and response cache; pass False for a fresh generation
+        coalesce (bool): Share the generation with identical concurrent requests
+            (defaults to RECIPE_COALESCE_ENABLED when use_cache is True, otherwise off)
+        lane (str): Scheduler lane for the model call, "interactive" or "batch"
+        count (int): Number of recipes to generate (see `parse_recipe_count`)
         
     Returns:
         list: List of generated recipes
+        
+    Raises:
+        ModelOverloadedError: If the model call was not admitted or kept hitting quota errors
     """
     try:
-        # Parse preferences from JSON string if it's a string
-        if isinstance(preferences_str, str):
-            preferences = json.loads(preferences_str)
-        else:
-            preferences = preferences_str
+        preferences = load_preferences(preferences_str)
         
-        # Create the prompt
-        prompt = create_prompt(preferences)
+        # Pin the catalog snapshot so the prompt and the parsed response use the same one
+        if snapshot is None:
+            snapshot = get_catalog_snapshot()
         
-        # Generate content using Gemini model
-        print("Sending request to Gemini API...")
-        response = client.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=prompt,
+        # Serve equivalent requests from the pool or cache without building a prompt or calling the model
+        cached_recipes = get_cached_recipes(preferences, snapshot, count) if use_cache else None
+        if cached_recipes is not None:
+            return cached_recipes
+        
+        if coalesce is None:
+            coalesce = use_cache and COALESCE_ENABLED
+        if not coalesce:
+            return generate_from_model(preferences, snapshot, timeout, use_cache, lane, count)
+        
+        # Identical requests already in flight share that generation instead of starting another
+        key = flight_key(preferences, snapshot, count, lane, timeout)
+        return recipe_flights.do(key, lambda: generate_from_model(preferences, snapshot, timeout, use_cache, lane, count))
+    except ModelOverloadedError:
+        GENERATIONS.inc(source="rejected")
+        raise
+    except Exception as e:
+        GENERATIONS.inc(source="error")
+        logger.error("Error generating recipes: %s", e)
+        raise Exception(f"Recipe generation failed: {str(e)}")
 
-        )
-        print("Received response from Gemini API", response)
+def generate_from_model(preferences, snapshot, timeout=None, use_cache=True, lane=INTERACTIVE, count=1):
+    """
+    Build the prompt, call the model and process its response
     
+    Up to RECIPES_PER_CALL recipes are generated in one call. Larger counts are
+    split into parallel calls that differ only in their closing line.
+    
+    Args:
+        preferences (dict): User preferences
+        snapshot (CatalogSnapshot): Pinned catalog snapshot, or None without catalog data
+        timeout (float): Timeout for the model call in seconds (defaults to the client's)
+        use_cache (bool): Store the recipes in the response cache
+        lane (str): Scheduler lane for the model call
+        count (int): Number of recipes to generate
         
-        # Parse the recipes
-        recipes = parse_gemini_response(response.text)
-        print(f"Parsed {len(recipes)} recipes from response")
+    Returns:
+        list: List of generated recipes
+    """
+    # Create the prompt (without catalog data if the catalog was unavailable when pinning)
+    prompt, refs = create_prompt(preferences, snapshot) if snapshot is not None else (build_base_prompt(preferences), {})
+    sizes = split_count(count)
+    prompts = [prompt + recipe_count_instruction(size, part, len(sizes)) for part, size in enumerate(sizes, 1)]
+    verbose = log_verbose()
+    if verbose:
+        logger.debug("Prompt for preferences %s:\n%s", json.dumps(preferences), prompts[0])
+    
+    # Generate content using Gemini model, waiting for the scheduler to admit each call
+    if len(prompts) == 1:
+        responses = [call_model(prompts[0], timeout, lane)]
+    else:
+        with ThreadPoolExecutor(max_workers=len(prompts), thread_name_prefix="recipe-part") as executor:
+            responses = list(executor.map(lambda part_prompt: call_model(part_prompt, timeout, lane), prompts))
+    if verbose:
+        for response in responses:
+            logger.debug("Raw response from Gemini API:\n%s", response.text)
+    
+    recipes = process_gemini_responses([response.text for response in responses], preferences, snapshot, use_cache, count, refs)
+    GENERATIONS.inc(source="model")
+    return recipes
+
+async def generate_recipes_async(preferences_str, use_cache=True, coalesce=None, count=1):
+    """
+    Generate recipes like `generate_recipes`, awaiting the model call without blocking a thread
+    
+    Args:
+        preferences_str (str): JSON string containing user preferences
+        use_cache (bool): Serve from and store in the recipe pool and response cache; pass False for a fresh generation
+        coalesce (bool): Share the generation with identical concurrent requests
+            (defaults to RECIPE_COALESCE_ENABLED when use_cache is True, otherwise off)
+        count (int): Number of recipes to generate
         
-        # Clean up the response by removing unnecessary fields
-        recipes = clean_recipe_response(recipes)
-        print("Cleaned up recipe response")
+    Returns:
+        list: List of generated recipes
+    """
+    try:
+        preferences = load_preferences(preferences_str)
         
-        return recipes
+        snapshot = await asyncio.to_thread(get_catalog_snapshot)
+        cached_recipes = get_cached_recipes(preferences, snapshot, count) if use_cache else None
+        if cached_recipes is not None:
+            return cached_recipes
+        
+        if coalesce is None:
+            coalesce = use_cache and COALESCE_ENABLED
+        if not coalesce:
+            return await generate_from_model_async(preferences, snapshot, use_cache, count)
+        
+        key = flight_key(preferences, snapshot, count)
+        return await async_recipe_flights.do(key, lambda: generate_from_model_async(preferences, snapshot, use_cache, count))
+    except ModelOverloadedError:
+        GENERATIONS.inc(source="rejected")
+        raise
     except Exception as e:
-        print(f"Error generating recipes: {e}")
+        GENERATIONS.inc(source="error")
+        logger.error("Error generating recipes: %s", e)
         raise Exception(f"Recipe generation failed: {str(e)}")
+
+async def generate_from_model_async(preferences, snapshot, use_cache=True, count=1):
+    """
+    Async version of `generate_from_model`
+    
+    Args:
+        preferences (dict): User preferences
+        snapshot (CatalogSnapshot): Pinned catalog snapshot, or None without catalog data
+        use_cache (bool): Store the recipes in the response cache
+        count (int): Number of recipes to generate
+        
+    Returns:
+        list: List of generated recipes
+    """
+    prompt, refs = await create_prompt_async(preferences, snapshot) if snapshot is not None else (build_base_prompt(preferences), {})
+    sizes = split_count(count)
+    prompts = [prompt + recipe_count_instruction(size, part, len(sizes)) for part, size in enumerate(sizes, 1)]
+    verbose = log_verbose()
+    if verbose:
+        logger.debug("Prompt for preferences %s:\n%s", json.dumps(preferences), prompts[0])
+    
+    responses = await asyncio.gather(*(call_model_async(part_prompt) for part_prompt in prompts))
+    if verbose:
+        for response in responses:
+            logger.debug("Raw response from Gemini API:\n%s", response.text)
+    
+    # Validation may send repair requests, so keep it off the event loop
+    recipes = await asyncio.to_thread(
+        process_gemini_responses, [response.text for response in responses], preferences, snapshot, use_cache, count, refs
+    )
+    GENERATIONS.inc(source="model")
+    return recipes
+
+def recipe_events(index, recipe):
+    """
+    Build the streaming events for an already complete recipe
+    
+    Args:
+        index (int): Position of the recipe in the response
+        recipe (dict): Recipe dictionary
+        
+    Returns:
+        list: One `field` event per recipe field followed by a `recipe` event
+    """
+    events = [
+        {"type": "field", "recipe": index, "field": field, "value": value}
+        for field, value in recipe.items()
+    ]
+    events.append({"type": "recipe", "recipe": index, "value": recipe})
+    return events
+
+def streamed_value(field, value):
+    """
+    The part of a streamed recipe field that validation can change
+    
+    Args:
+        field (str): Top-level recipe field
+        value: Field value
+        
+    Returns:
+        A copy of the value; for ingredients, only the ingredient lists without catalog details
+    """
+    if field == 'ingredients' and isinstance(value, dict):
+        value = {key: value.get(key) for key in INGREDIENT_LISTS}
+    return copy.deepcopy(value)
+
+def stream_recipes(preferences_str, count=1):
+    """
+    Generate recipes like `generate_recipes`, yielding each recipe field as soon as the model completes it
+    
+    The ingredients field is hydrated with catalog details as soon as it is complete; unknown
+    _ids in it are matched to the catalog by item name, or dropped. Each complete recipe is
+    validated, and repaired if needed, before its `recipe` event is sent. When repair changed
+    a field that was already streamed, a `correction` event with the new value comes first;
+    the `recipe` event always holds the final recipe. A recipe that cannot be repaired gets
+    an `error` event instead of its `recipe` event, and the stream goes on with the next one.
+    
+    Counts above RECIPES_PER_CALL are split like in `generate_from_model`, and the parts are
+    streamed one after another; recipe indexes run on across the parts. A recipe whose title
+    repeats an earlier one gets an `error` event instead of its `recipe` event.
+    
+    Args:
+        preferences_str (str): JSON string containing user preferences
+        count (int): Number of recipes to generate
+        
+    Yields:
+        dict: `field` events with one recipe field, `correction` events with a repaired field,
+        and `recipe` or `error` events for each complete recipe
+    """
+    preferences = load_preferences(preferences_str)
+    snapshot = get_catalog_snapshot()
+    catalog_service = get_catalog_service()
+    
+    refs = {}
+    
+    def hydrate(event):
+        if event['type'] in ('field', 'correction') and event['field'] == 'ingredients' and snapshot is not None:
+            if isinstance(event['value'], dict):
+                catalog_service.resolve_aliases(event['value'], refs, snapshot)
+                fix_ids_locally({'ingredients': event['value']}, snapshot)
+                drop_unknown_ingredients({'ingredients': event['value']}, snapshot)
+                catalog_service.hydrate_ingredients(event['value'], snapshot)
+        return event
+    
+    cached_recipes = get_cached_recipes(preferences, snapshot, count)
+    if cached_recipes is not None:
+        for index, recipe in enumerate(cached_recipes):
+            for event in recipe_events(index, recipe):
+                yield hydrate(copy.deepcopy(event))
+        return
+    
+    if snapshot is not None:
+        prompt, refs = create_prompt(preferences, snapshot)
+    else:
+        prompt = build_base_prompt(preferences)
+    sizes = split_count(count)
+    
+    recipes = []
+    titles = set()
+    # Fields sent so far per recipe, to tell which ones repair changed
+    streamed = {}
+    # Index of the first recipe of the current part
+    base = 0
+    for part, size in enumerate(sizes, 1):
+        parser = IncrementalRecipeParser()
+        start = time.perf_counter()
+        last_chunk = None
+        # A stream cannot be retried once it has started, so it only takes a slot for its duration
+        try:
+            model_scheduler.acquire()
+        except ModelOverloadedError:
+            GENERATIONS.inc(source="rejected")
+            raise
+        try:
+            part_prompt = prompt + recipe_count_instruction(size, part, len(sizes))
+            stream = get_client().models.generate_content_stream(model=MODEL_NAME, contents=part_prompt, config=generation_config())
+            for chunk in stream:
+                if last_chunk is None:
+                    STAGE_SECONDS.observe(time.perf_counter() - start, stage="model_first_chunk")
+                last_chunk = chunk
+                for event in parser.feed(chunk.text or ""):
+                    event['recipe'] += base
+                    if event['type'] == 'field':
+                        event = hydrate(event)
+                        streamed.setdefault(event['recipe'], {})[event['field']] = streamed_value(event['field'], event['value'])
+                        yield event
+                        continue
+                    
+                    recipe = resolve_recipe_aliases(clean_recipe_response([event['value']]), refs, snapshot)
+                    try:
+                        with span("verification"):
+                            event['value'] = validate_and_repair(recipe, snapshot, call_repair_model)[0]
+                    except ValueError as e:
+                        # Only this recipe is lost; the others in the response can still be used
+                        logger.warning("Dropping streamed recipe %d: %s", event['recipe'], e)
+                        yield {"type": "error", "recipe": event['recipe'], "error": str(e)}
+                        continue
+                    # Parts are generated separately and may come up with the same dish
+                    title = " ".join(str(event['value'].get('title') or '').lower().split())
+                    if title in titles:
+                        yield {"type": "error", "recipe": event['recipe'], "error": "Recipe repeats an earlier recipe"}
+                        continue
+                    titles.add(title)
+                    for field, value in event['value'].items():
+                        sent = streamed.get(event['recipe'], {})
+                        if field in sent and streamed_value(field, value) != sent[field]:
+                            yield hydrate({"type": "correction", "recipe": event['recipe'], "field": field, "value": copy.deepcopy(value)})
+                    add_totals([event['value']], snapshot, preferences)
+                    recipes.append(event['value'])
+                    yield event
+            parser.close()
+        except Exception:
+            GENERATIONS.inc(source="error")
+            raise
+        finally:
+            model_scheduler.release()
+        base += parser.recipe_count
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage="model_stream")
+        # Usage is reported cumulatively, so only the last chunk of each stream counts
+        record_usage(last_chunk)
+    GENERATIONS.inc(source="model")
+    logger.debug("Streamed %d recipes from %d responses", len(recipes), len(sizes))
+    
+    cache_recipes(preferences, snapshot, recipes[:count], count)
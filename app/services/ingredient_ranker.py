@@ -0,0 +1,334 @@
+"""
+Ingredient Ranker
+
+This module ranks catalog items against user preferences so that the prompt
+only carries the most relevant ingredients. Items are indexed as TF-IDF
+vectors of hashed character n-grams over `item_name` and `category`, kept in
+NumPy arrays, and scored against the whole preferences dict.
+
+N-grams only match spelling, so cuisines, diets and meal types are not
+matched as text: they are looked up in explicit maps of typical ingredients
+and categories, and diets exclude the categories and ingredients they rule out.
+"""
+
+import math
+import zlib
+from typing import List, Dict, Any, Iterable, Tuple
+
+import numpy as np
+
+from app.services.ingredient_search import fold_text, normalize_tokens
+
+# Weight of each preference key in the query. Unlisted string values get DEFAULT_WEIGHT.
+PREFERENCE_WEIGHTS = {
+    "ingredients_to_include": 3.0,
+    "ingredients_to_avoid": -2.0,
+    "cuisine": 1.0,
+    "diet": 1.0,
+    "dietary": 1.0,
+    "meal_type": 1.0,
+}
+DEFAULT_WEIGHT = 0.5
+
+# Packet sizes and brands of one product share a base name; cap them so one product cannot crowd out the rest
+MAX_ITEMS_PER_NAME = 3
+
+# Name words found in at least this share of the categories (and at least BRAND_TOKEN_MIN_CATEGORIES)
+# are brands or descriptors such as "organic", and are not part of an item's base name
+BRAND_TOKEN_SHARE = 0.25
+BRAND_TOKEN_MIN_CATEGORIES = 4
+
+# Preference keys whose values are looked up in the maps below rather than matched as text
+KEYWORD_KEYS = ("cuisine", "diet", "dietary", "meal_type")
+DIET_KEYS = ("diet", "dietary")
+
+# Categories typical of each cuisine; their items score CATEGORY_WEIGHT times the cuisine's weight.
+# Cuisines not listed here use DEFAULT_CUISINE_CATEGORIES.
+CUISINE_CATEGORIES = {
+    "italian": ["Vegetables", "Dairy", "Grains", "Herbs"],
+    "asian": ["Vegetables", "Seafood", "Grains", "Spices"],
+    "chinese": ["Vegetables", "Seafood", "Grains", "Spices"],
+    "japanese": ["Vegetables", "Seafood", "Grains"],
+    "thai": ["Vegetables", "Seafood", "Grains", "Herbs", "Spices"],
+    "mexican": ["Vegetables", "Meat", "Grains", "Spices"],
+    "indian": ["Vegetables", "Dairy", "Grains", "Spices"],
+    "mediterranean": ["Vegetables", "Seafood", "Grains", "Herbs"],
+    "french": ["Vegetables", "Dairy", "Meat", "Bakery", "Herbs"],
+}
+DEFAULT_CUISINE_CATEGORIES = ["Vegetables", "Meat", "Grains", "Dairy"]
+CATEGORY_WEIGHT = 0.2
+
+# Typical ingredients of each cuisine, diet and meal type, matched against item names in place of the value
+PREFERENCE_KEYWORDS = {
+    "italian": ["tomato", "basil", "mozzarella", "parmesan", "pasta", "olive oil", "garlic", "oregano"],
+    "asian": ["rice", "soy sauce", "ginger", "garlic", "noodle", "sesame", "tofu", "scallion"],
+    "chinese": ["rice", "soy sauce", "ginger", "garlic", "noodle", "bok choy", "scallion", "tofu"],
+    "japanese": ["rice", "miso", "soy sauce", "nori", "tofu", "ginger", "sesame", "salmon"],
+    "thai": ["rice", "coconut milk", "lemongrass", "lime", "chili", "basil", "fish sauce", "noodle"],
+    "mexican": ["tortilla", "bean", "corn", "avocado", "chili", "lime", "cilantro", "tomato"],
+    "indian": ["rice", "lentil", "chickpea", "cumin", "turmeric", "ginger", "yogurt", "garam masala"],
+    "mediterranean": ["olive oil", "chickpea", "feta", "tomato", "cucumber", "lemon", "oregano", "yogurt"],
+    "french": ["butter", "cream", "shallot", "thyme", "mushroom", "wine", "baguette", "cheese"],
+    "high protein": ["chicken", "egg", "lentil", "bean", "tofu", "yogurt", "tuna", "chickpea"],
+    "low carb": ["egg", "spinach", "zucchini", "avocado", "broccoli", "cauliflower", "cheese", "salmon"],
+    "keto": ["egg", "avocado", "cheese", "butter", "spinach", "cauliflower", "salmon", "bacon"],
+    "breakfast": ["egg", "oat", "yogurt", "bread", "milk", "banana", "berry", "honey"],
+    "dessert": ["sugar", "flour", "chocolate", "butter", "cream", "vanilla", "berry", "apple"],
+}
+
+# Categories and name words each diet rules out; their items are never put in the prompt
+DIET_EXCLUDED_CATEGORIES = {
+    "vegetarian": ["Meat", "Seafood", "Poultry", "Fish"],
+    "vegan": ["Meat", "Seafood", "Poultry", "Fish", "Dairy", "Eggs"],
+    "pescatarian": ["Meat", "Poultry"],
+    "dairy free": ["Dairy"],
+}
+_MEAT_WORDS = ["chicken", "beef", "pork", "lamb", "turkey", "bacon", "ham", "sausage", "salami", "gelatin"]
+_FISH_WORDS = ["fish", "salmon", "tuna", "cod", "shrimp", "prawn", "anchovy", "crab", "fillet"]
+DIET_EXCLUDED_WORDS = {
+    "vegetarian": _MEAT_WORDS + _FISH_WORDS,
+    "vegan": _MEAT_WORDS + _FISH_WORDS + ["milk", "cheese", "butter", "cream", "yogurt", "egg", "honey", "mozzarella"],
+    "pescatarian": _MEAT_WORDS,
+    "dairy free": ["milk", "cheese", "butter", "cream", "yogurt", "mozzarella"],
+    "gluten free": ["wheat", "pasta", "bread", "flour", "couscous", "barley", "baguette"],
+}
+
+
+def char_ngrams(text: str, n: int = 3) -> List[str]:
+    """Character n-grams of each word, padded with spaces so word starts and ends count."""
+    grams = []
+    for word in fold_text(text).split():
+        padded = f" {word} "
+        if len(padded) <= n:
+            grams.append(padded)
+            continue
+        grams.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+    return grams
+
+def rank_within_groups(codes: np.ndarray) -> np.ndarray:
+    """For each position, how many earlier positions share its group code."""
+    order = np.argsort(codes, kind="stable")
+    sorted_codes = codes[order]
+    ranks = np.empty(len(codes), dtype=np.int64)
+    ranks[order] = np.arange(len(codes)) - np.searchsorted(sorted_codes, sorted_codes, side="left")
+    return ranks
+
+def preference_key(value: str) -> str:
+    """Normalize a cuisine, diet or meal type for the maps above, e.g. "High-Protein" -> "high protein"."""
+    return " ".join("".join(char if char.isalnum() else " " for char in fold_text(value)).split())
+
+def preference_values(preferences: Dict[str, Any], keys: Iterable[str]) -> List[str]:
+    """Normalized string values of the given preference keys."""
+    values = []
+    for key, value in preferences.items():
+        if str(key).lower() not in keys:
+            continue
+        for item in value if isinstance(value, (list, tuple)) else [value]:
+            if isinstance(item, str) and item.strip():
+                values.append(preference_key(item))
+    return values
+
+def preference_terms(preferences: Dict[str, Any]) -> List[Tuple[str, float]]:
+    """Flatten preferences into (text, weight) query terms.
+
+    Values of KEYWORD_KEYS are replaced by their PREFERENCE_KEYWORDS, or dropped when not listed.
+    """
+    terms = []
+    for key, value in preferences.items():
+        key = str(key).lower()
+        weight = PREFERENCE_WEIGHTS.get(key, DEFAULT_WEIGHT)
+        values = value if isinstance(value, (list, tuple)) else [value]
+        for item in values:
+            if not isinstance(item, str) or not item.strip():
+                continue
+            if key in KEYWORD_KEYS:
+                terms.extend((keyword, weight) for keyword in PREFERENCE_KEYWORDS.get(preference_key(item), []))
+            else:
+                terms.append((item, weight))
+    return terms
+
+def _word_set(words: Iterable[str]) -> set:
+    return {token for word in words for token in normalize_tokens(word)}
+
+
+class IngredientRanker:
+    """TF-IDF index over a catalog snapshot, scored with an inverted index of n-gram buckets."""
+
+    def __init__(self, names: List[str], categories: List[str], dims: int = 1 << 18):
+        """Build the index from parallel lists of item names and categories."""
+        self.dims = dims
+        self.size = len(names)
+        name_codes: Dict[str, int] = {}
+        self.name_codes = np.array(
+            [name_codes.setdefault(name.lower(), len(name_codes)) for name in names], dtype=np.int64
+        )
+        category_codes: Dict[str, int] = {}
+        self.category_codes = np.array(
+            [category_codes.setdefault(category, len(category_codes)) for category in categories], dtype=np.int64
+        )
+        self.category_names = list(category_codes)
+        self.category_tokens = [set(normalize_tokens(category)) for category in self.category_names]
+        self._build_base_names(names)
+        self._diet_masks: Dict[str, np.ndarray] = {}
+
+        # Hash each distinct text once; catalogs repeat names across packet sizes
+        text_buckets: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        row_buckets = []
+        for name, category in zip(names, categories):
+            text = f"{name} {category}"
+            if text not in text_buckets:
+                text_buckets[text] = self._bucket_counts(text)
+            row_buckets.append(text_buckets[text])
+
+        counts = np.array([len(buckets) for buckets, _ in row_buckets], dtype=np.int64)
+        if self.size:
+            indices = np.concatenate([buckets for buckets, _ in row_buckets])
+            tf = np.concatenate([freqs for _, freqs in row_buckets])
+        else:
+            indices = np.zeros(0, dtype=np.int64)
+            tf = np.zeros(0, dtype=np.float32)
+        rows = np.repeat(np.arange(self.size, dtype=np.int64), counts)
+
+        df = np.bincount(indices, minlength=dims)
+        self.idf = (np.log((1.0 + self.size) / (1.0 + df)) + 1.0).astype(np.float32)
+
+        # L2-normalize every row's TF-IDF vector
+        data = tf * self.idf[indices]
+        norms = np.sqrt(np.bincount(rows, weights=data * data, minlength=self.size))
+        norms[norms == 0] = 1.0
+        data = (data / norms[rows]).astype(np.float32)
+
+        # Inverted index: entries grouped by n-gram bucket
+        order = np.argsort(indices, kind="stable")
+        self._postings_rows = rows[order]
+        self._postings_data = data[order]
+        self._postings_ptr = np.searchsorted(indices[order], np.arange(dims + 1))
+
+    def _build_base_names(self, names: List[str]):
+        # Normalized name tokens per distinct name, and the categories each token is used in
+        first_rows = np.unique(self.name_codes, return_index=True)[1] if self.size else np.zeros(0, dtype=np.int64)
+        self.name_tokens = [normalize_tokens(names[row]) for row in first_rows.tolist()]
+        token_categories: Dict[str, set] = {}
+        for tokens, row in zip(self.name_tokens, first_rows.tolist()):
+            for token in tokens:
+                token_categories.setdefault(token, set()).add(int(self.category_codes[row]))
+        threshold = max(BRAND_TOKEN_MIN_CATEGORIES, BRAND_TOKEN_SHARE * len(self.category_names))
+
+        # Base name: the name without brand-like words and sizes, e.g. "Garden Fresh Tomatoes 500g" -> "tomato"
+        base_codes: Dict[Tuple[str, ...], int] = {}
+        name_base = []
+        for tokens in self.name_tokens:
+            base = tuple(token for token in tokens
+                         if len(token_categories[token]) < threshold and not any(char.isdigit() for char in token))
+            name_base.append(base_codes.setdefault(base or tuple(tokens), len(base_codes)))
+        self.base_codes = np.asarray(name_base, dtype=np.int64)[self.name_codes] if self.size else self.name_codes
+
+    def diet_mask(self, diet: str) -> np.ndarray:
+        """Rows a diet rules out by category or name word; built once per diet."""
+        mask = self._diet_masks.get(diet)
+        if mask is None:
+            categories = _word_set(DIET_EXCLUDED_CATEGORIES.get(diet, []))
+            words = _word_set(DIET_EXCLUDED_WORDS.get(diet, []))
+            excluded_categories = np.array([bool(tokens & categories) for tokens in self.category_tokens], dtype=bool)
+            excluded_names = np.array([bool(words.intersection(tokens)) for tokens in self.name_tokens], dtype=bool)
+            mask = np.zeros(self.size, dtype=bool)
+            if self.size:
+                mask = excluded_categories[self.category_codes] | excluded_names[self.name_codes]
+            self._diet_masks[diet] = mask
+        return mask
+
+    def excluded(self, preferences: Dict[str, Any]) -> np.ndarray:
+        """Rows that conflict with any of the requested diets."""
+        mask = np.zeros(self.size, dtype=bool)
+        for diet in preference_values(preferences, DIET_KEYS):
+            if diet in DIET_EXCLUDED_CATEGORIES or diet in DIET_EXCLUDED_WORDS:
+                mask |= self.diet_mask(diet)
+        return mask
+
+    def category_scores(self, preferences: Dict[str, Any]) -> np.ndarray:
+        """Score for belonging to a category typical of the requested cuisines."""
+        scores = np.zeros(len(self.category_names), dtype=np.float64)
+        weight = PREFERENCE_WEIGHTS["cuisine"] * CATEGORY_WEIGHT
+        for cuisine in preference_values(preferences, ("cuisine",)):
+            wanted = {fold_text(name) for name in CUISINE_CATEGORIES.get(cuisine, DEFAULT_CUISINE_CATEGORIES)}
+            for code, name in enumerate(self.category_names):
+                if fold_text(name) in wanted:
+                    scores[code] += weight
+        return scores[self.category_codes] if self.size else np.zeros(0, dtype=np.float64)
+
+    def _bucket_counts(self, text: str) -> Tuple[np.ndarray, np.ndarray]:
+        buckets: Dict[int, int] = {}
+        for gram in char_ngrams(text):
+            bucket = zlib.crc32(gram.encode("utf-8")) % self.dims
+            buckets[bucket] = buckets.get(bucket, 0) + 1
+        keys = np.fromiter(buckets.keys(), dtype=np.int64, count=len(buckets))
+        values = np.fromiter(buckets.values(), dtype=np.float32, count=len(buckets))
+        return keys, values
+
+    def query_vector(self, terms: Iterable[Tuple[str, float]]) -> Dict[int, float]:
+        """Sparse query vector: each term is normalized on its own, then weighted."""
+        vector: Dict[int, float] = {}
+        for text, weight in terms:
+            keys, values = self._bucket_counts(text)
+            if not len(keys):
+                continue
+            values = values * self.idf[keys]
+            norm = math.sqrt(float(np.dot(values, values))) or 1.0
+            for key, value in zip(keys.tolist(), (values * (weight / norm)).tolist()):
+                vector[key] = vector.get(key, 0.0) + value
+        return vector
+
+    def score(self, preferences: Dict[str, Any]) -> np.ndarray:
+        """Score every item against the preferences; items the diet rules out score -1."""
+        scores = self.score_terms(preference_terms(preferences)) + self.category_scores(preferences)
+        scores[self.excluded(preferences)] = -1.0
+        return scores
+
+    def score_terms(self, terms: Iterable[Tuple[str, float]]) -> np.ndarray:
+        """Score every item against (text, weight) query terms."""
+        vector = self.query_vector(terms)
+        scores = np.zeros(self.size, dtype=np.float64)
+        if not vector:
+            return scores
+        rows_parts, weight_parts = [], []
+        for bucket, weight in vector.items():
+            start, end = self._postings_ptr[bucket], self._postings_ptr[bucket + 1]
+            if start == end:
+                continue
+            rows_parts.append(self._postings_rows[start:end])
+            weight_parts.append(self._postings_data[start:end] * weight)
+        if rows_parts:
+            scores += np.bincount(
+                np.concatenate(rows_parts), weights=np.concatenate(weight_parts), minlength=self.size
+            )
+        return scores
+
+    def top_k(self, preferences: Dict[str, Any], k: int, category_codes: np.ndarray = None) -> np.ndarray:
+        """Rows of the k best items for the preferences, best first.
+
+        Ties are broken by row number, so results are deterministic. Matching
+        items come first, at most MAX_ITEMS_PER_NAME with the same base name.
+        When fewer than k pass that cap, the matching items past it follow (the
+        next item of every base name before a second one of any), and only then
+        is the rest filled round-robin across categories (given by
+        `category_codes`) from items that did not score at all. Items matching
+        ingredients to avoid or ruled out by the diet are never added.
+        """
+        scores = self.score(preferences)
+        matched = np.flatnonzero(scores > 0)
+        matched = matched[np.lexsort((matched, -scores[matched]))]
+        ranks = rank_within_groups(self.base_codes[matched])
+        capped = ranks >= MAX_ITEMS_PER_NAME
+        overflow = matched[capped][np.argsort(ranks[capped], kind="stable")]
+        matched = np.concatenate([matched[~capped], overflow])[:k]
+        if len(matched) >= k or category_codes is None:
+            return matched
+
+        # Round-robin fill: the i-th item of every base name before the (i+1)-th of any,
+        # and within that the i-th item of every category before the (i+1)-th of any
+        available = np.ones(self.size, dtype=bool)
+        available[scores != 0] = False
+        fill = np.flatnonzero(available)
+        codes = category_codes[fill]
+        fill = fill[np.lexsort((codes, rank_within_groups(codes), rank_within_groups(self.base_codes[fill])))]
+        return np.concatenate([matched, fill[:k - len(matched)]])
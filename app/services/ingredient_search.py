@@ -0,0 +1,113 @@
+"""
+Ingredient Search
+
+This module resolves free-text ingredient names (e.g. the user's
+`ingredients_to_include`) to catalog items. Terms and item names are
+normalized (case, diacritics, simple plurals) and looked up in an in-memory
+token index with exact, prefix and trigram matching, so no regex scans of the
+catalog collection are needed.
+"""
+
+import bisect
+import unicodedata
+from typing import List, Dict, Iterable, Tuple
+
+import numpy as np
+
+EXACT_SCORE = 1.0
+PREFIX_SCORE = 0.8
+TRIGRAM_SCORE = 0.6
+MIN_TRIGRAM_SIMILARITY = 0.5
+
+
+def fold_text(text: str) -> str:
+    """Casefold and strip diacritics, e.g. "Crème Fraîche" -> "creme fraiche"."""
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(char for char in decomposed if not unicodedata.combining(char)).casefold()
+
+def singularize(word: str) -> str:
+    """Reduce common English plurals to their singular form."""
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 4 and word.endswith(("oes", "ches", "shes", "sses", "xes", "zes")):
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    return word
+
+def normalize_tokens(text: str) -> List[str]:
+    """Split text into normalized, singularized word tokens."""
+    folded = "".join(char if char.isalnum() else " " for char in fold_text(text))
+    return [singularize(token) for token in folded.split()]
+
+def trigrams(token: str) -> set:
+    padded = f" {token} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class IngredientSearchIndex:
+    """Token index over item names supporting exact, prefix and trigram matches."""
+
+    def __init__(self, names: List[str]):
+        """Build the index from item names, in row order."""
+        self.name_lengths = np.array([len(name) for name in names], dtype=np.int64)
+        token_rows: Dict[str, List[int]] = {}
+        for row, name in enumerate(names):
+            for token in set(normalize_tokens(name)):
+                token_rows.setdefault(token, []).append(row)
+        self.tokens = sorted(token_rows)
+        self.token_rows = {token: np.array(rows, dtype=np.int64) for token, rows in token_rows.items()}
+        self.token_trigrams = {token: trigrams(token) for token in self.tokens}
+        self.trigram_tokens: Dict[str, List[str]] = {}
+        for token, grams in self.token_trigrams.items():
+            for gram in grams:
+                self.trigram_tokens.setdefault(gram, []).append(token)
+
+    def match_tokens(self, query_token: str) -> List[Tuple[str, float]]:
+        """Catalog tokens matching one query token, with their match score."""
+        matches = {}
+        if query_token in self.token_rows:
+            matches[query_token] = EXACT_SCORE
+        start = bisect.bisect_left(self.tokens, query_token)
+        for token in self.tokens[start:]:
+            if not token.startswith(query_token):
+                break
+            matches.setdefault(token, PREFIX_SCORE)
+        query_grams = trigrams(query_token)
+        overlaps: Dict[str, int] = {}
+        for gram in query_grams:
+            for token in self.trigram_tokens.get(gram, ()):
+                overlaps[token] = overlaps.get(token, 0) + 1
+        for token, overlap in overlaps.items():
+            similarity = overlap / len(query_grams | self.token_trigrams[token])
+            if similarity >= MIN_TRIGRAM_SIMILARITY and token not in matches:
+                matches[token] = TRIGRAM_SCORE * similarity
+        return list(matches.items())
+
+    def search(self, term: str, limit: int = None) -> List[int]:
+        """Rows whose names match every word of the term, best match first.
+
+        Rows are ranked by match score, then by shorter name, then by row number.
+        """
+        query_tokens = normalize_tokens(term)
+        if not query_tokens:
+            return []
+        total = None
+        for query_token in query_tokens:
+            best: Dict[int, float] = {}
+            for token, score in self.match_tokens(query_token):
+                for row in self.token_rows[token].tolist():
+                    if score > best.get(row, 0.0):
+                        best[row] = score
+            if total is None:
+                total = best
+            else:
+                total = {row: total[row] + score for row, score in best.items() if row in total}
+            if not total:
+                return []
+        rows = sorted(total, key=lambda row: (-total[row], self.name_lengths[row], row))
+        return rows[:limit] if limit is not None else rows
+
+    def search_many(self, terms: Iterable[str], limit: int = None) -> Dict[str, List[int]]:
+        """Resolve several terms in one pass, returning ranked rows per term."""
+        return {term: self.search(term, limit) for term in terms}
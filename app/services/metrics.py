@@ -0,0 +1,229 @@
+"""
+Metrics
+
+This module keeps low-overhead, in-process counters and histograms for the
+request path (preference parsing, catalog queries, prompt assembly, the model
+call, parsing and verification) and renders them in the Prometheus text
+exposition format for `/api/metrics`.
+"""
+
+import time
+import bisect
+import functools
+import threading
+from contextlib import contextmanager
+from typing import List, Dict, Any, Callable, Iterable, Tuple
+
+# Latency buckets in seconds, from in-memory lookups up to slow model calls
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Prompt size buckets in characters
+SIZE_BUCKETS = (1000, 2000, 4000, 8000, 16000, 32000, 64000, 128000)
+
+# A collector returns (name, type, help, [(labels, value), ...]) tuples, read at scrape time
+Collector = Callable[[], Iterable[Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]]]
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    pairs = []
+    for key, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{key}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter, optionally split by labels."""
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(str(labels[name]) for name in self.labelnames), 0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            lines.append(f"{self.name}{_format_labels(dict(zip(self.labelnames, key)))} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """Fixed-bucket histogram, optionally split by labels."""
+
+    def __init__(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        # Per label set: [per-bucket counts (last one is +Inf), sum]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def count(self, **labels) -> int:
+        series = self._series.get(tuple(str(labels[name]) for name in self.labelnames))
+        return sum(series[0]) if series else 0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted((key, (list(counts), total)) for key, (counts, total) in self._series.items())
+        for key, (counts, total) in series:
+            labels = dict(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                bucket_labels = dict(labels, le=_format_value(float(bound)))
+                lines.append(f"{self.name}_bucket{_format_labels(bucket_labels)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds the process's metrics and collectors and renders them for scraping."""
+
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+        self._collectors: Dict[str, Collector] = {}
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help_text: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        """Get or create a counter."""
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Counter(name, help_text, labelnames)
+            return self._metrics[name]
+
+    def histogram(self, name: str, help_text: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        """Get or create a histogram."""
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = Histogram(name, help_text, labelnames, buckets)
+            return self._metrics[name]
+
+    def register_collector(self, key: str, collector: Collector):
+        """Add (or replace) a collector that reports values kept elsewhere, such as cache stats."""
+        with self._lock:
+            self._collectors[key] = collector
+
+    def render(self) -> str:
+        """Render every metric in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        for collector in collectors:
+            try:
+                families = list(collector())
+            except Exception:
+                continue
+            for name, metric_type, help_text, samples in families:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+registry = MetricsRegistry()
+
+STAGE_SECONDS = registry.histogram(
+    "recipe_stage_duration_seconds",
+    "Time spent in each stage of recipe generation.",
+    ("stage",),
+)
+CATALOG_QUERY_SECONDS = registry.histogram(
+    "catalog_query_duration_seconds",
+    "Time spent in each MongoDB catalog query.",
+    ("operation",),
+)
+PROMPT_CHARS = registry.histogram(
+    "recipe_prompt_chars",
+    "Size of each generation prompt in characters.",
+    buckets=SIZE_BUCKETS,
+)
+GENERATIONS = registry.counter(
+    "recipe_generations_total",
+    "Recipe generation requests by how they were served.",
+    ("source",),
+)
+MODEL_TOKENS = registry.counter(
+    "gemini_tokens_total",
+    "Tokens reported by the model, by kind.",
+    ("kind",),
+)
+
+
+@contextmanager
+def span(stage: str):
+    """Time a block and record it as one stage of recipe generation."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+
+def timed_query(operation: str):
+    """Decorator recording each call's duration as a catalog query."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                CATALOG_QUERY_SECONDS.observe(time.perf_counter() - start, operation=operation)
+        return wrapper
+    return decorator
+
+def record_usage(response):
+    """Count the prompt, cached prompt and output tokens reported on a model response, if any."""
+    usage = getattr(response, "usage_metadata", None)
+    if usage is None:
+        return
+    MODEL_TOKENS.inc(usage.prompt_token_count or 0, kind="prompt")
+    # The part of the prompt Gemini served from its implicit prompt cache
+    MODEL_TOKENS.inc(getattr(usage, "cached_content_token_count", None) or 0, kind="cached")
+    MODEL_TOKENS.inc(usage.candidates_token_count or 0, kind="output")
+
+def stats_collector(prefix: str, help_text: str, get_stats: Callable[[], Dict[str, Any]], counters: Iterable[str] = ()) -> Collector:
+    """Build a collector exposing a stats dict: keys in `counters` as counters, other numbers as gauges."""
+    counters = set(counters)
+
+    def collect():
+        for key, value in get_stats().items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            suffix = "_total" if key in counters else ""
+            yield f"{prefix}_{key}{suffix}", "counter" if key in counters else "gauge", f"{help_text} ({key})", [({}, value)]
+    return collect
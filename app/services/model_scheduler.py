@@ -0,0 +1,315 @@
+"""
+Model Scheduler
+
+This module schedules calls to the Gemini API. A token bucket keeps the
+request rate within the project's quota and shrinks when the API starts
+returning quota errors, a concurrency cap bounds in-flight calls, and a
+bounded priority queue puts interactive requests ahead of batch work.
+When the queue is full, or a request has waited too long, callers get a
+`ModelOverloadedError` with a Retry-After hint right away instead of piling up.
+Quota and availability errors are retried with jittered exponential backoff.
+"""
+
+import os
+import time
+import heapq
+import random
+import asyncio
+import itertools
+import threading
+from typing import Dict, Any, Callable, Awaitable, Optional
+
+from app.services.metrics import registry
+
+INTERACTIVE = "interactive"
+BATCH = "batch"
+LANES = (INTERACTIVE, BATCH)
+
+# Seconds between re-checks for async callers, which cannot wait on the condition
+ASYNC_POLL_INTERVAL = 0.05
+
+QUEUE_WAIT_SECONDS = registry.histogram(
+    "model_queue_wait_seconds",
+    "Time model calls waited for a rate-limit token and a concurrency slot.",
+    ("lane",),
+)
+
+
+class ModelOverloadedError(Exception):
+    """The model call was not admitted, or kept failing with quota errors. Retry after `retry_after` seconds.
+
+    `attempts` is the number of model calls the scheduler made before giving up, 0 when the call was not admitted.
+    """
+
+    def __init__(self, message: str, retry_after: float = 1.0, attempts: int = 0):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.attempts = attempts
+
+
+def is_retryable(error: Exception) -> bool:
+    """Check whether an API error is a quota or availability error worth retrying.
+
+    Only the error's status code and the API's status names count; a bare "429"
+    elsewhere in a message (an ID, a byte count) does not.
+    """
+    code = getattr(error, "code", None) or getattr(error, "status_code", None)
+    if code in (429, 500, 503, 504):
+        return True
+    return any(marker in str(error) for marker in ("RESOURCE_EXHAUSTED", "UNAVAILABLE"))
+
+def is_throttled(error: Exception) -> bool:
+    code = getattr(error, "code", None) or getattr(error, "status_code", None)
+    return code == 429 or "RESOURCE_EXHAUSTED" in str(error)
+
+
+class TokenBucket:
+    """Token bucket whose refill rate adapts: halved on throttling, recovered gradually on success.
+
+    A rate of 0 or less means no limit: every take succeeds and throttling is ignored.
+    """
+
+    def __init__(self, rate: float, burst: float, min_rate: Optional[float] = None):
+        self.limited = rate > 0
+        self.max_rate = max(rate, 0.0)
+        self.min_rate = min_rate if min_rate is not None else self.max_rate / 10
+        self.rate = self.max_rate
+        # A bucket holding less than one token would never grant one
+        self.burst = max(burst, 1.0)
+        self.tokens = self.burst
+        self.updated_at = time.monotonic()
+
+    def take(self) -> float:
+        """Take a token if one is available. Returns 0, or the seconds until one will be."""
+        if not self.limited:
+            return 0.0
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def throttled(self):
+        if not self.limited:
+            return
+        self.rate = max(self.min_rate, self.rate / 2)
+        self.tokens = min(self.tokens, 0)
+
+    def succeeded(self):
+        self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+
+class _Ticket:
+    __slots__ = ("lane", "enqueued_at", "deadline")
+
+    def __init__(self, lane: str, max_wait: float):
+        self.lane = lane
+        self.enqueued_at = time.monotonic()
+        self.deadline = self.enqueued_at + max_wait
+
+
+class ModelScheduler:
+    """Admission control, rate limiting and retries for model calls."""
+
+    def __init__(self, rate_per_minute: float = 600, burst: float = 10, max_concurrency: int = 16,
+                 max_queue: Optional[Dict[str, int]] = None, max_wait: Optional[Dict[str, float]] = None,
+                 retries: int = 3, backoff_base: float = 0.5, backoff_max: float = 8.0):
+        """
+        Args:
+            rate_per_minute: Model requests per minute allowed by the quota (0 for no limit)
+            burst: Requests that may start at once after an idle period
+            max_concurrency: Model calls in flight at once
+            max_queue: Waiting calls per lane before new ones are rejected
+            max_wait: Seconds a call may wait per lane before it is rejected
+            retries: Retries of a call failing with a quota or availability error
+            backoff_base: First backoff in seconds, doubled on each retry (with full jitter)
+            backoff_max: Longest backoff in seconds
+        """
+        self.bucket = TokenBucket(rate_per_minute / 60, burst)
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue or {INTERACTIVE: 64, BATCH: 256}
+        self.max_wait = max_wait or {INTERACTIVE: 10.0, BATCH: 300.0}
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._heap = []
+        self._sequence = itertools.count()
+        self._waiting = {lane: 0 for lane in LANES}
+        self._active = 0
+        self._cond = threading.Condition()
+        self.counts = {"admitted": 0, "rejected": 0, "timed_out": 0, "retried": 0, "throttled": 0, "failed": 0}
+
+    def retry_after(self) -> float:
+        """Estimate when a rejected caller should try again, from the queue length and current rate."""
+        if not self.bucket.limited:
+            return 1.0
+        return max(1.0, round(len(self._heap) / self.bucket.rate))
+
+    def _enqueue(self, lane: str) -> _Ticket:
+        with self._cond:
+            if self._waiting[lane] >= self.max_queue[lane]:
+                self.counts["rejected"] += 1
+                raise ModelOverloadedError(f"Model queue is full ({lane})", self.retry_after())
+            ticket = _Ticket(lane, self.max_wait[lane])
+            heapq.heappush(self._heap, (LANES.index(lane), next(self._sequence), ticket))
+            self._waiting[lane] += 1
+            return ticket
+
+    def _try_grant(self, ticket: _Ticket) -> Optional[float]:
+        # Called with the condition held. Returns 0 when granted, the seconds until a token
+        # frees up when this ticket is next, or None while other calls are ahead of it
+        if self._heap[0][2] is not ticket or self._active >= self.max_concurrency:
+            return None
+        wait = self.bucket.take()
+        if wait > 0:
+            return wait
+        heapq.heappop(self._heap)
+        self._waiting[ticket.lane] -= 1
+        self._active += 1
+        self.counts["admitted"] += 1
+        self._cond.notify_all()
+        QUEUE_WAIT_SECONDS.observe(time.monotonic() - ticket.enqueued_at, lane=ticket.lane)
+        return 0.0
+
+    def _remove(self, ticket: _Ticket) -> bool:
+        # Called with the condition held
+        if not any(entry[2] is ticket for entry in self._heap):
+            return False
+        self._heap = [entry for entry in self._heap if entry[2] is not ticket]
+        heapq.heapify(self._heap)
+        self._waiting[ticket.lane] -= 1
+        self._cond.notify_all()
+        return True
+
+    def _give_up(self, ticket: _Ticket):
+        # Called with the condition held
+        self._remove(ticket)
+        self.counts["timed_out"] += 1
+        raise ModelOverloadedError(f"Timed out waiting for the model ({ticket.lane})", self.retry_after())
+
+    def acquire(self, lane: str = INTERACTIVE):
+        """Wait for a rate-limit token and a concurrency slot. Pair with `release`.
+
+        Raises:
+            ModelOverloadedError: If the lane's queue is full or the wait exceeds its limit
+        """
+        ticket = self._enqueue(lane)
+        with self._cond:
+            while True:
+                wait = self._try_grant(ticket)
+                if wait == 0:
+                    return
+                remaining = ticket.deadline - time.monotonic()
+                if remaining <= 0:
+                    self._give_up(ticket)
+                self._cond.wait(min(wait, remaining) if wait is not None else remaining)
+
+    async def acquire_async(self, lane: str = INTERACTIVE):
+        """Like `acquire`, without blocking the event loop."""
+        ticket = self._enqueue(lane)
+        try:
+            while True:
+                with self._cond:
+                    wait = self._try_grant(ticket)
+                    if wait == 0:
+                        return
+                    remaining = ticket.deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._give_up(ticket)
+                await asyncio.sleep(min(wait if wait is not None else ASYNC_POLL_INTERVAL, remaining))
+        except asyncio.CancelledError:
+            # A cancelled caller must not stay at the head of the queue
+            with self._cond:
+                self._remove(ticket)
+            raise
+
+    def release(self):
+        """Free the concurrency slot taken by `acquire`."""
+        with self._cond:
+            self._active -= 1
+            self._cond.notify_all()
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff for the given retry attempt."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _outcome(self, error: Optional[Exception], attempt: int) -> float:
+        # Record a call's outcome; returns the backoff before retrying, or raises
+        with self._cond:
+            if error is None:
+                self.bucket.succeeded()
+                return 0.0
+            if is_throttled(error):
+                self.counts["throttled"] += 1
+                self.bucket.throttled()
+            if not is_retryable(error) or attempt >= self.retries:
+                self.counts["failed"] += 1
+                if is_retryable(error):
+                    raise ModelOverloadedError(f"Model unavailable after {attempt + 1} attempts: {error}", self.retry_after(), attempt + 1) from error
+                raise error
+            self.counts["retried"] += 1
+        return self.backoff(attempt)
+
+    def call(self, func: Callable[[], Any], lane: str = INTERACTIVE) -> Any:
+        """Run a model call under the scheduler, retrying quota and availability errors."""
+        for attempt in range(self.retries + 1):
+            self.acquire(lane)
+            error = None
+            try:
+                result = func()
+            except Exception as e:
+                error = e
+            finally:
+                self.release()
+            delay = self._outcome(error, attempt)
+            if error is None:
+                return result
+            time.sleep(delay)
+
+    async def call_async(self, func: Callable[[], Awaitable[Any]], lane: str = INTERACTIVE) -> Any:
+        """Async version of `call`."""
+        for attempt in range(self.retries + 1):
+            await self.acquire_async(lane)
+            error = None
+            try:
+                result = await func()
+            except Exception as e:
+                error = e
+            finally:
+                self.release()
+            delay = self._outcome(error, attempt)
+            if error is None:
+                return result
+            await asyncio.sleep(delay)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get queue depth per lane, calls in flight, the current rate and the counters."""
+        with self._cond:
+            stats = dict(self.counts)
+            for lane in LANES:
+                stats[f"queue_depth_{lane}"] = self._waiting[lane]
+            stats["in_flight"] = self._active
+            stats["rate_per_minute"] = self.bucket.rate * 60
+        return stats
+
+
+def get_model_scheduler() -> ModelScheduler:
+    """Factory function to build the model scheduler from environment settings."""
+    return ModelScheduler(
+        rate_per_minute=float(os.getenv("MODEL_RATE_LIMIT_RPM", 600)),
+        burst=float(os.getenv("MODEL_RATE_BURST", 10)),
+        max_concurrency=int(os.getenv("MODEL_MAX_CONCURRENCY", 16)),
+        max_queue={
+            INTERACTIVE: int(os.getenv("MODEL_MAX_QUEUE", 64)),
+            BATCH: int(os.getenv("MODEL_MAX_BATCH_QUEUE", 256)),
+        },
+        max_wait={
+            INTERACTIVE: float(os.getenv("MODEL_MAX_QUEUE_WAIT", 10)),
+            BATCH: float(os.getenv("MODEL_MAX_BATCH_QUEUE_WAIT", 300)),
+        },
+        retries=int(os.getenv("MODEL_RETRIES", 3)),
+        backoff_base=float(os.getenv("MODEL_BACKOFF_BASE", 0.5)),
+        backoff_max=float(os.getenv("MODEL_BACKOFF_MAX", 8)),
+    )
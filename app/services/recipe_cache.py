@@ -0,0 +1,324 @@
+"""
+Recipe Cache
+
+This module caches generated recipes so that requests with equivalent
+preferences can skip prompt building and the Gemini call entirely.
+Entries are keyed on the canonicalized preferences plus the version of the
+full catalog load, and tagged with the catalog items and categories they
+were built from. Catalog deltas invalidate just the entries carrying an
+affected tag, and a full reload changes the key of every entry, so a catalog
+change never serves recipes built from stale ingredients.
+"""
+
+import os
+import copy
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Iterable, Set
+
+
+def canonicalize_preferences(preferences: Any) -> Any:
+    """Normalize preferences so that equivalent requests compare equal.
+
+    Strings are trimmed and lowercased, empty values are dropped, dict keys are
+    normalized and lists of scalars are sorted and deduplicated (by type and value).
+    """
+    if isinstance(preferences, dict):
+        canonical = {}
+        for key, value in preferences.items():
+            value = canonicalize_preferences(value)
+            if value in (None, "", [], {}):
+                continue
+            canonical[str(key).strip().lower()] = value
+        return canonical
+    if isinstance(preferences, (list, tuple)):
+        values = [canonicalize_preferences(value) for value in preferences]
+        values = [value for value in values if value not in (None, "", [], {})]
+        if all(isinstance(value, (str, int, float, bool)) for value in values):
+            # Deduplicated by type as well, since True == 1 and False == 0 would otherwise collapse
+            unique = {(type(value).__name__, value): value for value in values}
+            return [unique[key] for key in sorted(unique)]
+        return values
+    if isinstance(preferences, str):
+        return " ".join(preferences.lower().split())
+    return preferences
+
+def make_cache_key(preferences: Dict[str, Any], catalog_version: Optional[str] = None, count: int = 1) -> str:
+    """Build a stable cache key from preferences, the catalog version and the number of recipes."""
+    payload = {"preferences": canonicalize_preferences(preferences), "catalog_version": catalog_version}
+    # Single-recipe keys keep their original form
+    if count != 1:
+        payload["count"] = count
+    payload = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class MemoryCacheTier:
+    """In-memory LRU tier with size and TTL eviction."""
+
+    def __init__(self, max_size: int = 1024, ttl: float = 3600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._keys_by_tag: Dict[str, Set[str]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value, _ = entry
+            if expires_at <= time.time():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, tags: Iterable[str] = ()):
+        with self._lock:
+            self._remove(key)
+            tags = tuple(tags)
+            self._entries[key] = (time.time() + self.ttl, value, tags)
+            for tag in tags:
+                self._keys_by_tag.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+
+    def tags(self, key: str) -> List[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            return list(entry[2]) if entry is not None else []
+
+    def delete(self, key: str):
+        with self._lock:
+            self._remove(key)
+
+    def invalidate(self, tags: Iterable[str]) -> int:
+        with self._lock:
+            keys = set()
+            for tag in tags:
+                keys.update(self._keys_by_tag.get(tag, ()))
+            for key in keys:
+                self._remove(key)
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._keys_by_tag.clear()
+
+    def _remove(self, key: str):
+        # Called with the lock held
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for tag in entry[2]:
+            keys = self._keys_by_tag.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._keys_by_tag[tag]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteCacheTier:
+    """On-disk tier backed by a single SQLite table, shared across restarts."""
+
+    def __init__(self, path: str, ttl: float = 86400):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+        self._connection_pid: Optional[int] = None
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS recipe_cache (key TEXT PRIMARY KEY, expires_at REAL, value TEXT)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS recipe_cache_tags (tag TEXT, key TEXT)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS recipe_cache_tags_tag ON recipe_cache_tags (tag)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS recipe_cache_tags_key ON recipe_cache_tags (key)")
+        self._conn.commit()
+
+    @property
+    def _conn(self) -> sqlite3.Connection:
+        # A connection must not be used across fork(), so a forked worker opens its own
+        if self._connection_pid != os.getpid():
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+            self._connection_pid = os.getpid()
+        return self._connection
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT expires_at, value FROM recipe_cache WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            if row[0] <= time.time():
+                self._delete_keys([key])
+                self._conn.commit()
+                return None
+        return json.loads(row[1])
+
+    def set(self, key: str, value: Any, tags: Iterable[str] = ()):
+        payload = json.dumps(value)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO recipe_cache (key, expires_at, value) VALUES (?, ?, ?)",
+                (key, time.time() + self.ttl, payload),
+            )
+            self._conn.execute("DELETE FROM recipe_cache_tags WHERE key = ?", (key,))
+            self._conn.executemany("INSERT INTO recipe_cache_tags (tag, key) VALUES (?, ?)", [(tag, key) for tag in tags])
+            self._conn.commit()
+
+    def tags(self, key: str) -> List[str]:
+        with self._lock:
+            rows = self._conn.execute("SELECT tag FROM recipe_cache_tags WHERE key = ?", (key,)).fetchall()
+        return [row[0] for row in rows]
+
+    def delete(self, key: str):
+        with self._lock:
+            self._delete_keys([key])
+            self._conn.commit()
+
+    def invalidate(self, tags: Iterable[str]) -> int:
+        tags = list(tags)
+        with self._lock:
+            keys = set()
+            # Stay under SQLite's limit on bound parameters
+            for start in range(0, len(tags), 500):
+                chunk = tags[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT DISTINCT key FROM recipe_cache_tags WHERE tag IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall()
+                keys.update(row[0] for row in rows)
+            self._delete_keys(list(keys))
+            self._conn.commit()
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM recipe_cache")
+            self._conn.execute("DELETE FROM recipe_cache_tags")
+            self._conn.commit()
+
+    def _delete_keys(self, keys: List[str]):
+        # Called with the lock held; the caller commits
+        self._conn.executemany("DELETE FROM recipe_cache WHERE key = ?", [(key,) for key in keys])
+        self._conn.executemany("DELETE FROM recipe_cache_tags WHERE key = ?", [(key,) for key in keys])
+
+
+class RecipeCache:
+    """Tiered cache of generated recipes with hit and miss counters."""
+
+    def __init__(self, tiers: List[Any]):
+        """Initialize with tiers ordered from fastest to slowest."""
+        self.tiers = tiers
+        self.hits = 0
+        self.misses = 0
+        self.invalidated = 0
+        # Sequence of the catalog snapshot that last invalidated each tag
+        self._invalidated_at: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, preferences: Dict[str, Any], catalog_version: Optional[str] = None, count: int = 1) -> Optional[List[Dict[str, Any]]]:
+        """Get cached recipes for the preferences, or None on a miss."""
+        key = make_cache_key(preferences, catalog_version, count)
+        for index, tier in enumerate(self.tiers):
+            value = tier.get(key)
+            if value is not None:
+                # Promote to the faster tiers, keeping the tags so invalidation still reaches it
+                if index:
+                    tags = tier.tags(key)
+                    for faster_tier in self.tiers[:index]:
+                        faster_tier.set(key, value, tags)
+                with self._lock:
+                    self.hits += 1
+                return copy.deepcopy(value)
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, preferences: Dict[str, Any], catalog_version: Optional[str], recipes: List[Dict[str, Any]],
+            tags: Iterable[str] = (), sequence: Optional[int] = None, count: int = 1):
+        """Store validated recipes for the preferences.
+
+        `tags` name the catalog items and categories the recipes were built from
+        and `sequence` the catalog snapshot they were built from. Recipes built
+        from a snapshot older than a later invalidation of one of their tags are
+        not stored, so a generation that overlaps a catalog change cannot
+        reinsert stale recipes.
+        """
+        key = make_cache_key(preferences, catalog_version, count)
+        tags = list(tags)
+        if sequence is not None:
+            with self._lock:
+                if any(self._invalidated_at.get(tag, -1) > sequence for tag in tags):
+                    return
+        value = copy.deepcopy(recipes)
+        for tier in self.tiers:
+            tier.set(key, value, tags)
+
+    def invalidate(self, tags: Iterable[str], sequence: Optional[int] = None) -> int:
+        """Remove every entry carrying one of the tags, from every tier.
+
+        Returns:
+            int: Number of entries removed from the fastest tier
+        """
+        tags = list(tags)
+        if sequence is not None:
+            with self._lock:
+                for tag in tags:
+                    self._invalidated_at[tag] = max(sequence, self._invalidated_at.get(tag, -1))
+        removed = [tier.invalidate(tags) for tier in self.tiers]
+        with self._lock:
+            self.invalidated += removed[0] if removed else 0
+        return removed[0] if removed else 0
+
+    def clear(self):
+        """Remove every entry from every tier."""
+        for tier in self.tiers:
+            tier.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Get hit and miss counters."""
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidated": self.invalidated,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+def is_cacheable(recipes: Any) -> bool:
+    """Check that a parsed response is a well-formed recipe list worth caching."""
+    if not isinstance(recipes, list) or not recipes:
+        return False
+    for recipe in recipes:
+        if not isinstance(recipe, dict) or not recipe.get('title'):
+            return False
+        ingredients = recipe.get('ingredients')
+        if not isinstance(ingredients, dict) or not ingredients.get('necessary_items'):
+            return False
+    return True
+
+def get_recipe_cache() -> Optional[RecipeCache]:
+    """Factory function to build the recipe cache from environment settings.
+
+    Returns None when caching is disabled with RECIPE_CACHE_ENABLED=false.
+    """
+    if os.getenv("RECIPE_CACHE_ENABLED", "true").lower() in ("0", "false", "no"):
+        return None
+    ttl = float(os.getenv("RECIPE_CACHE_TTL", 3600))
+    tiers = [MemoryCacheTier(max_size=int(os.getenv("RECIPE_CACHE_SIZE", 1024)), ttl=ttl)]
+    sqlite_path = os.getenv("RECIPE_CACHE_SQLITE_PATH")
+    if sqlite_path:
+        tiers.append(SQLiteCacheTier(sqlite_path, ttl=float(os.getenv("RECIPE_CACHE_SQLITE_TTL", ttl))))
+    return RecipeCache(tiers)
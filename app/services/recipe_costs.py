@@ -0,0 +1,124 @@
+"""
+Recipe Costs
+
+This module adds cost and weight totals to validated recipes. Prices and
+packet weights come from the catalog snapshot the recipes were built from,
+and the totals for a whole batch of recipes are computed with a few NumPy
+operations over one flat array of ingredient rows. It also keeps a
+per-category, price-sorted index of the catalog for finding the cheapest
+substitutes of an item within its category.
+"""
+
+import os
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+from app.services.mongodb_service import ingredient_id
+from app.services.recipe_schema import INGREDIENT_LISTS
+
+# Servings assumed when neither the recipe nor the preferences give a number (at least 1,
+# since costs are divided by it)
+DEFAULT_SERVINGS = max(int(os.getenv("RECIPE_DEFAULT_SERVINGS", 2)), 1)
+
+
+def _positive_int(value: Any) -> Optional[int]:
+    # Whole numbers of at least 1, given as numbers or numeric strings; anything else is ignored
+    if isinstance(value, bool):
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError, OverflowError):
+        return None
+    if not number.is_integer() or number < 1:
+        return None
+    return int(number)
+
+def _quantity(entry: Any) -> float:
+    # Bare _ids (older responses) and missing quantities count as one packet
+    quantity = entry.get("quantity") if isinstance(entry, dict) else None
+    if isinstance(quantity, bool) or not isinstance(quantity, (int, float)) or quantity <= 0:
+        return 1.0
+    return float(quantity)
+
+def recipe_servings(recipe: Dict[str, Any], preferences: Optional[Dict[str, Any]] = None) -> int:
+    """Servings of a recipe: its own `servings`, else the requested servings, else RECIPE_DEFAULT_SERVINGS."""
+    # Preferences come from the request body, which may be any JSON value
+    requested = preferences.get("servings") if isinstance(preferences, dict) else None
+    for value in (recipe.get("servings"), requested):
+        servings = _positive_int(value)
+        if servings is not None:
+            return servings
+    return DEFAULT_SERVINGS
+
+def add_recipe_totals(recipes: List[Dict[str, Any]], snapshot, preferences: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+    """
+    Add a `totals` object with cost and weight totals to each recipe, in place
+
+    Costs are packet price times quantity. `cost`, `cost_per_serving` and
+    `weight_grams` cover the necessary items; the `_with_optional` fields add
+    the optional items. Ingredients not in the snapshot are left out.
+
+    Args:
+        recipes (list): Validated recipes with real MongoDB _ids
+        snapshot (CatalogSnapshot): Snapshot to read prices and packet weights from
+        preferences (dict): Preferences the recipes were generated for (for `servings`)
+
+    Returns:
+        list: The same recipes
+    """
+    groups, rows, quantities = [], [], []
+    for index, recipe in enumerate(recipes):
+        ingredients = recipe.get("ingredients") or {}
+        for optional, list_name in enumerate(INGREDIENT_LISTS):
+            for entry in ingredients.get(list_name) or []:
+                row = snapshot.id_index.get(ingredient_id(entry))
+                if row is not None:
+                    # One group per (recipe, list): necessary items at 2i, optional items at 2i + 1
+                    groups.append(2 * index + optional)
+                    rows.append(row)
+                    quantities.append(_quantity(entry))
+
+    groups = np.asarray(groups, dtype=np.intp)
+    rows = np.asarray(rows, dtype=np.intp)
+    quantities = np.asarray(quantities, dtype=np.float64)
+    size = 2 * len(recipes)
+    costs = np.bincount(groups, weights=snapshot.prices[rows] * quantities, minlength=size).reshape(-1, 2)
+    weights = np.bincount(groups, weights=snapshot.weights[rows] * quantities, minlength=size).reshape(-1, 2)
+    servings = np.array([recipe_servings(recipe, preferences) for recipe in recipes], dtype=np.float64)
+    costs_with_optional = costs.sum(axis=1)
+    weights_with_optional = weights.sum(axis=1)
+
+    columns = {
+        "cost": np.round(costs[:, 0], 2),
+        "cost_per_serving": np.round(costs[:, 0] / servings, 2),
+        "cost_with_optional": np.round(costs_with_optional, 2),
+        "cost_per_serving_with_optional": np.round(costs_with_optional / servings, 2),
+        "weight_grams": np.round(weights[:, 0], 2),
+        "weight_grams_with_optional": np.round(weights_with_optional, 2),
+    }
+    for index, recipe in enumerate(recipes):
+        totals = {"servings": int(servings[index])}
+        totals.update((name, float(values[index])) for name, values in columns.items())
+        recipe["totals"] = totals
+    return recipes
+
+
+class CategoryPriceIndex:
+    """Priced catalog rows sorted by category, then price, with the offset where each category starts."""
+
+    def __init__(self, category_codes: np.ndarray, prices: np.ndarray, category_count: int):
+        """Build the index; items without a price are never offered as substitutes."""
+        self.category_codes = category_codes
+        self.prices = prices
+        priced = np.flatnonzero(prices > 0)
+        self.order = priced[np.lexsort((prices[priced], category_codes[priced]))]
+        self.sorted_prices = prices[self.order]
+        self.starts = np.searchsorted(category_codes[self.order], np.arange(category_count + 1))
+
+    def cheaper(self, row: int, limit: int = 1) -> np.ndarray:
+        """Rows in the same category as `row` that cost less than it, cheapest first."""
+        code = self.category_codes[row]
+        start, end = self.starts[code], self.starts[code + 1]
+        cutoff = start + np.searchsorted(self.sorted_prices[start:end], self.prices[row], side="left")
+        return self.order[start:min(cutoff, start + limit)]
@@ -0,0 +1,254 @@
+"""
+Recipe Pool
+
+This module keeps a pool of pre-generated, validated recipes for configured
+preference profiles (e.g. the common cuisine and diet combinations), so that
+matching requests are answered from memory instead of waiting for a fresh
+generation. Background workers keep each profile's pool filled, retire
+recipes after they have been served a few times to keep variety, and drop
+recipes whose catalog items changed price or were removed.
+"""
+
+import os
+import copy
+import json
+import time
+import queue
+import random
+import logging
+import threading
+from typing import List, Dict, Any, Callable, Optional
+
+from app.services.recipe_cache import canonicalize_preferences, make_cache_key
+from app.services.mongodb_service import ingredient_id
+from app.services.recipe_schema import INGREDIENT_LISTS
+
+logger = logging.getLogger(__name__)
+
+# generate(preferences, snapshot) -> validated recipes, bypassing the response cache
+PoolGenerator = Callable[[Dict[str, Any], Any], List[Dict[str, Any]]]
+
+
+def recipe_fingerprint(recipes: List[Dict[str, Any]], snapshot) -> Optional[Dict[str, float]]:
+    """Map every catalog _id the recipes reference to its current price, or None if one is unknown."""
+    fingerprint = {}
+    for recipe in recipes:
+        ingredients = recipe.get("ingredients") or {}
+        for list_name in INGREDIENT_LISTS:
+            for entry in ingredients.get(list_name) or []:
+                mongodb_id = ingredient_id(entry)
+                row = snapshot.id_index.get(mongodb_id)
+                if row is None:
+                    return None
+                fingerprint[mongodb_id] = float(snapshot.prices[row])
+    return fingerprint
+
+def is_current(fingerprint: Dict[str, float], snapshot) -> bool:
+    """Check that every referenced item still exists at the price it had when the recipes were generated."""
+    for mongodb_id, price in fingerprint.items():
+        row = snapshot.id_index.get(mongodb_id)
+        if row is None or float(snapshot.prices[row]) != price:
+            return False
+    return True
+
+
+class PoolEntry:
+    """One pre-generated response and the catalog state it was built from."""
+
+    def __init__(self, recipes: List[Dict[str, Any]], fingerprint: Dict[str, float]):
+        self.recipes = recipes
+        self.fingerprint = fingerprint
+        self.created_at = time.time()
+        self.serves = 0
+
+
+class RecipePool:
+    """Pre-generated recipes per preference profile, filled by background workers."""
+
+    def __init__(self, profiles: List[Dict[str, Any]], size: int = 10, max_serves: int = 5,
+                 refresh_interval: float = 30, workers: int = 2):
+        """
+        Args:
+            profiles: Preference profiles to keep recipes for
+            size: Responses kept per profile
+            max_serves: Times a response is served before it is retired
+            refresh_interval: Seconds between checks for catalog changes and empty slots
+            workers: Background generation threads
+        """
+        self.profiles = {make_cache_key(profile): profile for profile in profiles}
+        self.size = size
+        self.max_serves = max_serves
+        self.refresh_interval = refresh_interval
+        self.workers = workers
+        self._entries: Dict[str, List[PoolEntry]] = {key: [] for key in self.profiles}
+        self._pending = set()
+        self._queue: "queue.Queue[str]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._generate: Optional[PoolGenerator] = None
+        self._get_snapshot: Optional[Callable[[], Any]] = None
+        self._last_snapshot = None
+        self._thread_pid = None
+        self._stop = threading.Event()
+        self.counts = {"hits": 0, "misses": 0, "generated": 0, "failed": 0, "invalidated": 0, "retired": 0}
+
+    def profile_key(self, preferences: Dict[str, Any]) -> Optional[str]:
+        """Key of the profile the preferences match exactly (after canonicalization), if any."""
+        key = make_cache_key(preferences)
+        return key if key in self.profiles else None
+
+    def take(self, preferences: Dict[str, Any], snapshot) -> Optional[List[Dict[str, Any]]]:
+        """
+        Serve recipes for preferences matching a profile
+
+        A random current entry is served. Entries built from outdated catalog items
+        are dropped, entries served `max_serves` times are retired, and a background
+        generation is queued to replace them.
+
+        Returns:
+            list: A copy of the pooled recipes, or None if the preferences match no profile
+            or the profile has no current recipes yet
+        """
+        key = self.profile_key(preferences)
+        if key is None or snapshot is None:
+            return None
+        with self._lock:
+            entries = self._entries[key]
+            current = [entry for entry in entries if is_current(entry.fingerprint, snapshot)]
+            self._count("invalidated", len(entries) - len(current))
+            entry = random.choice(current) if current else None
+            if entry is not None:
+                entry.serves += 1
+                if entry.serves >= self.max_serves:
+                    current.remove(entry)
+                    self._count("retired")
+            self._entries[key] = current
+            self._count("hits" if entry is not None else "misses")
+        self._request_fill(key)
+        return copy.deepcopy(entry.recipes) if entry is not None else None
+
+    def start(self, generate: PoolGenerator, get_snapshot: Callable[[], Any]):
+        """Start the background workers in this process, if not already running."""
+        if self._thread_pid == os.getpid() or not self.profiles:
+            return
+        with self._lock:
+            if self._thread_pid == os.getpid():
+                return
+            self._generate = generate
+            self._get_snapshot = get_snapshot
+            # Threads and queued work do not survive fork(), so start over in each new process
+            self._stop = threading.Event()
+            self._queue = queue.Queue()
+            self._pending = set()
+            self._thread_pid = os.getpid()
+            threading.Thread(target=self._maintain_loop, name="recipe-pool", daemon=True).start()
+            for index in range(self.workers):
+                threading.Thread(target=self._worker_loop, name=f"recipe-pool-{index}", daemon=True).start()
+
+    def stop(self):
+        """Stop the background workers."""
+        self._stop.set()
+
+    def invalidate(self, snapshot):
+        """Drop every entry that references an item that was removed or changed price in `snapshot`."""
+        with self._lock:
+            for key, entries in self._entries.items():
+                current = [entry for entry in entries if is_current(entry.fingerprint, snapshot)]
+                self._count("invalidated", len(entries) - len(current))
+                self._entries[key] = current
+
+    def stats(self) -> Dict[str, Any]:
+        """Get pool counters and the number of pooled responses."""
+        with self._lock:
+            stats = dict(self.counts)
+            stats["profiles"] = len(self.profiles)
+            stats["entries"] = sum(len(entries) for entries in self._entries.values())
+        return stats
+
+    def _count(self, name: str, amount: int = 1):
+        self.counts[name] += amount
+
+    def _request_fill(self, key: str):
+        with self._lock:
+            if self._thread_pid != os.getpid() or key in self._pending or len(self._entries[key]) >= self.size:
+                return
+            self._pending.add(key)
+        self._queue.put(key)
+
+    def _maintain_loop(self):
+        stop = self._stop
+        while not stop.is_set():
+            try:
+                snapshot = self._get_snapshot()
+                if snapshot is not None:
+                    # Any reload may carry price changes, even under the same version string
+                    if snapshot is not self._last_snapshot:
+                        self.invalidate(snapshot)
+                        self._last_snapshot = snapshot
+                    for key in self.profiles:
+                        self._request_fill(key)
+            except Exception as e:
+                logger.warning("Recipe pool maintenance failed: %s", e)
+            stop.wait(self.refresh_interval)
+
+    def _worker_loop(self):
+        stop, work = self._stop, self._queue
+        while not stop.is_set():
+            try:
+                key = work.get(timeout=1)
+            except queue.Empty:
+                continue
+            added = False
+            try:
+                snapshot = self._get_snapshot()
+                if snapshot is not None:
+                    recipes = self._generate(copy.deepcopy(self.profiles[key]), snapshot)
+                    fingerprint = recipe_fingerprint(recipes, snapshot)
+                    with self._lock:
+                        if fingerprint is not None and len(self._entries[key]) < self.size:
+                            self._entries[key].append(PoolEntry(copy.deepcopy(recipes), fingerprint))
+                            self._count("generated")
+                            added = True
+            except Exception as e:
+                with self._lock:
+                    self._count("failed")
+                logger.warning("Recipe pool generation failed: %s", e)
+            finally:
+                with self._lock:
+                    self._pending.discard(key)
+            # Keep going until the profile is full; failures wait for the next maintenance pass
+            if added:
+                self._request_fill(key)
+
+
+def load_profiles(value: str) -> List[Dict[str, Any]]:
+    """Read preference profiles from a JSON array, given inline or as a path to a JSON file."""
+    if not value.lstrip().startswith("["):
+        with open(value) as f:
+            value = f.read()
+    profiles = json.loads(value)
+    if not isinstance(profiles, list) or not all(isinstance(profile, dict) for profile in profiles):
+        raise ValueError("RECIPE_POOL_PROFILES must be a JSON array of preference objects")
+    return [canonicalize_preferences(profile) for profile in profiles]
+
+def get_recipe_pool() -> Optional[RecipePool]:
+    """Factory function to build the recipe pool from environment settings.
+
+    Returns None unless RECIPE_POOL_PROFILES lists at least one profile.
+    """
+    value = os.getenv("RECIPE_POOL_PROFILES", "").strip()
+    if not value:
+        return None
+    try:
+        profiles = load_profiles(value)
+    except Exception as e:
+        logger.warning("Recipe pool disabled, could not load RECIPE_POOL_PROFILES: %s", e)
+        return None
+    if not profiles:
+        return None
+    return RecipePool(
+        profiles,
+        size=int(os.getenv("RECIPE_POOL_SIZE", 10)),
+        max_serves=int(os.getenv("RECIPE_POOL_MAX_SERVES", 5)),
+        refresh_interval=float(os.getenv("RECIPE_POOL_REFRESH_INTERVAL", 30)),
+        workers=int(os.getenv("RECIPE_POOL_WORKERS", 2)),
+    )
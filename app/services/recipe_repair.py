@@ -0,0 +1,196 @@
+"""
+Recipe Repair
+
+This module fixes partly invalid model output without regenerating the whole
+recipe. Unknown ingredient _ids are first matched back to the catalog by
+item name locally. Anything still invalid is sent to the model in a small,
+targeted repair request that only asks for the broken top-level fields.
+"""
+
+import os
+import json
+import time
+import threading
+from typing import List, Dict, Any, Callable, Tuple
+
+from app.services.recipe_schema import RECIPE_SCHEMA, INGREDIENT_LISTS, validate_recipe, validate_recipes
+from app.services.metrics import registry, stats_collector
+
+# Model repair requests per recipe before giving up on it
+REPAIR_ATTEMPTS = int(os.getenv("RECIPE_REPAIR_ATTEMPTS", 1))
+
+# Catalog candidates offered for each ingredient with an unknown _id
+REPAIR_CANDIDATES = 5
+
+# call_model(prompt, response_schema) -> (response_text, (prompt_tokens, output_tokens))
+RepairModel = Callable[[str, Dict[str, Any]], Tuple[str, Tuple[int, int]]]
+
+
+class RepairStats:
+    """Counters for first-pass validity and the cost of repairs."""
+
+    FIELDS = (
+        "responses", "first_pass_valid", "recipes_invalid", "repaired_locally", "repaired_by_model",
+        "repaired_by_dropping", "unrepaired", "repair_calls", "repair_prompt_tokens", "repair_output_tokens", "repair_seconds",
+    )
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {field: 0 for field in self.FIELDS}
+
+    def add(self, **counts):
+        with self._lock:
+            for field, value in counts.items():
+                self._counts[field] += value
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._counts)
+        stats["first_pass_valid_rate"] = stats["first_pass_valid"] / stats["responses"] if stats["responses"] else 0.0
+        return stats
+
+repair_stats = RepairStats()
+registry.register_collector(
+    "recipe_repair", stats_collector("recipe_repair", "Recipe validation and repair", repair_stats.snapshot, RepairStats.FIELDS)
+)
+
+
+def _ingredient_entries(recipe: Dict[str, Any]):
+    ingredients = recipe.get("ingredients")
+    if not isinstance(ingredients, dict):
+        return
+    for list_name in INGREDIENT_LISTS:
+        entries = ingredients.get(list_name)
+        if isinstance(entries, list):
+            for entry in entries:
+                if isinstance(entry, dict):
+                    yield entry
+
+def fix_ids_locally(recipe: Dict[str, Any], snapshot) -> int:
+    """Replace unknown _ids with the best catalog match for the entry's item_name. Returns the number fixed."""
+    fixed = 0
+    for entry in _ingredient_entries(recipe):
+        if entry.get("_id") in snapshot.id_index or not isinstance(entry.get("item_name"), str):
+            continue
+        matches = snapshot.search(entry["item_name"], limit=1)
+        if matches:
+            entry["_id"] = matches[0]["_id"]
+            fixed += 1
+    return fixed
+
+def build_repair_prompt(recipe: Dict[str, Any], problems: List[Dict[str, str]], snapshot=None) -> str:
+    """Build a repair request that only asks for the top-level fields with problems."""
+    fields = sorted({problem["field"] for problem in problems})
+    prompt = "The following recipe JSON has problems.\n"
+    prompt += f"Return a JSON object containing ONLY these corrected top-level fields: {', '.join(fields)}.\n"
+    prompt += "Keep the rest of the recipe as it is.\n\nProblems:\n"
+    prompt += "\n".join(f"- {problem['path']}: {problem['error']}" for problem in problems)
+    prompt += "\n\nRecipe:\n" + json.dumps(recipe, separators=(",", ":"))
+
+    if snapshot is not None and "ingredients" in fields:
+        candidates = {}
+        for entry in _ingredient_entries(recipe):
+            if entry.get("_id") not in snapshot.id_index and isinstance(entry.get("item_name"), str):
+                for item in snapshot.search(entry["item_name"], limit=REPAIR_CANDIDATES):
+                    candidates[item["_id"]] = item
+        if candidates:
+            prompt += "\n\nReplace unknown _id values with one of these catalog items (_id|item_name|packet_weight_grams|price):\n"
+            prompt += "\n".join(
+                f"{item['_id']}|{item['item_name']}|{item['packet_weight_grams']}|{item['price']}"
+                for item in candidates.values()
+            )
+        prompt += "\nRemove any ingredient that has no matching catalog item. DO NOT make up _id values."
+    return prompt
+
+def repair_recipe(recipe: Dict[str, Any], problems: List[Dict[str, str]], snapshot, call_model: RepairModel) -> List[Dict[str, str]]:
+    """Send one targeted repair request and merge the corrected fields. Returns the remaining problems."""
+    fields = sorted({problem["field"] for problem in problems if problem["field"]})
+    schema = {
+        "type": "OBJECT",
+        "properties": {field: RECIPE_SCHEMA["properties"][field] for field in fields},
+        "required": fields,
+    }
+    start = time.perf_counter()
+    text, (prompt_tokens, output_tokens) = call_model(build_repair_prompt(recipe, problems, snapshot), schema)
+    repair_stats.add(
+        repair_calls=1,
+        repair_prompt_tokens=prompt_tokens,
+        repair_output_tokens=output_tokens,
+        repair_seconds=time.perf_counter() - start,
+    )
+    try:
+        patch = json.loads(text)
+    except (TypeError, json.JSONDecodeError):
+        return problems
+    if isinstance(patch, dict):
+        recipe.update({field: patch[field] for field in fields if field in patch})
+    return validate_recipe(recipe, snapshot)
+
+def drop_unknown_ingredients(recipe: Dict[str, Any], snapshot) -> None:
+    """Remove ingredient entries whose _id is not in the catalog."""
+    ingredients = recipe.get("ingredients")
+    for list_name in INGREDIENT_LISTS:
+        entries = ingredients.get(list_name)
+        if isinstance(entries, list):
+            ingredients[list_name] = [
+                entry for entry in entries
+                if (entry.get("_id") if isinstance(entry, dict) else entry) in snapshot.id_index
+            ]
+
+def validate_and_repair(recipes: Any, snapshot, call_model: RepairModel, attempts: int = None) -> List[Dict[str, Any]]:
+    """
+    Validate parsed recipes and repair the invalid ones
+
+    Args:
+        recipes (list): Parsed recipes with real MongoDB _ids
+        snapshot (CatalogSnapshot): Snapshot the prompt was built from, or None to skip _id checks
+        call_model (callable): Sends a repair prompt with a response schema to the model
+        attempts (int): Model repair requests per recipe (defaults to RECIPE_REPAIR_ATTEMPTS)
+
+    Returns:
+        list: Valid recipes; recipes that could not be repaired are left out
+
+    Raises:
+        ValueError: If the response is not a list of recipes or no recipe could be repaired
+    """
+    attempts = REPAIR_ATTEMPTS if attempts is None else attempts
+    problems = validate_recipes(recipes, snapshot)
+    repair_stats.add(responses=1, first_pass_valid=0 if problems else 1, recipes_invalid=len(problems))
+    if not problems:
+        return recipes
+
+    unrepaired = set()
+    for index, recipe_problems in problems.items():
+        recipe = recipes[index]
+        if snapshot is not None and isinstance(recipe, dict) and fix_ids_locally(recipe, snapshot):
+            recipe_problems = validate_recipe(recipe, snapshot)
+            if not recipe_problems:
+                repair_stats.add(repaired_locally=1)
+                continue
+
+        for _ in range(attempts):
+            if not isinstance(recipe, dict) or not recipe_problems:
+                break
+            recipe_problems = repair_recipe(recipe, recipe_problems, snapshot, call_model)
+            if not recipe_problems:
+                repair_stats.add(repaired_by_model=1)
+        if not recipe_problems:
+            continue
+
+        # As a last resort keep the recipe without the ingredients that are not in the catalog
+        if isinstance(recipe, dict) and snapshot is not None:
+            if all(problem["error"].startswith("unknown _id") for problem in recipe_problems):
+                drop_unknown_ingredients(recipe, snapshot)
+                recipe_problems = validate_recipe(recipe, snapshot)
+                if not recipe_problems:
+                    repair_stats.add(repaired_by_dropping=1)
+                    continue
+
+        unrepaired.add(index)
+        repair_stats.add(unrepaired=1)
+
+    valid_recipes = [recipe for index, recipe in enumerate(recipes) if index not in unrepaired]
+    if not valid_recipes:
+        details = "; ".join(f"{problem['path']}: {problem['error']}" for problem in validate_recipe(recipes[0], snapshot))
+        raise ValueError(f"Gemini response failed validation and could not be repaired: {details}")
+    return valid_recipes
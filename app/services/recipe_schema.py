@@ -0,0 +1,133 @@
+"""
+Recipe Schema
+
+This module defines the recipe response schema passed to Gemini's JSON
+response mode, and validates parsed recipes locally against it and against
+the catalog snapshot the prompt was built from.
+"""
+
+from typing import List, Dict, Any, Optional
+
+INGREDIENT_ITEM_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "_id": {"type": "STRING"},
+        "item_name": {"type": "STRING"},
+        "packet_weight_grams": {"type": "NUMBER"},
+        "price": {"type": "NUMBER"},
+        "quantity": {"type": "INTEGER"},
+    },
+    "required": ["_id", "item_name", "packet_weight_grams", "price", "quantity"],
+}
+
+RECIPE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "title": {"type": "STRING"},
+        "summary": {"type": "STRING"},
+        "ingredients": {
+            "type": "OBJECT",
+            "properties": {
+                "necessary_items": {"type": "ARRAY", "items": INGREDIENT_ITEM_SCHEMA},
+                "optional_items": {"type": "ARRAY", "items": INGREDIENT_ITEM_SCHEMA},
+            },
+            "required": ["necessary_items", "optional_items"],
+        },
+        "procedure": {"type": "STRING"},
+        "youtube": {"type": "STRING", "nullable": True},
+        "servings": {"type": "INTEGER", "nullable": True},
+    },
+    "required": ["title", "summary", "ingredients", "procedure"],
+    "propertyOrdering": ["title", "summary", "ingredients", "procedure", "youtube", "servings"],
+}
+
+# Response schema for generation requests: a JSON array of recipes
+RECIPE_RESPONSE_SCHEMA = {"type": "ARRAY", "items": RECIPE_SCHEMA}
+
+REQUIRED_TEXT_FIELDS = ("title", "summary", "procedure")
+INGREDIENT_LISTS = ("necessary_items", "optional_items")
+
+
+def validate_recipe(recipe: Any, snapshot=None) -> List[Dict[str, str]]:
+    """
+    Validate one recipe against the schema and, when given, the catalog snapshot
+
+    Args:
+        recipe (dict): Parsed recipe with real MongoDB _ids
+        snapshot (CatalogSnapshot): Snapshot used to check that every _id exists
+
+    Returns:
+        list: Problems found, each with the top-level `field` to repair, a `path` and an `error`
+    """
+    if not isinstance(recipe, dict):
+        return [{"field": "", "path": "", "error": "recipe is not an object"}]
+
+    problems = []
+    for field in REQUIRED_TEXT_FIELDS:
+        value = recipe.get(field)
+        if not isinstance(value, str) or not value.strip():
+            problems.append({"field": field, "path": field, "error": "missing or empty"})
+
+    youtube = recipe.get("youtube")
+    if youtube is not None and not isinstance(youtube, str):
+        problems.append({"field": "youtube", "path": "youtube", "error": "must be a string or null"})
+
+    ingredients = recipe.get("ingredients")
+    if not isinstance(ingredients, dict):
+        problems.append({"field": "ingredients", "path": "ingredients", "error": "missing or not an object"})
+        return problems
+
+    for list_name in INGREDIENT_LISTS:
+        entries = ingredients.get(list_name, [] if list_name == "optional_items" else None)
+        path = f"ingredients.{list_name}"
+        if not isinstance(entries, list):
+            problems.append({"field": "ingredients", "path": path, "error": "missing or not a list"})
+            continue
+        if list_name == "necessary_items" and not entries:
+            problems.append({"field": "ingredients", "path": path, "error": "must not be empty"})
+        for index, entry in enumerate(entries):
+            problems.extend(_validate_ingredient(entry, f"{path}[{index}]", snapshot))
+
+    return problems
+
+def _validate_ingredient(entry: Any, path: str, snapshot=None) -> List[Dict[str, str]]:
+    if isinstance(entry, str):
+        entry = {"_id": entry}
+    if not isinstance(entry, dict):
+        return [{"field": "ingredients", "path": path, "error": "not an object"}]
+
+    problems = []
+    mongodb_id = entry.get("_id")
+    if not isinstance(mongodb_id, str) or not mongodb_id:
+        problems.append({"field": "ingredients", "path": f"{path}._id", "error": "missing _id"})
+    elif snapshot is not None and mongodb_id not in snapshot.id_index:
+        problems.append({"field": "ingredients", "path": f"{path}._id", "error": f"unknown _id {mongodb_id!r}"})
+
+    quantity = entry.get("quantity")
+    if quantity is not None and (isinstance(quantity, bool) or not isinstance(quantity, (int, float)) or quantity <= 0):
+        problems.append({"field": "ingredients", "path": f"{path}.quantity", "error": "must be a positive number"})
+
+    return problems
+
+def validate_recipes(recipes: Any, snapshot=None) -> Dict[int, List[Dict[str, str]]]:
+    """
+    Validate a parsed response
+
+    Args:
+        recipes (list): Parsed recipes
+        snapshot (CatalogSnapshot): Snapshot used to check that every _id exists
+
+    Returns:
+        dict: Problems per recipe index, only for recipes that have any
+
+    Raises:
+        ValueError: If the response is not a non-empty list
+    """
+    if not isinstance(recipes, list) or not recipes:
+        raise ValueError("Gemini response is not a non-empty list of recipes")
+    problems = {}
+    for index, recipe in enumerate(recipes):
+        recipe_problems = validate_recipe(recipe, snapshot)
+        if recipe_problems:
+            problems[index] = recipe_problems
+    return problems
@@ -0,0 +1,112 @@
+"""
+Single Flight
+
+This module coalesces identical concurrent work: while a call for a key is in
+flight, later callers with the same key wait for it and share its result
+instead of starting their own. `SingleFlight` coordinates threads (Flask
+workers, the batch pool) and `AsyncSingleFlight` coroutines on one event loop.
+Waiters receive deep copies, so no caller can modify another caller's result.
+"""
+
+import copy
+import asyncio
+import threading
+from typing import Dict, Any, Callable, Awaitable
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Share one in-flight call per key across threads."""
+
+    def __init__(self):
+        self._calls: Dict[str, _Call] = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.shared = 0
+
+    def do(self, key: str, func: Callable[[], Any]) -> Any:
+        """Run `func`, or wait for the call already running for `key` and return its result.
+
+        Raises:
+            Exception: Whatever the shared call raised
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+            else:
+                call.waiters += 1
+                self.shared += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result)
+
+        try:
+            result = func()
+        except BaseException as e:
+            call.error = e
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+            raise
+        with self._lock:
+            del self._calls[key]
+            shared = call.waiters > 0
+        call.result = result
+        call.done.set()
+        # Waiters copy the result after it is published, so the leader must not hand out the original
+        return copy.deepcopy(result) if shared else result
+
+    def stats(self) -> Dict[str, Any]:
+        """Get the number of calls that ran and the number that shared one."""
+        return {"leaders": self.leaders, "shared": self.shared, "in_flight": len(self._calls)}
+
+
+class AsyncSingleFlight:
+    """Share one in-flight coroutine per key on an event loop.
+
+    The shared work runs as its own task, so a caller that is cancelled (e.g. on
+    client disconnect) does not cancel it for the others.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, list] = {}
+        self.leaders = 0
+        self.shared = 0
+
+    async def do(self, key: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        """Await `func()`, or the call already running for `key`, and return its result."""
+        entry = self._calls.get(key)
+        if entry is None:
+            task = asyncio.ensure_future(func())
+            entry = self._calls[key] = [task, 0]
+            self.leaders += 1
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            entry[1] += 1
+            self.shared += 1
+        result = await asyncio.shield(entry[0])
+        return copy.deepcopy(result) if entry[1] else result
+
+    def _finish(self, key: str, task: asyncio.Future):
+        if key in self._calls and self._calls[key][0] is task:
+            del self._calls[key]
+        # Mark the exception as retrieved in case every caller was cancelled
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        """Get the number of calls that ran and the number that shared one."""
+        return {"leaders": self.leaders, "shared": self.shared, "in_flight": len(self._calls)}
@@ -0,0 +1,134 @@
+"""
+Streaming Response Parser
+
+This module parses the Gemini response incrementally while it is being
+generated, so that each top-level recipe field (title, summary, ingredients,
+procedure, ...) can be sent to the client as soon as it is complete.
+"""
+
+import json
+from typing import List, Dict, Any, Optional
+
+
+class IncrementalRecipeParser:
+    """Incremental parser for a JSON array of recipe objects (or a single recipe object).
+
+    Text outside the outermost JSON value, such as markdown code fences, is ignored.
+    Text of recipes already emitted is discarded, so the buffer only holds the recipe
+    being generated.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._recipe_depth: Optional[int] = None
+        self._recipe_start: Optional[int] = None
+        self._field_start: Optional[int] = None
+        self._recipe_index = -1
+        self.done = False
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """Consume a chunk of model output.
+
+        Returns:
+            list: Events completed by this chunk. `field` events carry one top-level
+            recipe field, `recipe` events carry the whole recipe once it is closed.
+        """
+        self._buffer += chunk
+        events = []
+        buffer = self._buffer
+        while self._pos < len(buffer) and not self.done:
+            char = buffer[self._pos]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+            elif self._recipe_depth is None:
+                # Skip anything before the outermost JSON value (e.g. ```json)
+                if char in "[{":
+                    self._recipe_depth = 2 if char == "[" else 1
+                    self._open(char)
+            elif char == '"':
+                self._in_string = True
+            elif char in "[{":
+                self._open(char)
+            elif char == "," and self._in_recipe_body():
+                events.extend(self._close_field())
+                self._field_start = self._pos + 1
+            elif char in "]}":
+                if char == "}" and self._in_recipe_body():
+                    events.extend(self._close_field())
+                    events.append(self._close_recipe())
+                self._depth -= 1
+                if self._depth == 0:
+                    self.done = True
+            self._pos += 1
+        self._discard_consumed()
+        return events
+
+    @property
+    def recipe_count(self) -> int:
+        """Recipe objects opened so far."""
+        return self._recipe_index + 1
+
+    def close(self):
+        """Check that the whole response was parsed.
+
+        Raises:
+            ValueError: If the response ended before the JSON value was complete
+        """
+        if self._recipe_depth is None:
+            raise ValueError("Failed to parse Gemini response as JSON: no JSON value found")
+        if not self.done:
+            raise ValueError("Failed to parse Gemini response as JSON: response ended early")
+
+    def _discard_consumed(self):
+        # Everything before the open recipe (or before the current position between recipes) has been emitted
+        keep = self._recipe_start if self._recipe_start is not None else self._pos
+        if keep == 0:
+            return
+        self._buffer = self._buffer[keep:]
+        self._pos -= keep
+        if self._recipe_start is not None:
+            self._recipe_start -= keep
+        if self._field_start is not None:
+            self._field_start -= keep
+
+    def _open(self, char: str):
+        self._depth += 1
+        if char == "{" and self._depth == self._recipe_depth:
+            self._recipe_index += 1
+            self._recipe_start = self._pos
+            self._field_start = self._pos + 1
+
+    def _in_recipe_body(self) -> bool:
+        return self._recipe_start is not None and self._depth == self._recipe_depth
+
+    def _close_field(self) -> List[Dict[str, Any]]:
+        segment = self._buffer[self._field_start:self._pos]
+        if not segment.strip():
+            return []
+        try:
+            field = json.loads("{" + segment + "}")
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Failed to parse Gemini response as JSON: {str(e)}")
+        return [
+            {"type": "field", "recipe": self._recipe_index, "field": key, "value": value}
+            for key, value in field.items()
+        ]
+
+    def _close_recipe(self) -> Dict[str, Any]:
+        text = self._buffer[self._recipe_start:self._pos + 1]
+        self._recipe_start = None
+        self._field_start = None
+        try:
+            recipe = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Failed to parse Gemini response as JSON: {str(e)}")
+        return {"type": "recipe", "recipe": self._recipe_index, "value": recipe}
@@ -0,0 +1,8 @@
+from dotenv import load_dotenv
+from app.asgi import create_asgi_app
+
+# Load environment variables
+load_dotenv()
+
+# ASGI entry point, e.g. `uvicorn asgi:app --host 0.0.0.0 --port 5000`
+app = create_asgi_app()
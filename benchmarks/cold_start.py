@@ -0,0 +1,62 @@
+"""
+Cold start benchmark
+
+Measures, in fresh interpreter processes, the time from the start of the
+import of the serverless entry point to its first response, split into
+import time and first-request time.
+
+Usage:
+    python -m benchmarks.cold_start [--runs 5] [--module vercel_app] [--path /api/health] [--warm-up]
+
+With --warm-up, the time `warm_up()` takes to initialize the model client and
+catalog is measured as well. That needs GEMINI_API_KEY and a reachable MongoDB.
+"""
+
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+CHILD_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+module = __import__(sys.argv[1])
+imported = time.perf_counter()
+response = module.app.test_client().get(sys.argv[2])
+responded = time.perf_counter()
+result = {"import_ms": (imported - start) * 1000, "first_response_ms": (responded - imported) * 1000,
+          "total_ms": (responded - start) * 1000, "status": response.status_code}
+if sys.argv[3] == "1":
+    from app.services.gemini_service import warm_up
+    readiness = warm_up()
+    result["warm_up_ms"] = (time.perf_counter() - responded) * 1000
+    result["ready"] = readiness["ready"]
+print(json.dumps(result))
+"""
+
+
+def run_once(module, path, warm_up):
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD_SCRIPT, module, path, "1" if warm_up else "0"],
+        check=True, capture_output=True, text=True,
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--module", default="vercel_app", help="module exposing the Flask `app`")
+    parser.add_argument("--path", default="/api/health", help="path of the first request")
+    parser.add_argument("--warm-up", action="store_true", help="also time warm_up()")
+    args = parser.parse_args()
+
+    results = [run_once(args.module, args.path, args.warm_up) for _ in range(args.runs)]
+    print(f"{args.runs} cold starts of {args.module}, first request GET {args.path} -> {results[0]['status']}")
+    for key in ("import_ms", "first_response_ms", "total_ms", "warm_up_ms"):
+        if key in results[0]:
+            values = [result[key] for result in results]
+            print(f"{key:<18} median {statistics.median(values):8.1f}  min {min(values):8.1f}  max {max(values):8.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,325 @@
+"""
+Benchmark fakes
+
+An in-memory stand-in for the MongoDB catalog collection and a deterministic
+fake Gemini client, so the request path can be measured without Atlas or
+Gemini credentials.
+
+The collection implements only the query shapes `MongoDBService` issues
+(equality, `$in`, `$exists`, `$gte`, `$regex`, `$and`/`$or`, projections and
+single-field sorts) and counts every call as one database round trip.
+`INGREDIENT_SEARCH_MODE=text` is not supported. It also stands in for
+catalog writes: `insert_one`, `update_one` (`$set`) and `delete_one` record
+change events that `watch()` streams, like a MongoDB change stream.
+"""
+
+import re
+import json
+import time
+import zlib
+import random
+import asyncio
+import threading
+from typing import List, Dict, Any, Optional
+
+from bson import ObjectId
+
+from benchmarks.prompt_size import CATEGORIES, BRANDS, PRODUCTS
+
+PACKET_WEIGHTS = [50, 100, 200, 250, 500, 1000]
+
+_COMPACT_REF_RE = re.compile(r"^(i[0-9a-z]+)\|([^|\n]*)\|[^|\n]*\|([^|\n]*)\|([^|\n]*)$", re.MULTILINE)
+_JSON_ID_RE = re.compile(r'"_id": "([0-9a-f]{24})",\s*"item_name": "([^"]*)"')
+
+
+def catalog_documents(count: int, seed: int = 7) -> List[Dict[str, Any]]:
+    """Build `count` deterministic catalog documents shaped like the MongoDB collection."""
+    rng = random.Random(seed)
+    documents = []
+    for index in range(count):
+        product = rng.choice(PRODUCTS)
+        documents.append({
+            "_id": ObjectId(rng.getrandbits(96).to_bytes(12, "big")),
+            "item_id": f"F{index:07d}",
+            # Products keep a stable category, like a real catalog
+            "category": CATEGORIES[zlib.crc32(product.encode("utf-8")) % len(CATEGORIES)],
+            "item_name": f"{rng.choice(BRANDS)} {product}",
+            "packet_weight_grams": rng.choice(PACKET_WEIGHTS),
+            "price": round(rng.uniform(0.49, 14.99), 2),
+        })
+    return documents
+
+
+def _matches(document: Dict[str, Any], query: Dict[str, Any]) -> bool:
+    for key, condition in query.items():
+        if key == "$or":
+            if not any(_matches(document, clause) for clause in condition):
+                return False
+        elif key == "$and":
+            if not all(_matches(document, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = document.get(key)
+            if "$in" in condition and value not in condition["$in"]:
+                return False
+            if "$exists" in condition and (key in document) != condition["$exists"]:
+                return False
+            if "$gte" in condition and (value is None or value < condition["$gte"]):
+                return False
+            if "$regex" in condition:
+                flags = re.IGNORECASE if "i" in condition.get("$options", "") else 0
+                # An array matches if any of its elements does
+                values = value if isinstance(value, list) else [value]
+                if not any(isinstance(item, str) and re.search(condition["$regex"], item, flags) for item in values):
+                    return False
+        elif document.get(key) != condition:
+            return False
+    return True
+
+def _project(document: Dict[str, Any], projection: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    if not projection:
+        return dict(document)
+    return {key: document[key] for key, include in projection.items() if include == 1 and key in document}
+
+
+class InMemoryCollection:
+    """Minimal in-memory catalog collection that counts round trips."""
+
+    def __init__(self, documents: List[Dict[str, Any]]):
+        self.documents = documents
+        self.by_id = {document["_id"]: document for document in documents}
+        self.round_trips = 0
+        self.events: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def _trip(self):
+        with self._lock:
+            self.round_trips += 1
+
+    def _scan(self, query: Dict[str, Any]) -> List[Dict[str, Any]]:
+        # _id lookups use the primary key index, like MongoDB
+        if set(query) == {"_id"} and isinstance(query["_id"], dict) and set(query["_id"]) == {"$in"}:
+            return [self.by_id[key] for key in query["_id"]["$in"] if key in self.by_id]
+        if set(query) == {"_id"} and not isinstance(query["_id"], dict):
+            document = self.by_id.get(query["_id"])
+            return [document] if document is not None else []
+        if not query:
+            return self.documents
+        return [document for document in self.documents if _matches(document, query)]
+
+    def find(self, query: Dict[str, Any] = None, projection: Dict[str, Any] = None, batch_size: int = 0):
+        self._trip()
+        if query and "$text" in query:
+            raise NotImplementedError("The in-memory catalog does not support $text queries")
+        # A generator, so documents are built one at a time like a cursor's batches
+        return (_project(document, projection) for document in self._scan(query or {}))
+
+    def find_one(self, query: Dict[str, Any] = None, projection: Dict[str, Any] = None, sort=None):
+        self._trip()
+        documents = self._scan(query or {})
+        if not documents:
+            return None
+        if sort:
+            field, direction = sort[0]
+            pick = max if direction < 0 else min
+            documents = [pick(documents, key=lambda document: document.get(field))]
+        return _project(documents[0], projection)
+
+    def estimated_document_count(self) -> int:
+        self._trip()
+        return len(self.documents)
+
+    def distinct(self, field: str) -> List[Any]:
+        self._trip()
+        return sorted({document.get(field) for document in self.documents})
+
+    def create_index(self, *args, **kwargs):
+        self._trip()
+
+    def insert_one(self, document: Dict[str, Any]):
+        self._trip()
+        document = dict(document)
+        document.setdefault("_id", ObjectId())
+        with self._lock:
+            self.documents.append(document)
+            self.by_id[document["_id"]] = document
+            self._record("insert", document)
+        return document["_id"]
+
+    def update_one(self, query: Dict[str, Any], update: Dict[str, Any]):
+        self._trip()
+        documents = self._scan(query)
+        if documents:
+            with self._lock:
+                documents[0].update(update.get("$set", {}))
+                self._record("update", documents[0])
+        return len(documents[:1])
+
+    def delete_one(self, query: Dict[str, Any]):
+        self._trip()
+        documents = self._scan(query)
+        if documents:
+            with self._lock:
+                self.documents.remove(documents[0])
+                del self.by_id[documents[0]["_id"]]
+                self._record("delete", documents[0])
+        return len(documents[:1])
+
+    def _record(self, operation: str, document: Dict[str, Any]):
+        # Called with the lock held
+        event = {"_id": {"_data": str(len(self.events))}, "operationType": operation, "documentKey": {"_id": document["_id"]}}
+        if operation != "delete":
+            event["fullDocument"] = dict(document)
+        self.events.append(event)
+
+    def watch(self, full_document: Optional[str] = None, resume_after: Optional[Dict[str, Any]] = None):
+        position = int(resume_after["_data"]) + 1 if resume_after else len(self.events)
+        return InMemoryChangeStream(self, position)
+
+
+class InMemoryChangeStream:
+    """Change stream over the events an `InMemoryCollection` recorded after it was opened."""
+
+    def __init__(self, collection: InMemoryCollection, position: int):
+        self.collection = collection
+        self.position = position
+        self.resume_token = None
+
+    def try_next(self) -> Optional[Dict[str, Any]]:
+        if self.position >= len(self.collection.events):
+            return None
+        event = self.collection.events[self.position]
+        self.position += 1
+        self.resume_token = event["_id"]
+        return event
+
+    def close(self):
+        pass
+
+
+class _InMemoryAdmin:
+    def command(self, name: str):
+        return {"ok": 1.0}
+
+class _InMemoryDatabase:
+    def __init__(self, collection: InMemoryCollection):
+        self.collection = collection
+
+    def __getitem__(self, name: str) -> InMemoryCollection:
+        return self.collection
+
+class InMemoryClient:
+    """Stands in for `MongoClient`: any database and collection name resolves to the one collection."""
+
+    def __init__(self, collection: InMemoryCollection):
+        self.collection = collection
+        self.admin = _InMemoryAdmin()
+
+    def __getitem__(self, name: str) -> _InMemoryDatabase:
+        return _InMemoryDatabase(self.collection)
+
+    def close(self):
+        pass
+
+
+class _Usage:
+    def __init__(self, prompt_tokens: int, output_tokens: int):
+        self.prompt_token_count = prompt_tokens
+        self.candidates_token_count = output_tokens
+
+class FakeResponse:
+    def __init__(self, text: str, prompt: str = ""):
+        self.text = text
+        self.usage_metadata = _Usage(len(prompt) // 4, len(text) // 4)
+
+
+_COUNT_RE = re.compile(r"Generate (\d+) unique recipe")
+_PART_RE = re.compile(r"This is part (\d+) of")
+
+
+def fake_recipe_response(prompt: str, ingredients: int = 5) -> str:
+    """Build deterministic, schema-conforming recipes (as many as the prompt asks for) from its catalog block."""
+    count_match = _COUNT_RE.search(prompt)
+    part_match = _PART_RE.search(prompt)
+    count = int(count_match.group(1)) if count_match else 1
+    part = int(part_match.group(1)) if part_match else 1
+    refs = _COMPACT_REF_RE.findall(prompt)
+    if refs:
+        entries = [(ref, name, float(weight), float(price)) for ref, name, weight, price in refs]
+    else:
+        entries = [(mongodb_id, name, 100.0, 1.0) for mongodb_id, name in _JSON_ID_RE.findall(prompt)]
+    rng = random.Random(zlib.crc32(prompt.encode("utf-8")))
+
+    def entry(item):
+        ref, name, weight, price = item
+        return {"_id": ref, "item_name": name, "packet_weight_grams": weight, "price": price, "quantity": rng.randint(1, 3)}
+
+    recipes = []
+    for index in range(count):
+        chosen = rng.sample(entries, min(ingredients, len(entries)))
+        split = max(1, len(chosen) - 2)
+        recipes.append({
+            "title": "Benchmark Skillet" if count == 1 and part == 1 else f"Benchmark Skillet {part}.{index + 1}",
+            "summary": "A quick one-pan dish built from the catalog items in the prompt.",
+            "ingredients": {
+                "necessary_items": [entry(item) for item in chosen[:split]],
+                "optional_items": [entry(item) for item in chosen[split:]],
+            },
+            "procedure": " ".join(f"{step}. Add the {item[1]} and stir for a few minutes." for step, item in enumerate(chosen, 1)),
+            "youtube": None,
+        })
+    return json.dumps(recipes)
+
+
+class FakeModels:
+    """Deterministic stand-in for `client.models` with configurable latency."""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, seed: int = 7):
+        self.latency = latency
+        self.jitter = jitter
+        self.calls = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def delay(self) -> float:
+        with self._lock:
+            self.calls += 1
+            return max(0.0, self.latency + self._rng.uniform(-self.jitter, self.jitter))
+
+    def respond(self, contents: str, config=None) -> FakeResponse:
+        schema = getattr(config, "response_schema", None)
+        if isinstance(schema, dict) and schema.get("type") == "OBJECT":
+            # Targeted repair request: nothing to fix in fake output
+            return FakeResponse("{}", contents)
+        return FakeResponse(fake_recipe_response(contents), contents)
+
+    def generate_content(self, model: str, contents: str, config=None) -> FakeResponse:
+        time.sleep(self.delay())
+        return self.respond(contents, config)
+
+    def generate_content_stream(self, model: str, contents: str, config=None):
+        delay = self.delay()
+        response = self.respond(contents, config)
+        chunks = [response.text[i:i + 64] for i in range(0, len(response.text), 64)]
+        for chunk in chunks:
+            time.sleep(delay / len(chunks))
+            yield FakeResponse(chunk, contents)
+
+class FakeAsyncModels:
+    def __init__(self, models: FakeModels):
+        self._models = models
+
+    async def generate_content(self, model: str, contents: str, config=None) -> FakeResponse:
+        await asyncio.sleep(self._models.delay())
+        return self._models.respond(contents, config)
+
+class _FakeAio:
+    def __init__(self, models: FakeModels):
+        self.models = FakeAsyncModels(models)
+
+class FakeGeminiClient:
+    """Stands in for `genai.Client`, answering every prompt with a valid recipe from its catalog block."""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, seed: int = 7):
+        self.models = FakeModels(latency, jitter, seed)
+        self.aio = _FakeAio(self.models)
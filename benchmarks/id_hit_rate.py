@@ -0,0 +1,131 @@
+"""
+Catalog ID hit rate benchmark
+
+Sends the same preference sets to the model with the catalog block in the
+"compact" and the "json" encoding, and reports for each encoding the share of
+returned ingredients that name an item of their own prompt, by a ref or _id
+that maps to it and an item_name that agrees with it, before any local or
+model repair. Everything else has to be matched by name or repaired.
+
+Usage:
+    python -m benchmarks.id_hit_rate [--items 10000] [--requests 20]
+    python -m benchmarks.id_hit_rate --offline [--hallucinate 0.3]
+
+The default run calls the Gemini API and needs GEMINI_API_KEY. With --offline
+the deterministic fake client answers instead, and a share of its ingredients
+is replaced by made-up refs (`ice`, `id`, `i1k9`, refs past the end of the
+block) and by refs of other prompt items under the original name. None of
+those may be accepted, so the offline run checks ref resolution rather than
+the model.
+"""
+
+import os
+
+os.environ.setdefault("RECIPE_CACHE_ENABLED", "false")
+os.environ.setdefault("CATALOG_VERSION_CHECK_INTERVAL", "0")
+
+import re
+import sys
+import json
+import random
+import argparse
+
+from app.services import catalog_integration, gemini_service
+from app.services.catalog_integration import names_match, prompt_item_names
+from app.services.mongodb_service import MongoDBService, set_mongodb_service
+from benchmarks.fakes import InMemoryCollection, InMemoryClient, FakeGeminiClient, catalog_documents
+from benchmarks.request_path import preference_sets
+
+ENCODINGS = ("compact", "json")
+MADE_UP_REFS = ["ice", "id", "i1k9", "i0", "i999", "item"]
+
+_JSON_ID_RE = re.compile(r'"_id": "([0-9a-f]{24})"')
+
+
+def hallucinate(response_text, refs, rate, rng):
+    """Replace a share of the entries' refs with made-up ones or with refs of other prompt items."""
+    recipes = json.loads(response_text)
+    wrong = 0
+    for recipe in recipes:
+        for entries in recipe["ingredients"].values():
+            for entry in entries:
+                if rng.random() >= rate:
+                    continue
+                if rng.random() < 0.5:
+                    entry["_id"] = rng.choice(MADE_UP_REFS)
+                else:
+                    # Another item's ref under the original name, as an off-by-one line would give
+                    others = [ref for ref in refs if ref != entry["_id"]]
+                    entry["_id"] = rng.choice(others) if others else "ice"
+                wrong += 1
+    return json.dumps(recipes), wrong
+
+def measure(encoding, preferences, snapshot, offline, rate, seed):
+    catalog_integration.CATALOG_PROMPT_ENCODING = encoding
+    rng = random.Random(seed)
+    totals = {"recipes": 0, "ingredients": 0, "hits": 0, "injected": 0, "accepted": 0}
+    for item in preferences:
+        prompt, refs = gemini_service.create_prompt(item, snapshot)
+        prompt_ids = set(refs.values()) if refs else set(_JSON_ID_RE.findall(prompt))
+        names = prompt_item_names({mongodb_id: mongodb_id for mongodb_id in prompt_ids}, snapshot)
+        response_text = gemini_service.call_model(prompt + gemini_service.recipe_count_instruction(1)).text
+        injected = None
+        if offline and rate > 0:
+            original = json.loads(response_text)
+            response_text, wrong = hallucinate(response_text, refs, rate, rng)
+            totals["injected"] += wrong
+            injected = [entry for recipe in json.loads(response_text) for entries in recipe["ingredients"].values()
+                        for entry in entries]
+            expected = [entry["_id"] for recipe in original for entries in recipe["ingredients"].values()
+                        for entry in entries]
+        recipes = gemini_service.clean_recipe_response(gemini_service.parse_gemini_response(response_text))
+        recipes = gemini_service.resolve_recipe_aliases(recipes, refs, snapshot)
+        entries = [entry for recipe in recipes if isinstance(recipe.get("ingredients"), dict)
+                   for entries in recipe["ingredients"].values() if isinstance(entries, list) for entry in entries]
+        totals["recipes"] += len(recipes)
+        for index, entry in enumerate(entries):
+            mongodb_id = entry.get("_id") if isinstance(entry, dict) else entry
+            row = snapshot.id_index.get(mongodb_id)
+            hit = mongodb_id in prompt_ids and names_match(entry.get("item_name") if isinstance(entry, dict) else None,
+                                                           mongodb_id, names)
+            totals["ingredients"] += 1
+            totals["hits"] += hit
+            # An injected ref was wrongly accepted if it resolved to an item named unlike the original one
+            # (catalogs list the same product in several packet sizes, which names cannot tell apart)
+            if injected is not None and injected[index]["_id"] != expected[index] and row is not None:
+                original = snapshot.get(refs.get(expected[index], expected[index]))
+                totals["accepted"] += original is None or original["item_name"] != snapshot.names[row]
+    return totals
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=10000, help="synthetic catalog items")
+    parser.add_argument("--requests", type=int, default=20, help="preference sets sent in each encoding")
+    parser.add_argument("--offline", action="store_true", help="use the fake client instead of the Gemini API")
+    parser.add_argument("--hallucinate", type=float, default=0.3, help="share of entries made wrong in --offline runs")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    set_mongodb_service(MongoDBService(client=InMemoryClient(InMemoryCollection(catalog_documents(args.items, args.seed)))))
+    if args.offline:
+        gemini_service.set_client(FakeGeminiClient(seed=args.seed))
+    catalog_service = gemini_service.get_catalog_service()
+    if catalog_service is None:
+        sys.exit(f"Catalog failed to load: {gemini_service.get_readiness()['catalog'].get('error')}")
+    snapshot = catalog_service.snapshots.get()
+    preferences = preference_sets(args.requests, args.seed)
+
+    results = {encoding: measure(encoding, preferences, snapshot, args.offline, args.hallucinate, args.seed)
+               for encoding in ENCODINGS}
+    print(f"{'encoding':<10}{'recipes':>9}{'items':>8}{'hit rate':>10}" + (f"{'injected':>10}{'accepted':>10}" if args.offline else ""))
+    for encoding, totals in results.items():
+        rate = totals["hits"] / totals["ingredients"] if totals["ingredients"] else 0.0
+        line = f"{encoding:<10}{totals['recipes']:>9}{totals['ingredients']:>8}{rate:>10.1%}"
+        if args.offline:
+            line += f"{totals['injected']:>10}{totals['accepted']:>10}"
+        print(line)
+    if args.offline and results["compact"]["accepted"]:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+"""
+Load test app
+
+WSGI module served by Gunicorn in benchmarks/load_test.py: the real app, with
+an in-memory catalog of synthetic items and the deterministic fake Gemini
+client installed at import, i.e. in the master process when preloading.
+
+Settings (environment):
+    LOAD_TEST_ITEMS     synthetic catalog items (default 10000)
+    LOAD_TEST_LATENCY   fake model latency in seconds (default 0)
+"""
+
+import os
+
+# Each request is generated fresh, and the fake model has no quota to protect
+os.environ.setdefault("RECIPE_CACHE_ENABLED", "false")
+os.environ.setdefault("CATALOG_VERSION_CHECK_INTERVAL", "0")
+os.environ["MODEL_RATE_LIMIT_RPM"] = os.environ["MODEL_RATE_LIMIT_RPM_TOTAL"] = "1000000000"
+os.environ["MODEL_RATE_BURST"] = os.environ["MODEL_RATE_BURST_TOTAL"] = "1000000"
+
+from app import create_app
+from app.services import gemini_service
+from app.services.mongodb_service import MongoDBService, set_mongodb_service
+from benchmarks.fakes import InMemoryCollection, InMemoryClient, FakeGeminiClient, catalog_documents
+
+service = MongoDBService(client=InMemoryClient(InMemoryCollection(catalog_documents(int(os.getenv("LOAD_TEST_ITEMS", 10000))))))
+set_mongodb_service(service)
+gemini_service.set_client(FakeGeminiClient(float(os.getenv("LOAD_TEST_LATENCY", 0))))
+
+# Forked workers drop the parent's MongoDB service; the in-memory one is safe to keep
+os.register_at_fork(after_in_child=lambda: set_mongodb_service(service))
+
+app = create_app()
@@ -0,0 +1,178 @@
+"""
+Load test
+
+Starts Gunicorn with gunicorn.conf.py and benchmarks/load_app.py (the real app
+with an in-memory catalog and a fake Gemini client) once for each worker
+count, drives POST /api/recipes?fresh=true from several client processes and
+reports throughput, latency percentiles and the memory of the server
+processes. Throughput should grow with the worker count up to the number of
+cores, since each worker runs the CPU-bound part of a request (ranking,
+prompt assembly, parsing) on its own core. PSS counts pages shared by several
+processes once, split between them, so the shared catalog shows up as a
+total that grows much more slowly than the number of workers.
+
+Usage:
+    python -m benchmarks.load_test [--workers 1,2,4] [--threads 8] [--requests 2000]
+        [--clients 4] [--concurrency 16] [--items 10000] [--latency 0.0] [--json results.json]
+
+Linux only (memory is read from /proc). Run it on a machine with at least as many
+cores as the largest worker count plus the client processes.
+"""
+
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+import http.client
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+import numpy as np
+
+from benchmarks.request_path import preference_sets
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def wait_until_ready(port, timeout=120):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+            connection.request("GET", "/api/ready")
+            if connection.getresponse().status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Server on port {port} did not become ready within {timeout}s")
+
+def drive(port, bodies, concurrency):
+    """Send every body with `concurrency` threads, each on its own keep-alive connection. Returns latencies in ms."""
+    def worker(chunk):
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=60)
+        latencies = []
+        for body in chunk:
+            start = time.perf_counter()
+            connection.request("POST", "/api/recipes?fresh=true", body=body, headers={"Content-Type": "application/json"})
+            response = connection.getresponse()
+            response.read()
+            if response.status != 200:
+                raise RuntimeError(f"HTTP {response.status}")
+            latencies.append((time.perf_counter() - start) * 1000)
+        return latencies
+
+    chunks = [bodies[index::concurrency] for index in range(concurrency)]
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return [latency for latencies in executor.map(worker, chunks) for latency in latencies]
+
+def server_pids(master_pid):
+    """The master and its worker processes."""
+    pids = [master_pid]
+    for name in os.listdir("/proc"):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{name}/stat") as f:
+                # The parent pid follows the command name, which may contain spaces
+                parent = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if parent == master_pid:
+            pids.append(int(name))
+    return pids
+
+def memory_kb(pid):
+    """PSS and USS (private pages) of a process in kB."""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) >= 2 and parts[1].isdigit():
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    return fields.get("Pss", 0), fields.get("Private_Clean", 0) + fields.get("Private_Dirty", 0)
+
+def run(workers, args, bodies, port):
+    env = dict(
+        os.environ,
+        PYTHONPATH=ROOT,
+        PORT=str(port),
+        WEB_CONCURRENCY=str(workers),
+        GUNICORN_THREADS=str(args.threads),
+        LOAD_TEST_ITEMS=str(args.items),
+        LOAD_TEST_LATENCY=str(args.latency),
+        LOG_LEVEL="WARNING",
+        GUNICORN_CMD_ARGS="--log-level warning",
+    )
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", os.path.join(ROOT, "gunicorn.conf.py"), "benchmarks.load_app:app"],
+        cwd=ROOT, env=env,
+    )
+    try:
+        wait_until_ready(port)
+        # Warm every worker's lazily built state (model client, refresher) before timing
+        drive(port, bodies[:workers * args.concurrency], args.concurrency)
+
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=args.clients) as executor:
+            parts = executor.map(drive, [port] * args.clients, [bodies[index::args.clients] for index in range(args.clients)],
+                                 [args.concurrency] * args.clients)
+            latencies = [latency for part in parts for latency in part]
+        elapsed = time.perf_counter() - start
+
+        memory = [memory_kb(pid) for pid in server_pids(server.pid)]
+        p50, p95, p99 = np.percentile(np.asarray(latencies), [50, 95, 99])
+        return {
+            "workers": workers,
+            "requests": len(latencies),
+            "throughput_rps": len(latencies) / elapsed,
+            "p50_ms": float(p50),
+            "p95_ms": float(p95),
+            "p99_ms": float(p99),
+            "total_pss_mb": sum(pss for pss, _ in memory) / 1024,
+            "worker_uss_mb": max(uss for _, uss in memory[1:]) / 1024 if len(memory) > 1 else 0.0,
+        }
+    finally:
+        server.send_signal(signal.SIGTERM)
+        try:
+            server.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            server.kill()
+
+def print_results(results):
+    base = results[0]["throughput_rps"]
+    print(f"{'workers':>8}{'req/s':>10}{'speedup':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'PSS MB':>9}{'USS/worker MB':>15}")
+    for result in results:
+        print(f"{result['workers']:>8}{result['throughput_rps']:>10.1f}{result['throughput_rps'] / base:>9.2f}"
+              f"{result['p50_ms']:>9.1f}{result['p95_ms']:>9.1f}{result['p99_ms']:>9.1f}"
+              f"{result['total_pss_mb']:>9.1f}{result['worker_uss_mb']:>15.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default=",".join(str(n) for n in sorted({1, 2, 4, os.cpu_count() or 1})),
+                        help="comma-separated Gunicorn worker counts")
+    parser.add_argument("--threads", type=int, default=8, help="threads per worker")
+    parser.add_argument("--requests", type=int, default=2000, help="timed requests per worker count")
+    parser.add_argument("--clients", type=int, default=4, help="client processes")
+    parser.add_argument("--concurrency", type=int, default=16, help="connections per client process")
+    parser.add_argument("--items", type=int, default=10000, help="synthetic catalog items")
+    parser.add_argument("--latency", type=float, default=0.0, help="fake model latency in seconds")
+    parser.add_argument("--port", type=int, default=5077)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    bodies = [json.dumps(preferences) for preferences in preference_sets(args.requests)]
+    results = []
+    for workers in [int(value) for value in args.workers.split(",")]:
+        results.append(run(workers, args, bodies, args.port))
+        print(f"{workers} workers: {results[-1]['throughput_rps']:.1f} req/s", file=sys.stderr)
+    print_results(results)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
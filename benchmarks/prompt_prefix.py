@@ -0,0 +1,95 @@
+"""
+Prompt prefix benchmark
+
+Builds the recipe prompts for a set of preference sets and reports how long a
+prefix they share, which is what Gemini's implicit prompt caching can serve at
+a discount: the prefix shared by every prompt (the instructions and catalog
+rules), and the prefix shared by two prompts for the same preferences (the
+parts of a split request, or a request repeated with ?fresh=true), next to the
+model's minimum cacheable prompt size.
+
+Usage:
+    python -m benchmarks.prompt_prefix [--items 10000] [--requests 20]
+    python -m benchmarks.prompt_prefix --live [--requests 5]
+
+Offline, tokens are estimated as in benchmarks/prompt_size.py. With --live
+the prompts are counted with the Gemini API, each one is sent twice, and the
+`cached_content_token_count` of the second response is reported; the exit
+status is 1 if no response reported any cached tokens. --live needs
+GEMINI_API_KEY.
+"""
+
+import os
+
+os.environ.setdefault("RECIPE_CACHE_ENABLED", "false")
+os.environ.setdefault("CATALOG_VERSION_CHECK_INTERVAL", "0")
+
+import sys
+import time
+import argparse
+
+from app.services import gemini_service
+from app.services.mongodb_service import MongoDBService, set_mongodb_service
+from benchmarks.fakes import InMemoryCollection, InMemoryClient, catalog_documents
+from benchmarks.prompt_size import estimate_tokens
+from benchmarks.request_path import preference_sets
+
+# Smallest prompt Gemini 2.5 Flash caches implicitly, in tokens
+IMPLICIT_CACHE_MIN_TOKENS = 1024
+
+
+def common_prefix(texts):
+    prefix = os.path.commonprefix(texts)
+    # Cut back to the last line break, since a cached prefix ends on a token boundary anyway
+    return prefix[:prefix.rfind("\n") + 1]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=10000, help="synthetic catalog items")
+    parser.add_argument("--requests", type=int, default=20, help="preference sets")
+    parser.add_argument("--live", action="store_true", help="count tokens and send the prompts with the Gemini API")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    set_mongodb_service(MongoDBService(client=InMemoryClient(InMemoryCollection(catalog_documents(args.items, args.seed)))))
+    catalog_service = gemini_service.get_catalog_service()
+    if catalog_service is None:
+        sys.exit(f"Catalog failed to load: {gemini_service.get_readiness()['catalog'].get('error')}")
+    snapshot = catalog_service.snapshots.get()
+
+    count_tokens = estimate_tokens
+    if args.live:
+        client = gemini_service.get_client()
+        count_tokens = lambda text: client.models.count_tokens(model=gemini_service.MODEL_NAME, contents=text).total_tokens
+
+    prompts = [gemini_service.create_prompt(preferences, snapshot)[0] for preferences in preference_sets(args.requests, args.seed)]
+    sizes = gemini_service.split_count(2 * gemini_service.RECIPES_PER_CALL)
+    parts = [prompts[0] + gemini_service.recipe_count_instruction(size, part, len(sizes)) for part, size in enumerate(sizes, 1)]
+    rows = [
+        ("full prompt (mean)", sum(count_tokens(prompt) for prompt in prompts) / len(prompts)),
+        ("shared by every prompt", count_tokens(common_prefix(prompts))),
+        ("shared by the parts of one request", count_tokens(common_prefix(parts))),
+        ("minimum for implicit caching", IMPLICIT_CACHE_MIN_TOKENS),
+    ]
+    print(f"{'prefix':<38}{'tokens':>10}")
+    for name, tokens in rows:
+        print(f"{name:<38}{tokens:>10.0f}")
+
+    if not args.live:
+        return
+    cached = []
+    for prompt in prompts:
+        prompt += gemini_service.recipe_count_instruction(1)
+        gemini_service.call_model(prompt)
+        # Implicit caching needs the first request to be processed before the repeat arrives
+        time.sleep(2)
+        usage = gemini_service.call_model(prompt).usage_metadata
+        cached.append((usage.cached_content_token_count or 0, usage.prompt_token_count or 0))
+    hits = sum(1 for tokens, _ in cached if tokens)
+    share = sum(tokens for tokens, _ in cached) / max(1, sum(total for _, total in cached))
+    print(f"repeated prompts with cached tokens: {hits}/{len(cached)}, cached share of prompt tokens: {share:.0%}")
+    if not hits:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
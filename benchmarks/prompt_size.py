@@ -0,0 +1,81 @@
+"""
+Prompt size benchmark
+
+Compares the size of the catalog block written by `enhance_recipe_prompt`
+in the "json" and "compact" encodings, for a synthetic catalog.
+
+Usage:
+    python -m benchmarks.prompt_size [--items 100] [--count-tokens]
+
+Token counts are estimated offline (words, digits and punctuation each count
+as one token, which matches how Gemini splits ids and prices closely enough
+for a comparison). Pass --count-tokens to ask the Gemini API instead, which
+needs GEMINI_API_KEY.
+"""
+
+import re
+import random
+import argparse
+from bson import ObjectId
+
+from app.services.catalog_snapshot import CatalogSnapshot
+from app.services.catalog_integration import format_catalog_json, format_catalog_compact
+
+CATEGORIES = ["Vegetables", "Fruits", "Dairy", "Grains", "Herbs", "Spices", "Meat", "Seafood", "Snacks", "Bakery"]
+BRANDS = ["Organic Valley", "Garden Fresh", "Earth's Bounty", "Grain Masters", "Spice World", "Snack Attack"]
+PRODUCTS = ["Apple", "Tomato", "Bell Pepper", "Zucchini", "Pasta", "Basmati Rice", "Mozzarella", "Basil",
+            "Cumin", "Chicken Breast", "Salmon Fillet", "Pine Nuts", "Garlic", "Onion", "Yogurt", "Oregano"]
+
+_TOKEN_RE = re.compile(r"[A-Za-z]+|\d|[^\sA-Za-z\d]")
+
+
+def synthetic_catalog(count, seed=7):
+    """Build catalog documents shaped like the MongoDB collection."""
+    rng = random.Random(seed)
+    items = []
+    for index in range(count):
+        items.append({
+            "_id": str(ObjectId()),
+            "item_id": f"F{index:04d}",
+            "category": rng.choice(CATEGORIES),
+            "item_name": f"{rng.choice(BRANDS)} {rng.choice(PRODUCTS)}",
+            "packet_weight_grams": rng.choice([100, 250, 500]),
+            "price": round(rng.uniform(0.49, 14.99), 2),
+        })
+    return items
+
+def estimate_tokens(text):
+    """Rough offline token estimate."""
+    return len(_TOKEN_RE.findall(text))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=100, help="number of catalog items in the prompt")
+    parser.add_argument("--count-tokens", action="store_true", help="count tokens with the Gemini API")
+    args = parser.parse_args()
+
+    items = synthetic_catalog(args.items)
+    snapshot = CatalogSnapshot(items, version="benchmark")
+    ingredients = snapshot.items(range(len(snapshot)))
+    blocks = {
+        "json": format_catalog_json(ingredients),
+        "compact": format_catalog_compact(ingredients),
+    }
+
+    counter = estimate_tokens
+    if args.count_tokens:
+        from google import genai
+        from app.services.gemini_service import MODEL_NAME
+        client = genai.Client()
+        counter = lambda text: client.models.count_tokens(model=MODEL_NAME, contents=text).total_tokens
+
+    results = {name: (len(text), counter(text)) for name, text in blocks.items()}
+    print(f"{'encoding':<10}{'chars':>10}{'tokens':>10}")
+    for name, (chars, tokens) in results.items():
+        print(f"{name:<10}{chars:>10}{tokens:>10}")
+    json_tokens = results["json"][1]
+    compact_tokens = results["compact"][1]
+    print(f"compact/json token ratio: {compact_tokens / json_tokens:.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Ranking relevance benchmark
+
+Compares the catalog items `IngredientRanker.top_k` selects for the prompt
+with the previous selection, which matched cuisine and diet values as text
+and capped repeats by full item name, on the synthetic catalog and varied
+preference sets of benchmarks/request_path.py. For each selection it reports:
+
+    conflicts   share of items the requested diet rules out (sets with a diet)
+    cuisine     share of items that are typical ingredients of the cuisine
+    included    share of ingredients_to_include with at least one selected item
+    allowed     the same, counting only ingredients the diet leaves some item of
+    products    distinct base products per prompt
+    ms          time per selection
+
+Usage:
+    python -m benchmarks.ranking_relevance [--items 10000] [--requests 200] [--k 60]
+"""
+
+import time
+import argparse
+
+import numpy as np
+
+from app.services.catalog_snapshot import CatalogSnapshot
+from app.services.ingredient_ranker import (
+    PREFERENCE_WEIGHTS, DEFAULT_WEIGHT, MAX_ITEMS_PER_NAME, PREFERENCE_KEYWORDS,
+    preference_values, rank_within_groups,
+)
+from app.services.ingredient_search import normalize_tokens
+from benchmarks.fakes import catalog_documents
+from benchmarks.request_path import preference_sets
+
+
+def previous_top_k(ranker, preferences, k, category_codes):
+    """The selection before cuisines and diets were mapped: every value matched as text."""
+    terms = []
+    for key, value in preferences.items():
+        weight = PREFERENCE_WEIGHTS.get(str(key).lower(), DEFAULT_WEIGHT)
+        for item in value if isinstance(value, (list, tuple)) else [value]:
+            if isinstance(item, str) and item.strip():
+                terms.append((item, weight))
+    scores = ranker.score_terms(terms)
+    matched = np.flatnonzero(scores > 0)
+    matched = matched[np.lexsort((matched, -scores[matched]))]
+    matched = matched[rank_within_groups(ranker.name_codes[matched]) < MAX_ITEMS_PER_NAME][:k]
+    if len(matched) >= k:
+        return matched
+    fill = np.flatnonzero(scores == 0)
+    codes = category_codes[fill]
+    fill = fill[np.lexsort((codes, rank_within_groups(codes)))]
+    return np.concatenate([matched, fill[:k - len(matched)]])
+
+def current_top_k(ranker, preferences, k, category_codes):
+    return ranker.top_k(preferences, k, category_codes)
+
+def measure(select, snapshot, preferences, k):
+    ranker = snapshot.ranker
+    totals = {"conflicts": [], "cuisine": [], "included": [], "allowed": [], "products": [], "ms": []}
+    for item in preferences:
+        start = time.perf_counter()
+        rows = np.asarray(select(ranker, item, k, snapshot.category_codes), dtype=np.int64)
+        totals["ms"].append((time.perf_counter() - start) * 1000)
+        names = [set(normalize_tokens(snapshot.names[row])) for row in rows.tolist()]
+
+        if preference_values(item, ("diet", "dietary")):
+            totals["conflicts"].append(float(ranker.excluded(item)[rows].mean()))
+        keywords = {token for cuisine in preference_values(item, ("cuisine",))
+                    for keyword in PREFERENCE_KEYWORDS.get(cuisine, []) for token in normalize_tokens(keyword)}
+        if keywords:
+            totals["cuisine"].append(sum(bool(tokens & keywords) for tokens in names) / len(names))
+        excluded = ranker.excluded(item)
+        for term in item.get("ingredients_to_include") or []:
+            wanted = set(normalize_tokens(term))
+            found = float(any(wanted <= tokens for tokens in names))
+            totals["included"].append(found)
+            if any(wanted <= set(tokens) and not excluded[ranker.name_codes == code].all()
+                   for code, tokens in enumerate(ranker.name_tokens)):
+                totals["allowed"].append(found)
+        totals["products"].append(len(set(ranker.base_codes[rows].tolist())))
+    return {name: float(np.mean(values)) if values else 0.0 for name, values in totals.items()}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=10000, help="synthetic catalog items")
+    parser.add_argument("--requests", type=int, default=200, help="preference sets")
+    parser.add_argument("--k", type=int, default=60, help="items selected per prompt")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    snapshot = CatalogSnapshot(catalog_documents(args.items, args.seed), version="benchmark")
+    preferences = preference_sets(args.requests, args.seed)
+    results = {
+        "previous": measure(previous_top_k, snapshot, preferences, args.k),
+        "current": measure(current_top_k, snapshot, preferences, args.k),
+    }
+    print(f"{'selection':<10}{'conflicts':>11}{'cuisine':>9}{'included':>10}{'allowed':>9}{'products':>10}{'ms':>8}")
+    for name, result in results.items():
+        print(f"{name:<10}{result['conflicts']:>11.1%}{result['cuisine']:>9.1%}{result['included']:>10.1%}"
+              f"{result['allowed']:>9.1%}{result['products']:>10.1f}{result['ms']:>8.2f}")
+
+if __name__ == "__main__":
+    main()
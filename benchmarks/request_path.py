@@ -0,0 +1,257 @@
+"""
+Request path benchmark
+
+Runs the recipe request path offline, against an in-memory catalog of
+synthetic items and a deterministic fake Gemini client (see
+benchmarks/fakes.py). For each scenario it reports throughput,
+p50/p95/p99 latency, MongoDB round trips per request and peak allocated
+memory per request, followed by per-stage timings from the app's metrics spans.
+
+Scenarios:
+    prompt   CatalogIntegrationService.enhance_recipe_prompt
+    parse    process_gemini_response (parse, resolve refs, validate)
+    verify   verify_recipe_ingredients
+    request  POST /api/recipes through the Flask test client
+
+Usage:
+    python -m benchmarks.request_path [--items 10000] [--requests 200] [--concurrency 1]
+        [--latency 0.0] [--scenario all] [--json results.json]
+        [--compare baseline.json] [--max-regression 0.2]
+
+With --compare, p95 latency, round trips and memory are checked against a
+previous --json result and the exit status is 1 if any regressed by more than
+--max-regression.
+"""
+
+import os
+
+# The recipe cache would turn repeated requests into lookups, and the refresher
+# thread would add background catalog queries; both are off while measuring
+os.environ.setdefault("RECIPE_CACHE_ENABLED", "false")
+os.environ.setdefault("CATALOG_VERSION_CHECK_INTERVAL", "0")
+# The fake model has no quota, so the scheduler's rate limit would only measure itself
+os.environ.setdefault("MODEL_RATE_LIMIT_RPM", "1000000")
+os.environ.setdefault("MODEL_RATE_BURST", "1000")
+
+import sys
+import copy
+import json
+import time
+import random
+import argparse
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from app import create_app
+from app.routes import verify_recipe_ingredients
+from app.services import gemini_service
+from app.services.metrics import STAGE_SECONDS
+from app.services.mongodb_service import MongoDBService, set_mongodb_service
+from benchmarks.fakes import InMemoryCollection, InMemoryClient, FakeGeminiClient, catalog_documents, fake_recipe_response
+from benchmarks.prompt_size import PRODUCTS
+
+SCENARIOS = ("prompt", "parse", "verify", "request")
+CUISINES = ["Italian", "Indian", "Mexican", "Thai", "Mediterranean", "Japanese"]
+DIETS = ["vegetarian", "vegan", "high-protein", "low-carb", None]
+
+# Requests traced for allocations; tracemalloc slows everything down, so this is a separate pass
+ALLOCATION_SAMPLES = 25
+
+
+def preference_sets(count, seed=11):
+    """Deterministic, varied preferences so no two requests are alike."""
+    rng = random.Random(seed)
+    preferences = []
+    for _ in range(count):
+        item = {"cuisine": rng.choice(CUISINES), "ingredients_to_include": rng.sample(PRODUCTS, rng.randint(1, 3))}
+        diet = rng.choice(DIETS)
+        if diet:
+            item["diet"] = diet
+        preferences.append(item)
+    return preferences
+
+def percentiles(samples_ms):
+    p50, p95, p99 = np.percentile(np.asarray(samples_ms), [50, 95, 99])
+    return float(p50), float(p95), float(p99)
+
+
+class StageRecorder:
+    """Collects raw stage durations from the app's metrics spans while installed."""
+
+    def __init__(self):
+        self.samples = {}
+        self._observe = None
+
+    def __enter__(self):
+        self._observe = STAGE_SECONDS.observe
+
+        def observe(value, **labels):
+            self.samples.setdefault(labels["stage"], []).append(value * 1000)
+            self._observe(value, **labels)
+        STAGE_SECONDS.observe = observe
+        return self
+
+    def __exit__(self, *exc_info):
+        STAGE_SECONDS.observe = self._observe
+
+
+def build_scenarios(snapshot, catalog_service, preferences):
+    """Build one callable per scenario taking the request number."""
+    prompts = [
+        catalog_service.enhance_recipe_prompt(gemini_service.RECIPE_INSTRUCTIONS, item, snapshot)
+        for item in preferences[:50]
+    ]
+    responses = [fake_recipe_response(prompt) for prompt, _ in prompts]
+    recipes = [gemini_service.process_gemini_response(text, item, snapshot, refs=refs)
+               for text, item, (_, refs) in zip(responses, preferences, prompts)]
+    client = create_app().test_client()
+
+    def prompt(i):
+        item = preferences[i % len(preferences)]
+        catalog_service.enhance_recipe_prompt(gemini_service.RECIPE_INSTRUCTIONS, item, snapshot)
+
+    def parse(i):
+        gemini_service.process_gemini_response(responses[i % len(responses)], preferences[i % len(responses)], snapshot,
+                                               refs=prompts[i % len(prompts)][1])
+
+    def verify(i):
+        verify_recipe_ingredients(copy.deepcopy(recipes[i % len(recipes)]))
+
+    def request(i):
+        response = client.post("/api/recipes", json=preferences[i % len(preferences)])
+        if response.status_code != 200:
+            raise RuntimeError(f"POST /api/recipes returned {response.status_code}: {response.get_data(as_text=True)}")
+
+    return {"prompt": prompt, "parse": parse, "verify": verify, "request": request}
+
+def run_scenario(name, func, collection, requests, concurrency):
+    """Time `requests` calls of `func`, then trace allocations for a few more."""
+    for i in range(min(5, requests)):
+        func(i)
+
+    def timed(i):
+        start = time.perf_counter()
+        func(i)
+        return (time.perf_counter() - start) * 1000
+
+    trips_before = collection.round_trips
+    with StageRecorder() as stages:
+        start = time.perf_counter()
+        if concurrency > 1:
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                latencies = list(executor.map(timed, range(requests)))
+        else:
+            latencies = [timed(i) for i in range(requests)]
+        elapsed = time.perf_counter() - start
+    round_trips = (collection.round_trips - trips_before) / requests
+
+    peaks = []
+    tracemalloc.start()
+    try:
+        for i in range(min(ALLOCATION_SAMPLES, requests)):
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+            func(i)
+            peaks.append(tracemalloc.get_traced_memory()[1] - baseline)
+    finally:
+        tracemalloc.stop()
+
+    p50, p95, p99 = percentiles(latencies)
+    return {
+        "requests": requests,
+        "throughput_rps": requests / elapsed,
+        "p50_ms": p50,
+        "p95_ms": p95,
+        "p99_ms": p99,
+        "db_round_trips_per_request": round_trips,
+        "peak_kib_per_request": float(np.mean(peaks)) / 1024 if peaks else 0.0,
+        "stages": {
+            stage: dict(zip(("p50_ms", "p95_ms", "p99_ms"), percentiles(samples)), per_request=len(samples) / requests)
+            for stage, samples in sorted(stages.samples.items())
+        },
+    }
+
+def compare(results, baseline, max_regression):
+    """List the metrics that regressed by more than `max_regression` against a baseline run."""
+    regressions = []
+    for name, result in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            continue
+        for key in ("p95_ms", "db_round_trips_per_request", "peak_kib_per_request"):
+            before, after = previous[key], result[key]
+            if after > before * (1 + max_regression) and after - before > 1e-6:
+                regressions.append(f"{name}.{key}: {before:.3f} -> {after:.3f}")
+    return regressions
+
+def print_results(results):
+    print(f"{results['items']} catalog items, snapshot load {results['snapshot_load_ms']:.0f} ms, "
+          f"model latency {results['model_latency_ms']:.0f} ms, concurrency {results['concurrency']}")
+    print(f"{'scenario':<10}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'db trips':>10}{'peak KiB':>10}")
+    for name, result in results["scenarios"].items():
+        print(f"{name:<10}{result['throughput_rps']:>10.1f}{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}"
+              f"{result['p99_ms']:>10.2f}{result['db_round_trips_per_request']:>10.2f}{result['peak_kib_per_request']:>10.1f}")
+    for name, result in results["scenarios"].items():
+        if not result["stages"]:
+            continue
+        print(f"\nstages of {name}:")
+        print(f"  {'stage':<20}{'per req':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        for stage, timing in result["stages"].items():
+            print(f"  {stage:<20}{timing['per_request']:>8.2f}{timing['p50_ms']:>10.3f}{timing['p95_ms']:>10.3f}{timing['p99_ms']:>10.3f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=10000, help="synthetic catalog items (10k-1M)")
+    parser.add_argument("--requests", type=int, default=200, help="timed requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=1, help="threads issuing requests")
+    parser.add_argument("--latency", type=float, default=0.0, help="fake model latency in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="uniform +/- jitter on the model latency in seconds")
+    parser.add_argument("--scenario", choices=SCENARIOS + ("all",), default="all")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--compare", help="baseline results from an earlier --json run")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="allowed relative regression for --compare")
+    args = parser.parse_args()
+
+    collection = InMemoryCollection(catalog_documents(args.items, args.seed))
+    set_mongodb_service(MongoDBService(client=InMemoryClient(collection)))
+    gemini_service.set_client(FakeGeminiClient(args.latency, args.jitter, args.seed))
+
+    start = time.perf_counter()
+    catalog_service = gemini_service.get_catalog_service()
+    if catalog_service is None:
+        sys.exit(f"Catalog failed to load: {gemini_service.get_readiness()['catalog'].get('error')}")
+    snapshot = catalog_service.snapshots.get()
+    snapshot_load_ms = (time.perf_counter() - start) * 1000
+
+    preferences = preference_sets(max(args.requests, 50), args.seed)
+    scenarios = build_scenarios(snapshot, catalog_service, preferences)
+    names = SCENARIOS if args.scenario == "all" else (args.scenario,)
+    results = {
+        "items": args.items,
+        "snapshot_load_ms": snapshot_load_ms,
+        "model_latency_ms": args.latency * 1000,
+        "concurrency": args.concurrency,
+        "scenarios": {
+            name: run_scenario(name, scenarios[name], collection, args.requests, args.concurrency) for name in names
+        },
+    }
+    print_results(results)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.max_regression)
+        if regressions:
+            print("\nRegressions against " + args.compare + ":")
+            for regression in regressions:
+                print("  " + regression)
+            sys.exit(1)
+        print(f"\nNo regressions over {args.max_regression:.0%} against {args.compare}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Gunicorn configuration for production serving:
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+The app is preloaded in the master process, which loads the catalog snapshot
+and its indexes once before forking the workers. Catalog columns live in
+memory-mapped files under CATALOG_SHARED_DIR, so the workers share those pages
+and any worker that later reloads the same catalog version maps the files
+instead of reading MongoDB. Python objects built before the fork (indexes)
+are shared copy-on-write.
+"""
+
+import gc
+import os
+import tempfile
+import multiprocessing
+
+bind = f"0.0.0.0:{os.getenv('PORT', 5000)}"
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+# Requests mostly wait on the model, so each worker serves several at once
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", 8))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 120))
+graceful_timeout = 30
+keepalive = 5
+preload_app = True
+
+# Memory-backed by default, so mapped catalog pages never touch the disk. A catalog that does
+# not fit (Docker's /dev/shm is 64 MB) is saved to the temporary directory instead, where the
+# workers still share its pages through the page cache.
+os.environ.setdefault(
+    "CATALOG_SHARED_DIR",
+    os.path.join("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir(), "recipe-catalog"),
+)
+os.environ.setdefault("CATALOG_SHARED_FALLBACK_DIR", os.path.join(tempfile.gettempdir(), "recipe-catalog"))
+
+# Every worker runs its own model scheduler, so split the project's quota between them
+# (the totals are kept, so re-reading this file on reload does not split them twice).
+# A quota of 0 (no limit) stays 0, and a positive one stays positive however many workers share it.
+quota = float(os.environ.setdefault("MODEL_RATE_LIMIT_RPM_TOTAL", os.getenv("MODEL_RATE_LIMIT_RPM", "600")))
+burst = float(os.environ.setdefault("MODEL_RATE_BURST_TOTAL", os.getenv("MODEL_RATE_BURST", "10")))
+os.environ["MODEL_RATE_LIMIT_RPM"] = repr(max(quota, 0.0) / max(workers, 1))
+os.environ["MODEL_RATE_BURST"] = repr(max(1.0, burst / max(workers, 1)))
+
+
+def on_starting(server):
+    # Collections in the master would touch the objects the workers share and copy their
+    # pages, so the collector stays off until the workers are forked (see the gc.freeze
+    # documentation). This runs in the master only, not on --check-config.
+    gc.disable()
+
+
+def when_ready(server):
+    # Runs in the master after the app is loaded and before the first worker is forked
+    from app.services.gemini_service import preload
+    readiness = preload()
+    server.log.info("Catalog preloaded: %s", readiness["catalog"])
+
+
+def pre_fork(server, worker):
+    # Frozen objects are never examined by the collector, so the master can collect again
+    # once the last worker of the initial set is about to be forked
+    gc.freeze()
+    if len(server.WORKERS) + 1 >= server.num_workers:
+        gc.enable()
+
+
+def post_fork(server, worker):
+    # MongoDB clients, SQLite connections, change streams and refresh threads
+    # detect the new process and start over on first use
+    gc.enable()
+
+
+def worker_exit(server, worker):
+    from app.services.mongodb_service import close_mongodb_service
+    close_mongodb_service()
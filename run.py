@@ -1,12 +1,16 @@
 import os
 from dotenv import load_dotenv
 from app import create_app
+from app.services.gemini_service import start_warm_up
 
 # Load environment variables
 load_dotenv()
 
 app = create_app()
 
+# Initialize the model client and catalog in the background so the first request does not pay for it
+start_warm_up()
+
 if __name__ == '__main__':
     port = int(os.getenv('PORT', 5000))
     app.run(host='0.0.0.0', port=port)
@@ -0,0 +1,90 @@
+"""
+Shared fixtures
+
+Tests run offline against the in-memory catalog collection and the fake Gemini
+client from benchmarks/fakes.py. Settings that would make results depend on
+timing (the response cache, the catalog refresher, the model rate limit) are
+turned off before the app is imported.
+"""
+
+import os
+import sys
+
+os.environ.setdefault("RECIPE_CACHE_ENABLED", "false")
+os.environ.setdefault("CATALOG_VERSION_CHECK_INTERVAL", "0")
+os.environ.setdefault("MODEL_RATE_LIMIT_RPM", "0")
+os.environ.pop("CATALOG_SHARED_DIR", None)
+os.environ.pop("RECIPE_POOL_PROFILES", None)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import copy
+
+import pytest
+
+from app.services import gemini_service
+from app.services.catalog_snapshot import CatalogSnapshot
+from app.services.mongodb_service import MongoDBService, set_mongodb_service
+from benchmarks.fakes import InMemoryCollection, InMemoryClient, FakeGeminiClient, catalog_documents
+
+CATALOG_ITEMS = 500
+
+# A catalog small enough to reason about row by row
+ITEMS = [
+    {"_id": "a" * 24, "item_id": "F1", "category": "Pasta", "item_name": "Barilla Spaghetti", "packet_weight_grams": 500, "price": 1.99},
+    {"_id": "b" * 24, "item_id": "F2", "category": "Pasta", "item_name": "De Cecco Penne", "packet_weight_grams": 500, "price": 2.49},
+    {"_id": "c" * 24, "item_id": "F3", "category": "Vegetables", "item_name": "Cherry Tomatoes", "packet_weight_grams": 250, "price": 2.99},
+    {"_id": "d" * 24, "item_id": "F4", "category": "Dairy", "item_name": "Parmesan Cheese", "packet_weight_grams": 200, "price": 4.5},
+    {"_id": "e" * 24, "item_id": "F5", "category": "Vegetables", "item_name": "Fresh Basil", "packet_weight_grams": 50, "price": 1.49},
+]
+
+
+def make_recipe(necessary, optional=(), **fields):
+    """A valid recipe over catalog items, as the app holds it after resolving refs."""
+    def entry(item):
+        return dict({key: item[key] for key in ("_id", "item_name", "packet_weight_grams", "price")}, quantity=1)
+    recipe = {
+        "title": "Spaghetti al Pomodoro",
+        "summary": "A quick tomato pasta.",
+        "ingredients": {"necessary_items": [entry(item) for item in necessary], "optional_items": [entry(item) for item in optional]},
+        "procedure": "Boil the pasta and toss it with the tomatoes.",
+        "youtube": None,
+    }
+    recipe.update(fields)
+    return recipe
+
+
+@pytest.fixture
+def items():
+    return copy.deepcopy(ITEMS)
+
+
+@pytest.fixture
+def small_snapshot(items):
+    return CatalogSnapshot(items, "v1")
+
+
+@pytest.fixture(scope="session")
+def documents():
+    return catalog_documents(CATALOG_ITEMS)
+
+
+@pytest.fixture(scope="session")
+def snapshot(documents):
+    """The catalog snapshot the app loads from the in-memory collection."""
+    set_mongodb_service(MongoDBService(client=InMemoryClient(InMemoryCollection(documents))))
+    gemini_service.set_client(FakeGeminiClient())
+    catalog_service = gemini_service.get_catalog_service()
+    assert catalog_service is not None, gemini_service.get_readiness()
+    return catalog_service.snapshots.get()
+
+
+@pytest.fixture
+def fake_model(snapshot):
+    """Install a fresh fake model client for one test; call with a latency, returns its `models`."""
+    def install(latency=0.0):
+        client = FakeGeminiClient(latency)
+        gemini_service.set_client(client)
+        return client.models
+    yield install
+    gemini_service.set_client(FakeGeminiClient())
@@ -0,0 +1,41 @@
+import pytest
+
+from app.services import batch_generation
+from app.services.model_scheduler import ModelOverloadedError
+
+
+@pytest.fixture
+def model_calls(monkeypatch):
+    """Replace generate_recipes with one that raises the queued errors in turn, then succeeds."""
+    errors, calls = [], []
+
+    def generate_recipes(preferences, **kwargs):
+        calls.append(preferences)
+        if errors:
+            raise errors.pop(0)
+        return {"recipes": []}
+
+    monkeypatch.setattr(batch_generation, "generate_recipes", generate_recipes)
+    monkeypatch.setattr(batch_generation, "RETRY_BACKOFF_SECONDS", 0.001)
+    return errors, calls
+
+
+def test_errors_the_scheduler_already_retried_are_not_retried_again(model_calls):
+    errors, calls = model_calls
+    errors.append(ModelOverloadedError("Model unavailable after 3 attempts", retry_after=0.001, attempts=3))
+    with pytest.raises(ModelOverloadedError):
+        batch_generation.generate_batch_item({}, retries=2)
+    assert len(calls) == 1
+
+def test_calls_that_were_not_admitted_and_other_errors_are_retried(model_calls):
+    errors, calls = model_calls
+    errors.extend([ModelOverloadedError("Model queue is full (batch)", retry_after=0.001), ValueError("bad JSON")])
+    assert batch_generation.generate_batch_item({}, retries=2) == {"recipes": []}
+    assert len(calls) == 3
+
+def test_the_last_error_is_raised_when_retries_run_out(model_calls):
+    errors, calls = model_calls
+    errors.extend([ValueError("bad JSON")] * 3)
+    with pytest.raises(ValueError):
+        batch_generation.generate_batch_item({}, retries=1)
+    assert len(calls) == 2
@@ -0,0 +1,76 @@
+import numpy as np
+
+from app.services.catalog_changes import CatalogChange
+from app.services.catalog_columns import CatalogColumns
+from app.services.catalog_snapshot import CatalogSnapshot
+
+from conftest import ITEMS
+
+NEW_ITEM = {"_id": "0" * 24, "item_id": "F6", "category": "Herbs", "item_name": "Dried Oregano", "packet_weight_grams": 20, "price": 0.99}
+
+
+def test_lookups(small_snapshot):
+    assert len(small_snapshot) == len(ITEMS)
+    assert small_snapshot.get(ITEMS[2]["_id"]) == ITEMS[2]
+    assert small_snapshot.get_many([{"_id": ITEMS[1]["_id"]}, "unknown", ITEMS[0]["_id"]]) == [ITEMS[1], ITEMS[0]]
+    assert [item["item_name"] for item in small_snapshot.items_in_category("Vegetables")] == ["Cherry Tomatoes", "Fresh Basil"]
+    assert small_snapshot.search("tomato")[0]["_id"] == ITEMS[2]["_id"]
+    assert [item["_id"] for item in small_snapshot.cheapest_substitutes(ITEMS[1]["_id"])] == [ITEMS[0]["_id"]]
+
+def test_columns_and_documents_build_the_same_snapshot(items, small_snapshot):
+    snapshot = CatalogSnapshot(CatalogColumns.from_documents(items), "v1")
+    assert snapshot.items(range(len(snapshot))) == small_snapshot.items(range(len(small_snapshot)))
+
+def test_a_change_that_alters_nothing_returns_none(small_snapshot):
+    assert small_snapshot.apply_changes(CatalogChange(upserted=[dict(ITEMS[0])])) is None
+    assert small_snapshot.apply_changes(CatalogChange(deleted=["unknown"])) is None
+
+def test_price_updates_share_the_rows_and_name_indexes(small_snapshot):
+    search_index = small_snapshot.search_index
+    change = CatalogChange(upserted=[{"_id": ITEMS[1]["_id"], "price": 0.99}])
+    snapshot = small_snapshot.apply_changes(change)
+
+    assert snapshot.get(ITEMS[1]["_id"])["price"] == 0.99
+    assert small_snapshot.get(ITEMS[1]["_id"])["price"] == 2.49
+    assert snapshot.id_index is small_snapshot.id_index and snapshot.search_index is search_index
+    # The price order changed, so substitutes come from a fresh price index
+    assert [item["_id"] for item in snapshot.cheapest_substitutes(ITEMS[0]["_id"])] == [ITEMS[1]["_id"]]
+    assert (snapshot.sequence, snapshot.version, snapshot.base_version) == (1, "v1+1", "v1")
+    assert change.categories == set()
+
+def test_inserts_deletes_and_renames_rebuild_the_rows(small_snapshot):
+    change = CatalogChange(
+        upserted=[NEW_ITEM, {"_id": ITEMS[4]["_id"], "item_name": "Thai Basil"}],
+        deleted=[ITEMS[0]["_id"]],
+    )
+    snapshot = small_snapshot.apply_changes(change)
+
+    assert snapshot.get(ITEMS[0]["_id"]) is None
+    assert snapshot.get(NEW_ITEM["_id"]) == NEW_ITEM
+    assert snapshot.search("oregano")[0]["_id"] == NEW_ITEM["_id"]
+    assert snapshot.search("thai")[0]["_id"] == ITEMS[4]["_id"]
+    assert "Herbs" in snapshot.categories
+    assert change.categories == {"Herbs", "Vegetables"}
+    assert small_snapshot.get(ITEMS[0]["_id"]) == ITEMS[0]
+    assert snapshot.loaded_at == small_snapshot.loaded_at and snapshot.version == "v1+1"
+
+def test_changes_chain_onto_the_previous_snapshot(small_snapshot):
+    first = small_snapshot.apply_changes(CatalogChange(upserted=[NEW_ITEM]))
+    second = first.apply_changes(CatalogChange(upserted=[{"_id": NEW_ITEM["_id"], "price": 1.29}]))
+    assert second.version == "v1+2" and second.get(NEW_ITEM["_id"])["price"] == 1.29
+    assert np.isclose(first.get(NEW_ITEM["_id"])["price"], 0.99)
+
+def test_change_tags_cover_changed_items_and_categories_that_gained_items(small_snapshot):
+    change = CatalogChange(upserted=[NEW_ITEM], deleted=[ITEMS[0]["_id"]])
+    small_snapshot.apply_changes(change)
+    assert change.tags() == sorted(["category:Herbs", "id:" + NEW_ITEM["_id"], "id:" + ITEMS[0]["_id"]])
+
+def test_derived_snapshots_are_returned_with_their_indexes_built(small_snapshot):
+    structural = small_snapshot.apply_changes(CatalogChange(upserted=[NEW_ITEM]))
+    prices = small_snapshot.apply_changes(CatalogChange(upserted=[{"_id": ITEMS[1]["_id"], "price": 0.99}]))
+    for snapshot in (structural, prices):
+        assert None not in (snapshot._search_index, snapshot._ranker, snapshot._price_index)
+
+def test_item_id_updates_are_stored_as_strings(small_snapshot):
+    snapshot = small_snapshot.apply_changes(CatalogChange(upserted=[{"_id": ITEMS[1]["_id"], "item_id": 2002}]))
+    assert snapshot.get(ITEMS[1]["_id"])["item_id"] == "2002"
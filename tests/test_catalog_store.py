@@ -0,0 +1,116 @@
+import os
+import sys
+import time
+import errno
+import threading
+import subprocess
+
+import pytest
+
+from app.services import catalog_store
+from app.services.catalog_columns import CatalogColumns
+from app.services.catalog_snapshot import CatalogSnapshot
+from app.services.catalog_store import CatalogStore, STAGING_PREFIX
+
+
+@pytest.fixture
+def columns(items):
+    return CatalogColumns.from_documents(items)
+
+def saved_directories(path):
+    return sorted(name for name in os.listdir(path) if not name.startswith(STAGING_PREFIX))
+
+def dead_pid():
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+def test_saved_columns_load_back_memory_mapped(tmp_path, items, columns):
+    store = CatalogStore(str(tmp_path))
+    mapped, saved_at = store.save("v1", columns)
+    loaded, loaded_at = store.load("v1", max_age=60)
+    assert loaded_at == saved_at
+    for result in (mapped, loaded):
+        assert CatalogSnapshot(result, "v1").items(range(len(items))) == CatalogSnapshot(items, "v1").items(range(len(items)))
+
+def test_load_skips_other_versions_and_expired_saves(tmp_path, columns):
+    store = CatalogStore(str(tmp_path))
+    store.save("v1", columns)
+    assert store.load("v2", max_age=60) is None
+    assert store.load("v1", max_age=0) is None
+    assert CatalogStore(str(tmp_path / "empty")).load("v1", max_age=60) is None
+
+def test_only_the_newest_saves_are_kept(tmp_path, columns):
+    store = CatalogStore(str(tmp_path), keep=2)
+    for version in ("v1", "v2", "v3"):
+        store.save(version, columns)
+    assert len(saved_directories(tmp_path)) == 2
+    assert store.load("v1", max_age=60) is None
+    assert store.load("v3", max_age=60) is not None
+
+def test_abandoned_staging_directories_are_removed(tmp_path, columns):
+    abandoned = tmp_path / f"{STAGING_PREFIX}{dead_pid()}-x"
+    stale = tmp_path / f"{STAGING_PREFIX}{os.getpid()}-old"
+    in_progress = tmp_path / f"{STAGING_PREFIX}{os.getpid()}-new"
+    for directory in (abandoned, stale, in_progress):
+        directory.mkdir()
+    old = time.time() - catalog_store.STAGING_MAX_AGE - 10
+    os.utime(stale, (old, old))
+
+    CatalogStore(str(tmp_path)).save("v1", columns)
+    assert not abandoned.exists() and not stale.exists()
+    assert in_progress.exists()
+
+def test_saves_fall_back_when_the_directory_is_full(tmp_path, columns, monkeypatch):
+    primary, fallback = tmp_path / "shm", tmp_path / "disk"
+    store = CatalogStore(str(primary), fallback_path=str(fallback))
+    save_in = store._save_in
+
+    def full(directory, *args):
+        if directory == str(primary):
+            raise OSError(errno.ENOSPC, "No space left on device")
+        return save_in(directory, *args)
+
+    monkeypatch.setattr(store, "_save_in", full)
+    store.save("v1", columns)
+    assert saved_directories(primary) == [] and len(saved_directories(fallback)) == 1
+    assert CatalogStore(str(primary), fallback_path=str(fallback)).load("v1", max_age=60) is not None
+
+def test_other_save_errors_are_raised(tmp_path, columns, monkeypatch):
+    store = CatalogStore(str(tmp_path / "shm"), fallback_path=str(tmp_path / "disk"))
+
+    def broken(*args):
+        raise OSError(errno.EACCES, "Permission denied")
+
+    monkeypatch.setattr(store, "_save_in", broken)
+    with pytest.raises(PermissionError):
+        store.save("v1", columns)
+
+@pytest.mark.skipif(catalog_store.fcntl is None, reason="needs fcntl")
+def test_the_lock_serializes_holders(tmp_path):
+    store = CatalogStore(str(tmp_path))
+    holders, overlaps = [], []
+
+    def hold():
+        with CatalogStore(str(tmp_path)).lock():
+            holders.append(1)
+            overlaps.append(len(holders))
+            time.sleep(0.02)
+            holders.pop()
+
+    threads = [threading.Thread(target=hold) for _ in range(4)]
+    with store.lock():
+        for thread in threads:
+            thread.start()
+        time.sleep(0.05)
+        assert overlaps == []
+    for thread in threads:
+        thread.join(5)
+    assert overlaps == [1, 1, 1, 1]
+
+def test_item_ids_have_the_same_type_in_memory_and_mapped(tmp_path, items):
+    items[0]["item_id"], items[1]["item_id"] = 1001, None
+    in_memory = CatalogColumns.from_documents(items)
+    mapped, _ = CatalogStore(str(tmp_path)).save("v1", in_memory)
+    assert list(in_memory.item_ids) == list(mapped.item_ids) == ["1001", None, "F3", "F4", "F5"]
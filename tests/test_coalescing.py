@@ -0,0 +1,61 @@
+import time
+import threading
+
+from app.services import gemini_service
+from app.services.model_scheduler import BATCH, INTERACTIVE
+
+PREFERENCES = {"cuisine": "Italian", "ingredients_to_include": ["Pasta"]}
+
+
+def wait_for_leaders(count, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while gemini_service.recipe_flights.stats()["leaders"] < count:
+        assert time.monotonic() < deadline, "no generation started"
+        time.sleep(0.01)
+
+
+def test_flight_key_separates_lanes_and_timeouts(snapshot):
+    interactive = gemini_service.flight_key(PREFERENCES, snapshot)
+    assert interactive == gemini_service.flight_key(dict(PREFERENCES), snapshot, lane=INTERACTIVE)
+    assert interactive != gemini_service.flight_key(PREFERENCES, snapshot, lane=BATCH)
+    assert interactive != gemini_service.flight_key(PREFERENCES, snapshot, timeout=60)
+
+
+def test_interactive_request_never_joins_a_batch_leader(snapshot, fake_model):
+    models = fake_model(latency=0.3)
+    leaders = gemini_service.recipe_flights.stats()["leaders"]
+    shared = gemini_service.recipe_flights.stats()["shared"]
+    results = {}
+
+    def batch():
+        results["batch"] = gemini_service.generate_recipes(PREFERENCES, snapshot=snapshot, timeout=60, lane=BATCH)
+
+    thread = threading.Thread(target=batch)
+    thread.start()
+    wait_for_leaders(leaders + 1)
+    results["interactive"] = gemini_service.generate_recipes(PREFERENCES, snapshot=snapshot)
+    thread.join()
+
+    assert models.calls == 2
+    assert gemini_service.recipe_flights.stats()["shared"] == shared
+    assert results["batch"] and results["interactive"]
+
+
+def test_identical_interactive_requests_share_one_generation(snapshot, fake_model):
+    models = fake_model(latency=0.3)
+    leaders = gemini_service.recipe_flights.stats()["leaders"]
+    results = []
+
+    def interactive():
+        results.append(gemini_service.generate_recipes(PREFERENCES, snapshot=snapshot))
+
+    threads = [threading.Thread(target=interactive) for _ in range(3)]
+    threads[0].start()
+    wait_for_leaders(leaders + 1)
+    for thread in threads[1:]:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert models.calls == 1
+    assert len(results) == 3 and results[0] == results[1] == results[2]
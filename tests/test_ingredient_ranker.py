@@ -0,0 +1,24 @@
+import numpy as np
+
+from app.services.ingredient_ranker import IngredientRanker, MAX_ITEMS_PER_NAME
+
+NAMES = ["Tomato"] * (MAX_ITEMS_PER_NAME + 2) + ["Rice", "Flour", "Salt", "Bacon"]
+CATEGORIES = ["Vegetables"] * (MAX_ITEMS_PER_NAME + 2) + ["Grains", "Bakery", "Spices", "Meat"]
+
+
+def top_k(preferences, k):
+    ranker = IngredientRanker(NAMES, CATEGORIES)
+    return ranker.top_k(preferences, k, np.unique(CATEGORIES, return_inverse=True)[1]).tolist()
+
+
+def test_matching_items_past_the_name_cap_come_before_unrelated_items():
+    rows = top_k({"ingredients_to_include": ["Tomato"]}, MAX_ITEMS_PER_NAME + 2)
+    assert rows == list(range(MAX_ITEMS_PER_NAME + 2))
+
+def test_the_name_cap_holds_while_other_items_match():
+    rows = top_k({"ingredients_to_include": ["Tomato", "Rice"]}, MAX_ITEMS_PER_NAME + 1)
+    assert sorted(NAMES[row] for row in rows) == ["Rice"] + ["Tomato"] * MAX_ITEMS_PER_NAME
+
+def test_the_fill_skips_items_the_diet_rules_out():
+    rows = top_k({"ingredients_to_include": ["Tomato"], "diet": "vegetarian"}, len(NAMES))
+    assert NAMES.index("Bacon") not in rows and len(rows) == len(NAMES) - 1
@@ -0,0 +1,176 @@
+import time
+import asyncio
+import threading
+
+import pytest
+
+from app.services.model_scheduler import TokenBucket, ModelScheduler, ModelOverloadedError, is_retryable, INTERACTIVE, BATCH
+
+
+class APIError(Exception):
+    def __init__(self, code, message=""):
+        super().__init__(f"{code} {message}")
+        self.code = code
+
+
+def scheduler(**settings):
+    settings = dict({"rate_per_minute": 0, "retries": 2, "backoff_base": 0.001, "backoff_max": 0.001}, **settings)
+    return ModelScheduler(**settings)
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached"
+        time.sleep(0.005)
+
+
+def test_bucket_grants_the_burst_then_asks_to_wait():
+    bucket = TokenBucket(rate=1, burst=2)
+    assert bucket.take() == 0 and bucket.take() == 0
+    assert 0.9 < bucket.take() <= 1.0
+
+def test_bucket_halves_on_throttling_and_recovers_gradually():
+    bucket = TokenBucket(rate=10, burst=1)
+    bucket.throttled()
+    assert bucket.rate == 5 and bucket.tokens <= 0
+    for _ in range(3):
+        bucket.throttled()
+    assert bucket.rate == 1  # min_rate is a tenth of the rate
+    bucket.succeeded()
+    assert bucket.rate == 1.5
+    for _ in range(100):
+        bucket.succeeded()
+    assert bucket.rate == 10
+
+@pytest.mark.parametrize("rate", [0, -1])
+def test_a_non_positive_rate_means_no_limit(rate):
+    bucket = TokenBucket(rate=rate, burst=0)
+    assert all(bucket.take() == 0 for _ in range(100))
+    bucket.throttled()
+    assert bucket.take() == 0
+    assert scheduler(rate_per_minute=rate).retry_after() == 1.0
+
+def test_a_full_queue_rejects_at_once():
+    model_scheduler = scheduler(max_concurrency=1, max_queue={INTERACTIVE: 1, BATCH: 1})
+    model_scheduler.acquire()
+    waiter = threading.Thread(target=lambda: (model_scheduler.acquire(), model_scheduler.release()))
+    waiter.start()
+    wait_for(lambda: model_scheduler.stats()["queue_depth_interactive"] == 1)
+    with pytest.raises(ModelOverloadedError) as error:
+        model_scheduler.acquire()
+    assert error.value.retry_after >= 1
+    model_scheduler.release()
+    waiter.join(5)
+    assert model_scheduler.counts["rejected"] == 1 and model_scheduler.counts["admitted"] == 2
+
+def test_a_call_waiting_too_long_times_out_and_leaves_the_queue():
+    model_scheduler = scheduler(max_concurrency=1, max_wait={INTERACTIVE: 0.05, BATCH: 0.05})
+    model_scheduler.acquire()
+    with pytest.raises(ModelOverloadedError, match="Timed out"):
+        model_scheduler.acquire()
+    assert model_scheduler.counts["timed_out"] == 1
+    assert model_scheduler.stats()["queue_depth_interactive"] == 0
+    model_scheduler.release()
+    model_scheduler.acquire()
+
+def test_the_rate_limit_delays_admission():
+    model_scheduler = scheduler(rate_per_minute=600, burst=1)
+    start = time.monotonic()
+    for _ in range(3):
+        model_scheduler.acquire()
+        model_scheduler.release()
+    # One token up front, then one every 0.1 s
+    assert time.monotonic() - start >= 0.18
+
+def test_interactive_calls_go_ahead_of_batch_calls():
+    model_scheduler = scheduler(max_concurrency=1)
+    model_scheduler.acquire()
+    order = []
+
+    def call(lane):
+        model_scheduler.acquire(lane)
+        order.append(lane)
+        model_scheduler.release()
+
+    batch = threading.Thread(target=call, args=(BATCH,))
+    batch.start()
+    wait_for(lambda: model_scheduler.stats()["queue_depth_batch"] == 1)
+    interactive = threading.Thread(target=call, args=(INTERACTIVE,))
+    interactive.start()
+    wait_for(lambda: model_scheduler.stats()["queue_depth_interactive"] == 1)
+    model_scheduler.release()
+    batch.join(5)
+    interactive.join(5)
+    assert order == [INTERACTIVE, BATCH]
+
+def test_quota_errors_are_retried_and_slow_the_rate():
+    model_scheduler = scheduler(rate_per_minute=60000, burst=100)
+    attempts = []
+
+    def call():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise APIError(429, "RESOURCE_EXHAUSTED")
+        return "ok"
+
+    assert model_scheduler.call(call) == "ok"
+    assert len(attempts) == 3
+    assert model_scheduler.counts["retried"] == 2 and model_scheduler.counts["throttled"] == 2
+    assert model_scheduler.bucket.rate < 1000
+
+def test_retries_give_up_with_an_overloaded_error():
+    model_scheduler = scheduler()
+
+    def call():
+        raise APIError(503, "UNAVAILABLE")
+
+    with pytest.raises(ModelOverloadedError, match="after 3 attempts") as error:
+        model_scheduler.call(call)
+    assert error.value.attempts == 3
+    assert model_scheduler.counts["failed"] == 1
+    assert model_scheduler.stats()["in_flight"] == 0
+
+def test_other_errors_are_raised_without_retrying():
+    model_scheduler = scheduler()
+    attempts = []
+
+    def call():
+        attempts.append(1)
+        raise ValueError("bad request")
+
+    with pytest.raises(ValueError):
+        model_scheduler.call(call)
+    assert len(attempts) == 1
+
+def test_retryable_errors():
+    assert is_retryable(APIError(429))
+    assert is_retryable(APIError(503))
+    assert not is_retryable(APIError(400))
+    assert is_retryable(Exception("RESOURCE_EXHAUSTED: quota exceeded"))
+    # A 429 inside some other number is not a quota error
+    assert not is_retryable(ValueError("Unknown ingredient id 4290"))
+    assert not is_retryable(APIError(400, "request 1429 is invalid"))
+
+def test_async_calls_are_retried_and_a_cancelled_waiter_leaves_the_queue():
+    model_scheduler = scheduler(max_concurrency=1)
+    attempts = []
+
+    async def call():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise APIError(429)
+        return "ok"
+
+    async def main():
+        assert await model_scheduler.call_async(call) == "ok"
+        model_scheduler.acquire()
+        waiter = asyncio.ensure_future(model_scheduler.acquire_async())
+        await asyncio.sleep(0.02)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        model_scheduler.release()
+
+    asyncio.run(main())
+    assert len(attempts) == 2
+    assert model_scheduler.stats()["queue_depth_interactive"] == 0 and model_scheduler.stats()["in_flight"] == 0
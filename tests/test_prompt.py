@@ -0,0 +1,19 @@
+import os
+
+from app.services import gemini_service
+
+
+def test_prompts_run_from_static_to_request_specific(snapshot):
+    prompt, refs = gemini_service.create_prompt({"cuisine": "Italian", "ingredients_to_include": ["Pasta"]}, snapshot)
+    rules = prompt.index("IMPORTANT INSTRUCTIONS:")
+    catalog = prompt.index("ref|item_name|category|packet_weight_grams|price")
+    preferences = prompt.index("Preferences:")
+    assert prompt.startswith(gemini_service.RECIPE_INSTRUCTIONS)
+    assert rules < catalog < preferences
+    assert refs and all(f"\n{ref}|" in prompt[catalog:preferences] for ref in refs)
+
+def test_prompts_for_different_preferences_share_the_instructions_and_catalog_rules(snapshot):
+    first, _ = gemini_service.create_prompt({"cuisine": "Italian"}, snapshot)
+    second, _ = gemini_service.create_prompt({"cuisine": "Thai", "diet": "vegan"}, snapshot)
+    shared = os.path.commonprefix([first, second])
+    assert "IMPORTANT INSTRUCTIONS:" in shared and "5. If you can't make a good recipe" in shared
@@ -0,0 +1,87 @@
+import time
+
+import pytest
+
+from app.services.recipe_cache import (
+    RecipeCache, MemoryCacheTier, SQLiteCacheTier, canonicalize_preferences, make_cache_key, is_cacheable,
+)
+
+from conftest import ITEMS, make_recipe
+
+PREFERENCES = {"cuisine": "Italian", "ingredients_to_include": ["Pasta", "Tomatoes"]}
+TAGS = ["id:" + ITEMS[0]["_id"], "category:Pasta"]
+
+
+@pytest.fixture(params=["memory", "memory+sqlite"])
+def cache(request, tmp_path):
+    tiers = [MemoryCacheTier(max_size=16, ttl=60)]
+    if request.param == "memory+sqlite":
+        tiers.append(SQLiteCacheTier(str(tmp_path / "cache.db"), ttl=60))
+    return RecipeCache(tiers)
+
+
+def test_equivalent_preferences_share_a_key():
+    assert make_cache_key({"Cuisine": " italian ", "ingredients_to_include": ["tomatoes", "Pasta", "pasta"], "diet": ""}) == \
+        make_cache_key(PREFERENCES)
+    assert make_cache_key(PREFERENCES, count=2) != make_cache_key(PREFERENCES)
+    assert make_cache_key(PREFERENCES, "v2") != make_cache_key(PREFERENCES, "v1")
+
+def test_booleans_and_numbers_stay_distinct():
+    assert canonicalize_preferences([True, 1, 1, False, 0]) == [False, True, 0, 1]
+    assert make_cache_key({"spicy": [True]}) != make_cache_key({"spicy": [1]})
+
+def test_get_returns_a_copy(cache):
+    recipes = [make_recipe(ITEMS[:2])]
+    cache.set(PREFERENCES, "v1", recipes, TAGS)
+    cached = cache.get(PREFERENCES, "v1")
+    assert cached == recipes
+    cached[0]["title"] = "changed"
+    assert cache.get(PREFERENCES, "v1") == recipes
+    assert cache.get(PREFERENCES, "v2") is None
+    assert cache.stats()["hits"] == 2 and cache.stats()["misses"] == 1
+
+def test_invalidate_removes_only_tagged_entries(cache):
+    cache.set(PREFERENCES, "v1", [make_recipe(ITEMS[:2])], TAGS)
+    cache.set({"cuisine": "French"}, "v1", [make_recipe(ITEMS[3:])], ["id:" + ITEMS[3]["_id"], "category:Dairy"])
+    assert cache.invalidate(["category:Pasta"]) == 1
+    assert cache.get(PREFERENCES, "v1") is None
+    assert cache.get({"cuisine": "French"}, "v1") is not None
+
+def test_promoted_entries_keep_their_tags(tmp_path):
+    slow = SQLiteCacheTier(str(tmp_path / "cache.db"), ttl=60)
+    RecipeCache([slow]).set(PREFERENCES, "v1", [make_recipe(ITEMS[:2])], TAGS)
+    cache = RecipeCache([MemoryCacheTier(), slow])
+    assert cache.get(PREFERENCES, "v1") is not None
+    assert cache.invalidate(["id:" + ITEMS[0]["_id"]]) == 1
+    assert cache.get(PREFERENCES, "v1") is None
+
+def test_recipes_from_a_snapshot_older_than_an_invalidation_are_not_stored(cache):
+    cache.invalidate(["category:Pasta"], sequence=5)
+    cache.set(PREFERENCES, "v1", [make_recipe(ITEMS[:2])], TAGS, sequence=4)
+    assert cache.get(PREFERENCES, "v1") is None
+    cache.set(PREFERENCES, "v1", [make_recipe(ITEMS[:2])], TAGS, sequence=5)
+    assert cache.get(PREFERENCES, "v1") is not None
+
+def test_untagged_recipes_are_not_blocked_by_invalidations(cache):
+    cache.invalidate(["category:Pasta"], sequence=5)
+    cache.set(PREFERENCES, "v1", [make_recipe(ITEMS[3:])], ["category:Dairy"], sequence=1)
+    assert cache.get(PREFERENCES, "v1") is not None
+
+def test_memory_tier_evicts_least_recently_used_and_expired():
+    tier = MemoryCacheTier(max_size=2, ttl=60)
+    tier.set("a", 1)
+    tier.set("b", 2)
+    tier.get("a")
+    tier.set("c", 3)
+    assert tier.get("b") is None and tier.get("a") == 1 and tier.get("c") == 3
+
+    tier = MemoryCacheTier(ttl=0.01)
+    tier.set("a", 1, ["tag"])
+    time.sleep(0.02)
+    assert tier.get("a") is None
+
+def test_is_cacheable():
+    assert is_cacheable([make_recipe(ITEMS[:2])])
+    assert not is_cacheable([])
+    assert not is_cacheable([make_recipe([])])
+    assert not is_cacheable([make_recipe(ITEMS[:1], title="")])
@@ -0,0 +1,82 @@
+import json
+
+import pytest
+
+from app.services.recipe_repair import validate_and_repair, repair_recipe, build_repair_prompt
+from app.services.recipe_schema import validate_recipe
+
+from conftest import ITEMS, make_recipe
+
+UNKNOWN_ID = "f" * 24
+
+
+class RepairModel:
+    """Records repair requests and answers each with the next canned response."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def __call__(self, prompt, schema):
+        self.requests.append((prompt, schema))
+        return self.responses.pop(0), (len(prompt) // 4, 10)
+
+
+def test_valid_recipes_are_returned_without_model_calls(small_snapshot):
+    recipes = [make_recipe(ITEMS[:2]), make_recipe(ITEMS[2:4])]
+    model = RepairModel()
+    assert validate_and_repair(recipes, small_snapshot, model) is recipes
+    assert model.requests == []
+
+def test_unknown_id_is_matched_by_item_name_locally(small_snapshot):
+    recipe = make_recipe(ITEMS[:2])
+    recipe["ingredients"]["necessary_items"][1]["_id"] = UNKNOWN_ID
+    model = RepairModel()
+    [repaired] = validate_and_repair([recipe], small_snapshot, model)
+    assert repaired["ingredients"]["necessary_items"][1]["_id"] == ITEMS[1]["_id"]
+    assert model.requests == []
+
+def test_model_repair_asks_only_for_broken_fields(small_snapshot):
+    recipe = make_recipe(ITEMS[:2], title="")
+    model = RepairModel(json.dumps({"title": "Penne Pomodoro", "summary": "ignored"}))
+    [repaired] = validate_and_repair([recipe], small_snapshot, model, attempts=1)
+    prompt, schema = model.requests[0]
+    assert schema["required"] == ["title"] and list(schema["properties"]) == ["title"]
+    assert "title" in prompt
+    assert repaired["title"] == "Penne Pomodoro"
+    # Fields the repair was not asked for are left alone
+    assert repaired["summary"] == "A quick tomato pasta."
+
+def test_unparseable_repair_keeps_the_problems(small_snapshot):
+    recipe = make_recipe(ITEMS[:2], procedure=None)
+    problems = validate_recipe(recipe, small_snapshot)
+    assert repair_recipe(recipe, problems, small_snapshot, RepairModel("not json")) == problems
+
+def test_unknown_ingredients_are_dropped_as_a_last_resort(small_snapshot):
+    recipe = make_recipe(ITEMS[:2])
+    recipe["ingredients"]["necessary_items"].append({"_id": UNKNOWN_ID, "item_name": "Unicorn Steak", "quantity": 1})
+    model = RepairModel("not json")
+    [repaired] = validate_and_repair([recipe], small_snapshot, model, attempts=1)
+    assert [entry["_id"] for entry in repaired["ingredients"]["necessary_items"]] == [ITEMS[0]["_id"], ITEMS[1]["_id"]]
+    assert len(model.requests) == 1
+
+def test_unrepairable_recipes_are_left_out(small_snapshot):
+    good = make_recipe(ITEMS[:2])
+    bad = make_recipe([], title="")
+    assert validate_and_repair([good, bad], small_snapshot, RepairModel("{}"), attempts=1) == [good]
+
+def test_no_repairable_recipe_raises(small_snapshot):
+    with pytest.raises(ValueError, match="could not be repaired"):
+        validate_and_repair([make_recipe([], title="")], small_snapshot, RepairModel("{}"), attempts=1)
+
+@pytest.mark.parametrize("response", [[], {}, None, "recipes"])
+def test_a_response_that_is_not_a_list_of_recipes_raises(small_snapshot, response):
+    with pytest.raises(ValueError, match="not a non-empty list"):
+        validate_and_repair(response, small_snapshot, RepairModel())
+
+def test_repair_prompt_offers_catalog_candidates_for_unknown_ids(small_snapshot):
+    recipe = make_recipe(ITEMS[:1])
+    recipe["ingredients"]["necessary_items"][0].update(_id=UNKNOWN_ID, item_name="Penne")
+    prompt = build_repair_prompt(recipe, validate_recipe(recipe, small_snapshot), small_snapshot)
+    assert f"{ITEMS[1]['_id']}|De Cecco Penne|" in prompt
+    assert "DO NOT make up _id values" in prompt
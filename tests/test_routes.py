@@ -0,0 +1,57 @@
+import json
+import asyncio
+
+import pytest
+
+from app import create_app
+from app.asgi import create_recipes as asgi_create_recipes
+
+PREFERENCES = {"cuisine": "Italian"}
+
+
+@pytest.fixture
+def client(snapshot, fake_model):
+    fake_model()
+    return create_app().test_client()
+
+def asgi_post(body):
+    """POST `body` to the ASGI recipes handler; returns the status and the JSON payload."""
+    messages = [{"type": "http.request", "body": body, "more_body": False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "POST", "path": "/api/recipes", "query_string": b""}
+    asyncio.run(asgi_create_recipes(scope, receive, send))
+    return sent[0]["status"], json.loads(b"".join(message.get("body", b"") for message in sent[1:]))
+
+
+@pytest.mark.parametrize("path", ["/api/recipes", "/api/recipes/stream"])
+@pytest.mark.parametrize("body", [[1, 2], "Italian", 3, []])
+def test_bodies_that_are_not_objects_are_rejected(client, path, body):
+    response = client.post(path, json=body)
+    assert response.status_code == 400
+    assert "JSON object" in response.get_json()["error"]
+
+def test_malformed_json_is_rejected(client):
+    response = client.post("/api/recipes", data="{", content_type="application/json")
+    assert response.status_code == 400
+
+def test_an_object_or_a_missing_body_is_accepted(client):
+    assert client.post("/api/recipes", json=PREFERENCES).status_code == 200
+    assert client.post("/api/recipes").status_code == 200
+
+@pytest.mark.parametrize("body", [b"[1, 2]", b"{", b"null"])
+def test_the_asgi_handler_rejects_bodies_that_are_not_objects(snapshot, fake_model, body):
+    fake_model()
+    status, payload = asgi_post(body)
+    assert status == 400 and "JSON object" in payload["error"]
+
+def test_the_asgi_handler_accepts_an_object_or_an_empty_body(snapshot, fake_model):
+    fake_model()
+    assert asgi_post(json.dumps(PREFERENCES).encode())[0] == 200
+    assert asgi_post(b"")[0] == 200
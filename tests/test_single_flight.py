@@ -0,0 +1,99 @@
+import time
+import asyncio
+import threading
+
+import pytest
+
+from app.services.single_flight import SingleFlight, AsyncSingleFlight
+
+
+def run_together(flight, key, func, callers):
+    """Start `callers` threads on the same key once the first one is inside `func`."""
+    started = threading.Event()
+    release = threading.Event()
+    results, errors = [], []
+
+    def leader_func():
+        started.set()
+        release.wait(5)
+        return func()
+
+    def call(target):
+        try:
+            results.append(flight.do(key, target))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call, args=(leader_func,))]
+    threads[0].start()
+    started.wait(5)
+    threads += [threading.Thread(target=call, args=(lambda: pytest.fail("waiter ran the call"),)) for _ in range(callers - 1)]
+    for thread in threads[1:]:
+        thread.start()
+    deadline = time.monotonic() + 5
+    while flight.stats()["shared"] < callers - 1 and time.monotonic() < deadline:
+        time.sleep(0.001)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    return results, errors
+
+
+def test_concurrent_callers_share_one_call_and_get_copies():
+    flight = SingleFlight()
+    results, errors = run_together(flight, "key", lambda: {"recipes": [1, 2]}, 4)
+    assert errors == [] and results == [{"recipes": [1, 2]}] * 4
+    assert len({id(result) for result in results}) == 4
+    assert flight.stats() == {"leaders": 1, "shared": 3, "in_flight": 0}
+
+def test_an_error_is_raised_to_every_caller_and_not_kept():
+    flight = SingleFlight()
+
+    def fail():
+        raise RuntimeError("model down")
+
+    results, errors = run_together(flight, "key", fail, 3)
+    assert results == [] and [str(error) for error in errors] == ["model down"] * 3
+    # The failed call is not remembered: the next caller runs again
+    assert flight.do("key", lambda: "ok") == "ok"
+
+def test_different_keys_do_not_share():
+    flight = SingleFlight()
+    assert flight.do("a", lambda: 1) == 1
+    assert flight.do("b", lambda: 2) == 2
+    assert flight.stats()["leaders"] == 2 and flight.stats()["shared"] == 0
+
+def test_async_callers_share_one_call_and_survive_a_cancelled_caller():
+    flight = AsyncSingleFlight()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"recipes": [1]}
+
+    async def main():
+        first = asyncio.ensure_future(flight.do("key", work))
+        await asyncio.sleep(0)
+        second = asyncio.ensure_future(flight.do("key", work))
+        third = asyncio.ensure_future(flight.do("key", work))
+        await asyncio.sleep(0)
+        first.cancel()
+        return await asyncio.gather(second, third), first.cancelled()
+
+    (second, third), cancelled = asyncio.run(main())
+    assert cancelled and calls == [1]
+    assert second == third == {"recipes": [1]} and second is not third
+
+def test_async_errors_reach_every_caller():
+    flight = AsyncSingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("model down")
+
+    async def main():
+        return await asyncio.gather(flight.do("key", fail), flight.do("key", fail), return_exceptions=True)
+
+    assert [str(error) for error in asyncio.run(main())] == ["model down"] * 2
+    assert flight.stats()["in_flight"] == 0
@@ -0,0 +1,66 @@
+import json
+
+import pytest
+
+from app.services.stream_parser import IncrementalRecipeParser
+
+RECIPES = [
+    {"title": "Pasta \"al\" Pomodoro", "summary": "Quick, {braced} and [bracketed]", "ingredients": {"necessary_items": [{"_id": "a", "quantity": 2}], "optional_items": []}, "procedure": "Boil.\nToss.", "youtube": None},
+    {"title": "Caprese", "summary": "No cooking", "ingredients": {"necessary_items": [{"_id": "c", "quantity": 1}], "optional_items": []}, "procedure": "Slice.", "youtube": None},
+]
+
+
+def parse(text, chunk_size):
+    parser = IncrementalRecipeParser()
+    events = []
+    for start in range(0, len(text), chunk_size):
+        events.extend(parser.feed(text[start:start + chunk_size]))
+    parser.close()
+    return events
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 10000])
+def test_fields_and_recipes_are_emitted_in_order_at_any_chunking(chunk_size):
+    events = parse(json.dumps(RECIPES, indent=1), chunk_size)
+    fields = [(event["recipe"], event["field"]) for event in events if event["type"] == "field"]
+    assert fields == [(index, field) for index, recipe in enumerate(RECIPES) for field in recipe]
+    assert [event["value"] for event in events if event["type"] == "recipe"] == RECIPES
+    assert next(event for event in events if event["type"] == "field")["value"] == RECIPES[0]["title"]
+
+def test_a_field_is_emitted_as_soon_as_it_closes():
+    parser = IncrementalRecipeParser()
+    assert parser.feed('[{"title": "Capr') == []
+    assert parser.feed('ese", "summ') == [{"type": "field", "recipe": 0, "field": "title", "value": "Caprese"}]
+    assert parser.feed('ary": "x, y",') == [{"type": "field", "recipe": 0, "field": "summary", "value": "x, y"}]
+
+def test_a_single_recipe_object_and_code_fences_are_accepted():
+    events = parse("```json\n" + json.dumps(RECIPES[1]) + "\n```", 5)
+    assert [event["value"] for event in events if event["type"] == "recipe"] == [RECIPES[1]]
+
+def test_a_truncated_response_fails_on_close():
+    parser = IncrementalRecipeParser()
+    parser.feed(json.dumps(RECIPES)[:-20])
+    with pytest.raises(ValueError, match="ended early"):
+        parser.close()
+
+def test_a_response_without_json_fails_on_close():
+    parser = IncrementalRecipeParser()
+    parser.feed("I cannot help with that.")
+    with pytest.raises(ValueError, match="no JSON value"):
+        parser.close()
+
+def test_a_malformed_field_raises():
+    parser = IncrementalRecipeParser()
+    with pytest.raises(ValueError, match="Failed to parse"):
+        parser.feed('[{"title": Caprese,')
+
+def test_emitted_recipes_are_discarded_from_the_buffer():
+    parser = IncrementalRecipeParser()
+    text = json.dumps(RECIPES * 20)
+    longest = 0
+    for start in range(0, len(text), 50):
+        parser.feed(text[start:start + 50])
+        longest = max(longest, len(parser._buffer))
+    parser.close()
+    assert parser.recipe_count == 40
+    assert longest < 2 * max(len(json.dumps(recipe)) for recipe in RECIPES) + 50
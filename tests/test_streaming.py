@@ -0,0 +1,26 @@
+import json
+
+from app.services import gemini_service
+
+PREFERENCES = {"cuisine": "Italian", "ingredients_to_include": ["Pasta"]}
+
+
+def test_large_counts_are_streamed_in_parts(snapshot, fake_model):
+    models = fake_model()
+    count = gemini_service.RECIPES_PER_CALL + 1
+    events = list(gemini_service.stream_recipes(json.dumps(PREFERENCES), count))
+
+    recipes = [event for event in events if event["type"] == "recipe"]
+    assert models.calls == len(gemini_service.split_count(count)) == 2
+    assert [event["recipe"] for event in recipes] == list(range(count))
+    assert len({event["value"]["title"] for event in recipes}) == count
+    assert all("totals" in event["value"] for event in recipes)
+    # Field events of a recipe come before its recipe event
+    first_recipe = events.index(recipes[0])
+    assert {event["field"] for event in events[:first_recipe] if event["recipe"] == 0} >= {"title", "ingredients"}
+
+def test_a_small_count_is_streamed_in_one_call(snapshot, fake_model):
+    models = fake_model()
+    events = list(gemini_service.stream_recipes(json.dumps(PREFERENCES), 2))
+    assert models.calls == 1
+    assert [event["recipe"] for event in events if event["type"] == "recipe"] == [0, 1]
@@ -0,0 +1,9 @@
+from dotenv import load_dotenv
+from app import create_app
+
+# Load environment variables
+load_dotenv()
+
+# WSGI entry point for Gunicorn, e.g. `gunicorn -c gunicorn.conf.py wsgi:app`
+# (see gunicorn.conf.py for the worker settings and the catalog preload)
+app = create_app()